@@ -0,0 +1,130 @@
+from datetime import datetime
+import os
+from pathlib import Path
+import platform
+import subprocess
+from typing import Any, Collection, Dict, List, Optional
+
+from rich import print
+from rich.table import Table
+
+# Same seed, same datasets: reports from different commits and machines measure the same data
+BENCHMARK_SEED = 20240501
+
+repo_dir = Path(__file__).resolve().parent
+
+
+def parse_size(value: str) -> int:
+    """
+    Parses sizes like 1000, 100k or 1M.
+    """
+    multipliers = {"k": 1_000, "m": 1_000_000}
+    value = value.strip().lower()
+    if value[-1:] in multipliers:
+        return int(float(value[:-1]) * multipliers[value[-1]])
+    return int(value)
+
+
+def parse_sizes(value: str) -> List[int]:
+    return [parse_size(size) for size in value.split(",")]
+
+
+def git_commit() -> str:
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"],
+            cwd=repo_dir,
+            capture_output=True,
+            text=True,
+            check=True,
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return "unknown"
+
+
+def report_header() -> Dict[str, Any]:
+    """
+    Where and when a report was measured.
+    """
+    return {
+        "commit": git_commit(),
+        "created_at": datetime.now().isoformat(timespec="seconds"),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "cpu_count": os.cpu_count(),
+        "seed": BENCHMARK_SEED,
+    }
+
+
+def percentiles_ms(latencies_ns: List[int]) -> Dict[str, float]:
+    values = sorted(latencies_ns)
+
+    def pick(q: float) -> float:
+        return round(values[min(len(values) - 1, int(q * len(values)))] / 1e6, 4)
+
+    return {"p50_ms": pick(0.5), "p99_ms": pick(0.99)}
+
+
+def flatten(results: Dict[str, Any], skipped: Collection[str], prefix: str = "") -> Dict[str, float]:
+    """
+    Comparable metrics of a report's "sizes", keyed by their path like
+    "1000.main.p50_ms". Keys in `skipped` (counts rather than measurements)
+    are left out with everything under them.
+    """
+    metrics: Dict[str, float] = {}
+    for name, value in results.items():
+        if name in skipped:
+            continue
+        if isinstance(value, dict):
+            metrics.update(flatten(value, skipped, f"{prefix}{name}."))
+        else:
+            metrics[f"{prefix}{name}"] = value
+    return metrics
+
+
+def regression(name: str, value: float, before: float, higher_is_better: Collection[str]) -> float:
+    """
+    Relative change of a metric, positive when it got worse.
+    """
+    change = (value - before) / before
+    return -change if name.rsplit(".", 1)[-1] in higher_is_better else change
+
+
+def find_regressions(
+    report: Dict[str, Any],
+    baseline: Dict[str, Any],
+    skipped: Collection[str],
+    max_regression: float,
+    higher_is_better: Collection[str] = (),
+) -> List[str]:
+    """
+    Metrics that got worse than the baseline by more than `max_regression`.
+    """
+    previous = flatten(baseline["sizes"], skipped)
+    problems = []
+    for name, value in flatten(report["sizes"], skipped).items():
+        before = previous.get(name)
+        if before and regression(name, value, before, higher_is_better) > max_regression:
+            problems.append(f"{name}: {before:g} -> {value:g}")
+    return problems
+
+
+def print_report(
+    title: str, report: Dict[str, Any], baseline: Optional[Dict[str, Any]], skipped: Collection[str]
+) -> None:
+    current = flatten(report["sizes"], skipped)
+    previous = flatten(baseline["sizes"], skipped) if baseline else {}
+    table = Table(title=f"{title} @ {report['commit']}")
+    table.add_column("Metric")
+    table.add_column("Value", justify="right")
+    if baseline:
+        table.add_column(f"Baseline @ {baseline['commit']}", justify="right")
+        table.add_column("Change", justify="right")
+    for name, value in current.items():
+        row = [name, f"{value:g}"]
+        if baseline:
+            before = previous.get(name)
+            row.append("-" if before is None else f"{before:g}")
+            row.append("-" if not before else f"{(value - before) / before:+.1%}")
+        table.add_row(*row)
+    print(table)
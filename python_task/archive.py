@@ -0,0 +1,222 @@
+import argparse
+import mmap
+import os
+from pathlib import Path
+import struct
+from typing import Dict, Iterator, List, Optional, Tuple
+
+from rich import print
+
+from python_task.src.models import ArchiveEntry
+
+# Layout of a context archive:
+#   header | payloads (Application, SqlIntegration, scoring JSON per request) | index
+# The index holds one fixed-size entry per request, sorted by request_id, so an
+# entry is found by binary search directly in the mapped file.
+MAGIC = b"PTCTXA01"
+HEADER = struct.Struct("<8sQQ")  # magic, entries count, index offset
+KEY_SIZE = 64
+INDEX_ENTRY = struct.Struct(f"<{KEY_SIZE}sQIIII")  # key, offset, 3 sizes, scoring version
+
+# Scoring version of a context that could not be read when packing: its first
+# payload is the error, so deciding it fails the same way as from the directory
+UNREADABLE = 0xFFFFFFFF
+
+ARCHIVE_SUFFIX = ".ctxa"
+
+
+class ContextArchive:
+    """
+    Read-only, memory-mapped context archive.
+    """
+
+    def __init__(self, path: Path):
+        self.path = path
+        with open(path, "rb") as f:
+            stat = os.fstat(f.fileno())
+            self.archive_id = (stat.st_ino, stat.st_mtime_ns)
+            self.buffer = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        magic, self.count, self.index_offset = HEADER.unpack_from(self.buffer, 0)
+        if magic != MAGIC:
+            self.buffer.close()
+            raise ValueError(f"{path} is not a context archive")
+
+    def key(self, position: int) -> bytes:
+        start = self.index_offset + position * INDEX_ENTRY.size
+        return self.buffer[start : start + KEY_SIZE]
+
+    def entry(self, position: int) -> Tuple[str, ArchiveEntry]:
+        key, offset, app_size, sql_size, scoring_size, version = INDEX_ENTRY.unpack_from(
+            self.buffer, self.index_offset + position * INDEX_ENTRY.size
+        )
+        request_id = key.rstrip(b"\0").decode("utf-8")
+        return request_id, ArchiveEntry(
+            self.path, offset, app_size, sql_size, scoring_size, version, self.archive_id
+        )
+
+    def find(self, request_id: str) -> Optional[ArchiveEntry]:
+        key = encode_key(request_id)
+        low, high = 0, self.count
+        while low < high:
+            middle = (low + high) // 2
+            if self.key(middle) < key:
+                low = middle + 1
+            else:
+                high = middle
+        if low < self.count and self.key(low) == key:
+            return self.entry(low)[1]
+        return None
+
+    def __iter__(self) -> Iterator[Tuple[str, ArchiveEntry]]:
+        for position in range(self.count):
+            yield self.entry(position)
+
+    def __len__(self) -> int:
+        return self.count
+
+    def read(self, entry: ArchiveEntry) -> Tuple[int, bytes, bytes, bytes]:
+        """
+        Scoring version and raw Application, SqlIntegration and scoring JSON.
+        Raises OSError for a context that was unreadable when packing.
+        """
+        if entry.archive_id != self.archive_id:
+            raise OSError(f"{self.path} was re-packed after the entry was listed")
+        app_end = entry.offset + entry.application_size
+        sql_end = app_end + entry.sql_integration_size
+        scoring_end = sql_end + entry.scoring_size
+        if entry.scoring_version == UNREADABLE:
+            raise OSError(self.buffer[entry.offset : app_end].decode("utf-8"))
+        return (
+            entry.scoring_version,
+            self.buffer[entry.offset : app_end],
+            self.buffer[app_end:sql_end],
+            self.buffer[sql_end:scoring_end],
+        )
+
+    def close(self) -> None:
+        self.buffer.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+
+def encode_key(request_id: str) -> bytes:
+    key = request_id.encode("utf-8")
+    if len(key) > KEY_SIZE:
+        raise ValueError(f"request_id longer than {KEY_SIZE} bytes: {request_id}")
+    return key.ljust(KEY_SIZE, b"\0")
+
+
+# Archives mapped by this process, shared by all entries pointing to them
+_OPEN_ARCHIVES: Dict[Path, ContextArchive] = {}
+
+
+def open_archive(path: Path) -> ContextArchive:
+    """
+    Mapped archive at `path`, mapped again once the file there is replaced
+    (another inode or mtime). The previous mapping is only dropped, not closed:
+    reads in progress keep it alive, and its entries are refused from now on.
+    """
+    archive = _OPEN_ARCHIVES.get(path)
+    if archive is not None:
+        stat = os.stat(path)
+        if archive.archive_id == (stat.st_ino, stat.st_mtime_ns):
+            return archive
+    archive = _OPEN_ARCHIVES[path] = ContextArchive(path)
+    return archive
+
+
+def read_entry(entry: ArchiveEntry) -> Tuple[int, bytes, bytes, bytes]:
+    return open_archive(entry.archive).read(entry)
+
+
+class ArchiveWriter:
+    """
+    Streams payloads to a temporary file and writes the sorted index on close;
+    the archive appears under its final name only once complete.
+    """
+
+    def __init__(self, path: Path):
+        self.path = path
+        self.tmp_path = path.with_name(path.name + ".tmp")
+        self.file = open(self.tmp_path, "wb")
+        self.file.write(HEADER.pack(MAGIC, 0, 0))
+        self.offset = HEADER.size
+        self.index: List[Tuple[bytes, int, int, int, int, int]] = []
+
+    def add(self, request_id: str, version: int, app_raw: bytes, sql_raw: bytes, scoring_raw: bytes):
+        self.index.append(
+            (encode_key(request_id), self.offset, len(app_raw), len(sql_raw), len(scoring_raw), version)
+        )
+        for raw in (app_raw, sql_raw, scoring_raw):
+            self.file.write(raw)
+            self.offset += len(raw)
+
+    def add_unreadable(self, request_id: str, error: str) -> None:
+        self.add(request_id, UNREADABLE, error.encode("utf-8"), b"", b"")
+
+    def close(self) -> None:
+        self.index.sort()
+        for previous, current in zip(self.index, self.index[1:]):
+            if previous[0] == current[0]:
+                request_id = current[0].rstrip(b"\0").decode("utf-8")
+                raise ValueError(f"Duplicate request_id in archive: {request_id}")
+        index_offset = self.offset
+        for row in self.index:
+            self.file.write(INDEX_ENTRY.pack(*row))
+        self.file.seek(0)
+        self.file.write(HEADER.pack(MAGIC, len(self.index), index_offset))
+        self.file.flush()
+        os.fsync(self.file.fileno())
+        self.file.close()
+        os.replace(self.tmp_path, self.path)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        if exc_type is None:
+            self.close()
+        else:
+            self.file.close()
+            self.tmp_path.unlink(missing_ok=True)
+
+
+def pack(test_data_dir: Path, archive_path: Path, scoring_version: Optional[int] = None) -> int:
+    """
+    Converts a test_data directory tree into a context archive. The scoring
+    version is resolved while packing. Contexts that cannot be read are
+    reported and packed with their error, so deciding them writes an "error"
+    decision, as from the directory. Returns the number of packed requests.
+    """
+    # Imported here: the context loader itself reads archives through this module
+    from python_task.context import read_context_files
+
+    packed = 0
+    with ArchiveWriter(archive_path) as writer, os.scandir(test_data_dir) as entries:
+        for entry in entries:
+            if not entry.is_dir():
+                continue
+            try:
+                files = read_context_files(Path(entry.path), scoring_version)
+            except (OSError, ValueError) as e:
+                print(f"[WARNING] Packing request_id={entry.name} as unreadable → {e}")
+                writer.add_unreadable(entry.name, str(e))
+            else:
+                writer.add(entry.name, *files)
+            packed += 1
+    return packed
+
+
+if __name__ == "__main__":
+    project_dir = Path(__file__).resolve().parent
+    parser = argparse.ArgumentParser(description="Pack request contexts into a mapped archive.")
+    parser.add_argument("--source", type=Path, default=project_dir / "test_data")
+    parser.add_argument("--output", type=Path, default=project_dir / f"test_data{ARCHIVE_SUFFIX}")
+    parser.add_argument("--scoring-version", type=int, default=None)
+    args = parser.parse_args()
+    count = pack(args.source, args.output, args.scoring_version)
+    print(f"[bold green]Packed {count} requests into {args.output}")
@@ -0,0 +1,184 @@
+import argparse
+from datetime import datetime
+import json
+from pathlib import Path
+import shutil
+import tempfile
+import time
+from typing import Any, Dict, List, Optional
+
+from rich import print
+
+from benchmarking import BENCHMARK_SEED, parse_sizes, percentiles_ms, print_report, report_header
+from python_task import data_generator, runner
+from python_task.context import (
+    APPLICATION_DIR,
+    SQL_INTEGRATION_DIR,
+    SCORING_VERSION,
+    find_scoring_dirs,
+    parse_context,
+    phone_number,
+    resolve_scoring_dir,
+)
+from python_task.decoding import JSON_BACKEND
+from python_task.routing import is_pure_stream
+from python_task.scoring import STRATEGY_TABLE, apply_strategy, main
+from python_task.sinks import FileSink
+from python_task.src.models import Request
+
+project_dir = Path(__file__).resolve().parent
+
+DEFAULT_SIZES = (1_000, 100_000, 1_000_000)
+DATASETS_DIR = project_dir / "benchmark_data"
+RESULTS_DIR = project_dir / "benchmark_results"
+
+STAGES = (
+    "discovery",
+    "file_read",
+    "json_parse",
+    "strategy",
+    "to_dict",
+    "result_write",
+)
+# Report entries that are not compared between commits: counts and derived stage totals
+NOT_COMPARED = ("requests", "workers", "total_s", "share")
+
+
+def ensure_dataset(size: int) -> Path:
+    """
+    Generates (once) a synthetic dataset of `size` requests with data_generator.
+    """
+    dataset_dir = DATASETS_DIR / f"requests_{size}_{BENCHMARK_SEED}"
+    marker = dataset_dir / ".complete"
+    if not marker.exists():
+        if dataset_dir.exists():
+            shutil.rmtree(dataset_dir)
+        data_generator.main(count=size, test_data_dir=dataset_dir, seed=BENCHMARK_SEED)
+        marker.touch()
+    return dataset_dir
+
+
+def bench_stages(dataset_dir: Path, result_dir: Path) -> Dict[str, Any]:
+    """
+    Replays the decision pipeline one stage at a time and accumulates the time
+    spent in every stage over the whole dataset.
+    """
+    totals = dict.fromkeys(STAGES, 0)
+    clock = time.perf_counter_ns
+    sink = FileSink(result_dir)
+    count = 0
+
+    started = clock()
+    sub_dirs = list(runner.iter_request_dirs(dataset_dir))
+    totals["discovery"] += clock() - started
+
+    for sub_dir in sub_dirs:
+        t0 = clock()
+        version, scoring_dir = resolve_scoring_dir(find_scoring_dirs(sub_dir), SCORING_VERSION)
+        t1 = clock()
+        raw_app = (sub_dir / APPLICATION_DIR / f"{APPLICATION_DIR}.json").read_bytes()
+        raw_sql = (sub_dir / SQL_INTEGRATION_DIR / f"{SQL_INTEGRATION_DIR}.json").read_bytes()
+        raw_scoring = (sub_dir / scoring_dir / f"{scoring_dir}.json").read_bytes()
+        t2 = clock()
+        context = parse_context(sub_dir.name, version, raw_app, raw_sql, raw_scoring)
+        t3 = clock()
+        strategy = STRATEGY_TABLE.select(
+            is_pure_stream(context.request_id), context.client_type, lambda: phone_number(context)
+        )
+        response = apply_strategy(strategy, context.score, datetime.now())
+        t4 = clock()
+        response.to_dict()
+        t5 = clock()
+        sink.write(context.request_id, response)
+        t6 = clock()
+
+        totals["discovery"] += t1 - t0
+        totals["file_read"] += t2 - t1
+        totals["json_parse"] += t3 - t2
+        totals["strategy"] += t4 - t3
+        totals["to_dict"] += t5 - t4
+        totals["result_write"] += t6 - t5
+        count += 1
+
+    total = sum(totals.values()) or 1
+    return {
+        stage: {
+            "total_s": round(elapsed / 1e9, 4),
+            "per_request_us": round(elapsed / 1e3 / max(count, 1), 3),
+            "share": round(elapsed / total, 4),
+        }
+        for stage, elapsed in totals.items()
+    }
+
+
+def bench_main(dataset_dir: Path) -> Dict[str, Any]:
+    latencies: List[int] = []
+    clock = time.perf_counter_ns
+    started = clock()
+    for sub_dir in runner.iter_request_dirs(dataset_dir):
+        t0 = clock()
+        main(Request(request_id=sub_dir.name, context=sub_dir))
+        latencies.append(clock() - t0)
+    elapsed = (clock() - started) / 1e9
+    return {
+        "requests": len(latencies),
+        "throughput_rps": round(len(latencies) / elapsed, 1),
+        **percentiles_ms(latencies),
+    }
+
+
+def bench_runner(dataset_dir: Path, result_dir: Path, workers: int) -> Dict[str, Any]:
+    started = time.perf_counter()
+    runner.run(workers=workers, test_data_dir=dataset_dir, test_result_dir=result_dir)
+    elapsed = time.perf_counter() - started
+    requests = sum(1 for _ in runner.iter_request_dirs(dataset_dir))
+    return {
+        "workers": workers,
+        "elapsed_s": round(elapsed, 3),
+        "throughput_rps": round(requests / elapsed, 1),
+    }
+
+
+def run_benchmarks(sizes: List[int], workers: int) -> Dict[str, Any]:
+    report: Dict[str, Any] = {**report_header(), "json_backend": JSON_BACKEND, "sizes": {}}
+    for size in sizes:
+        print(f"[bold]Benchmarking {size} requests")
+        dataset_dir = ensure_dataset(size)
+        with tempfile.TemporaryDirectory() as tmp:
+            stages_dir, runner_dir = Path(tmp) / "stages", Path(tmp) / "runner"
+            stages_dir.mkdir()
+            report["sizes"][str(size)] = {
+                "stages": bench_stages(dataset_dir, stages_dir),
+                "main": bench_main(dataset_dir),
+                "runner": bench_runner(dataset_dir, runner_dir, workers),
+            }
+    return report
+
+
+def parse_args(argv: Optional[List[str]] = None) -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description="Benchmark the python_task decision pipeline.")
+    parser.add_argument(
+        "--sizes",
+        type=parse_sizes,
+        default=list(DEFAULT_SIZES),
+        help="Comma-separated dataset sizes, e.g. 1k,100k,1M",
+    )
+    parser.add_argument("--workers", type=int, default=1, help="Workers for the runner benchmark")
+    parser.add_argument(
+        "--output", type=Path, default=None, help="Report file (default: benchmark_results/<commit>.json)"
+    )
+    parser.add_argument("--compare", type=Path, default=None, help="Baseline report to compare with")
+    return parser.parse_args(argv)
+
+
+if __name__ == "__main__":
+    args = parse_args()
+    report = run_benchmarks(args.sizes, args.workers)
+
+    output = args.output or RESULTS_DIR / f"{report['commit']}.json"
+    output.parent.mkdir(parents=True, exist_ok=True)
+    output.write_text(json.dumps(report, indent=4))
+
+    baseline = json.loads(args.compare.read_text()) if args.compare else None
+    print_report("python_task benchmark", report, baseline, NOT_COMPARED)
+    print(f"[bold green]Report written to {output}")
@@ -0,0 +1,115 @@
+import os
+import re
+from pathlib import Path
+from typing import Dict, Optional, Tuple
+
+from python_task.archive import read_entry
+from python_task.decoding import APPLICATION, PYTHON_SCORING, SQL_INTEGRATION
+from python_task.src.models import ArchiveEntry, Request, RequestContext
+
+APPLICATION_DIR = "Application"
+SQL_INTEGRATION_DIR = "SqlIntegration"
+SCORING_DIR_PREFIX = "PythonScoring"
+
+# Scoring version to use; None picks the highest available version
+SCORING_VERSION: Optional[int] = None
+
+_SCORING_DIR_PATTERN = re.compile(rf"^{SCORING_DIR_PREFIX}(?:-v(\d+))?$")
+
+
+def read_bytes(path: Path) -> bytes:
+    with open(path, "rb") as f:
+        return f.read()
+
+
+def find_scoring_dirs(base_path: Path) -> Dict[int, str]:
+    """
+    Maps every scoring version found in the context to its directory name.
+    A single os.scandir pass; an unversioned directory counts as version 0.
+    """
+    versions: Dict[int, str] = {}
+    with os.scandir(base_path) as entries:
+        for entry in entries:
+            match = _SCORING_DIR_PATTERN.match(entry.name)
+            if match is None or not entry.is_dir():
+                continue
+            versions[int(match.group(1) or 0)] = entry.name
+    return versions
+
+
+def resolve_scoring_dir(versions: Dict[int, str], version: Optional[int]) -> Tuple[int, str]:
+    """
+    Picks the scoring directory of the configured version, or of the highest one.
+    """
+    if not versions:
+        raise FileNotFoundError("Scoring directory not found")
+    if version is None:
+        version = max(versions)
+    elif version not in versions:
+        raise FileNotFoundError(f"Scoring version v{version} not found")
+    return version, versions[version]
+
+
+def read_scoring(scoring_dir: Path) -> bytes:
+    """
+    Reads the scoring file, which is named after its directory. Other names are
+    only looked up (in a stable order) when that file is missing.
+    """
+    try:
+        return read_bytes(scoring_dir / f"{scoring_dir.name}.json")
+    except FileNotFoundError:
+        pass
+
+    with os.scandir(scoring_dir) as entries:
+        scoring_file = min((entry.name for entry in entries if entry.name.endswith(".json")), default=None)
+    if scoring_file is None:
+        raise FileNotFoundError("Scoring file not found inside scoring directory")
+    return read_bytes(scoring_dir / scoring_file)
+
+
+def read_context_files(
+    base_path: Path, scoring_version: Optional[int] = None
+) -> Tuple[int, bytes, bytes, bytes]:
+    """
+    Raw Application, SqlIntegration and scoring files of a context directory,
+    with the resolved scoring version.
+    """
+    if scoring_version is None:
+        scoring_version = SCORING_VERSION
+
+    version, scoring_dir = resolve_scoring_dir(find_scoring_dirs(base_path), scoring_version)
+
+    app_raw = read_bytes(base_path / APPLICATION_DIR / f"{APPLICATION_DIR}.json")
+    sql_raw = read_bytes(base_path / SQL_INTEGRATION_DIR / f"{SQL_INTEGRATION_DIR}.json")
+    scoring_raw = read_scoring(base_path / scoring_dir)
+    return version, app_raw, sql_raw, scoring_raw
+
+
+def parse_context(
+    request_id: str, version: int, app_raw: bytes, sql_raw: bytes, scoring_raw: bytes
+) -> RequestContext:
+    return RequestContext(
+        request_id=request_id,
+        client_type=APPLICATION.decode(app_raw).client_type,
+        score=PYTHON_SCORING.decode(scoring_raw).score,
+        scoring_version=version,
+        sql_integration=sql_raw,
+    )
+
+
+def phone_number(context: RequestContext) -> str:
+    """
+    Decodes the phone number of a context. Only strategies routed on the phone
+    number call it, so the SqlIntegration file of other requests is never parsed.
+    """
+    return SQL_INTEGRATION.decode(context.sql_integration).phone_number
+
+
+def load_context(request: Request, scoring_version: Optional[int] = None) -> RequestContext:
+    """
+    Loads everything the decision needs from a request context directory or
+    from a packed archive entry (which holds the version picked when packing).
+    """
+    if isinstance(request.context, ArchiveEntry):
+        return parse_context(request.request_id, *read_entry(request.context))
+    return parse_context(request.request_id, *read_context_files(request.context, scoring_version))
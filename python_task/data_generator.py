@@ -1,18 +1,36 @@
 from abc import ABC, abstractmethod
+import argparse
+from concurrent.futures import ProcessPoolExecutor
 import json
+import os
 from pathlib import Path
-from random import choice, choices, normalvariate, randint
-from typing import Any, Dict
-from uuid import uuid4
+import random
+import re
+import subprocess
+import sys
+import time
+from typing import Any, Dict, Iterator, List, Optional, Tuple
+from uuid import UUID
 from rich import print
 
 from faker import Faker
 
+from python_task.archive import ARCHIVE_SUFFIX, ArchiveWriter
+
 fake = Faker()
 
 project_dir = Path(__file__).resolve().parent
 
 DUMMY_FOLDERS_CNT = 100
+# Requests per generate_block call, the unit of work handed to a generator process
+BLOCK_SIZE = 1000
+OUTPUT_FORMATS = ("dirs", "archive")
+# Written into every generated directory tree: only such trees are deleted without a full check
+GENERATED_MARKER = ".generated"
+CONTEXT_DIR_PATTERN = re.compile(r"^(?:Application|SqlIntegration|PythonScoring-v\d+)$")
+
+# Packed request: request_id, scoring version, Application, SqlIntegration, PythonScoring JSON
+GeneratedRequest = Tuple[str, int, bytes, bytes, bytes]
 
 
 class FakeDataGenerator(ABC):
@@ -20,6 +38,9 @@ class FakeDataGenerator(ABC):
     def to_dict(self) -> Dict[str, Any]:
         pass
 
+    def dumps(self) -> bytes:
+        return json.dumps(self.to_dict(), indent=4).encode("utf-8")
+
     def dump(self, path: Path) -> None:
         with open(path, "w") as f:
             json.dump(self.to_dict(), f, indent=4)
@@ -35,9 +56,10 @@ class FakeRequest(FakeDataGenerator):
             "client_type": self.client_type,
         }
 
-    def __init__(self):
-        self.request_id = str(uuid4())
-        self.client_type = choices(("new", "repeat"), weights=(0.4, 0.6), k=1)[0]
+    def __init__(self, rng: Optional[random.Random] = None):
+        rng = rng or random.Random()
+        self.request_id = str(UUID(int=rng.getrandbits(128), version=4))
+        self.client_type = rng.choices(("new", "repeat"), weights=(0.4, 0.6), k=1)[0]
 
 
 class FakeSqlIntegration(FakeDataGenerator):
@@ -51,64 +73,173 @@ class FakeSqlIntegration(FakeDataGenerator):
             "phone_number": self.phone,
         }
 
-    def __init__(self):
-        self.name = fake.name()
-        self.age = randint(21, 60)
-        self.sex = choice(("Male", "Female"))
-        self.document_id = fake.random_number()
-        self.address = fake.address()
-        self.phone = fake.phone_number()
+    def __init__(self, rng: Optional[random.Random] = None, faker: Faker = fake):
+        rng = rng or random.Random()
+        self.name = faker.name()
+        self.age = rng.randint(21, 60)
+        self.sex = rng.choice(("Male", "Female"))
+        self.document_id = faker.random_number()
+        self.address = faker.address()
+        self.phone = faker.phone_number()
 
 
 class FakePythonScoring(FakeDataGenerator):
     def to_dict(self) -> Dict[str, Any]:
         return {"score": self.score}
 
-    def __init__(self):
-        self.score = abs(normalvariate(0.2, 0.1))
+    def __init__(self, rng: Optional[random.Random] = None):
+        rng = rng or random.Random()
+        self.score = abs(rng.normalvariate(0.2, 0.1))
+
+
+def generate_block(seed: int, block: int, count: int) -> List[GeneratedRequest]:
+    """
+    Generates `count` requests of one block. The block's RNGs are derived only
+    from (seed, block), so the output does not depend on which worker runs it.
+    """
+    rng = random.Random(f"{seed}:{block}")
+    fake.seed_instance(rng.getrandbits(64))
+
+    requests: List[GeneratedRequest] = []
+    for _ in range(count):
+        request = FakeRequest(rng)
+        sql_integration = FakeSqlIntegration(rng, fake)
+        python_scoring = FakePythonScoring(rng)
+        version = rng.randint(1, 3)
+        requests.append(
+            (request.request_id, version, request.dumps(), sql_integration.dumps(), python_scoring.dumps())
+        )
+    return requests
+
+
+def write_dirs(test_data_dir: Path, requests: List[GeneratedRequest]) -> int:
+    for request_id, version, app_raw, sql_raw, scoring_raw in requests:
+        decision_dir = test_data_dir / request_id
+        scoring_name = f"PythonScoring-v{version}"
+        for name, raw in (
+            ("Application", app_raw),
+            ("SqlIntegration", sql_raw),
+            (scoring_name, scoring_raw),
+        ):
+            (decision_dir / name).mkdir(parents=True, exist_ok=True)
+            with open(decision_dir / name / f"{name}.json", "wb") as f:
+                f.write(raw)
+    return len(requests)
+
+
+def generate_dirs_block(test_data_dir: Path, seed: int, block: int, count: int) -> int:
+    return write_dirs(test_data_dir, generate_block(seed, block, count))
+
+
+def blocks(count: int) -> Iterator[Tuple[int, int]]:
+    for block, start in enumerate(range(0, count, BLOCK_SIZE)):
+        yield block, min(BLOCK_SIZE, count - start)
+
+
+def is_request_id(name: str) -> bool:
+    try:
+        return str(UUID(name)) == name
+    except ValueError:
+        return False
+
+
+def check_layout(path: Path) -> None:
+    """
+    Raises ValueError unless `path` holds only request directories as
+    write_dirs creates them: UUID-named directories of Application,
+    SqlIntegration and PythonScoring-v* directories with .json files.
+    """
+    with os.scandir(path) as requests:
+        for request in requests:
+            if request.name == GENERATED_MARKER and request.is_file(follow_symlinks=False):
+                continue
+            if not request.is_dir(follow_symlinks=False) or not is_request_id(request.name):
+                raise ValueError(f"Careful! Unknown entry: {request.path}, it should be a request directory")
+            with os.scandir(request.path) as parts:
+                for part in parts:
+                    if not part.is_dir(follow_symlinks=False) or not CONTEXT_DIR_PATTERN.match(part.name):
+                        raise ValueError(f"Careful! Unknown entry: {part.path}, it should be a context directory")
+                    with os.scandir(part.path) as files:
+                        for file in files:
+                            if not file.is_file(follow_symlinks=False) or not file.name.endswith(".json"):
+                                raise ValueError(f"Careful! Unknown file type: {file.path}, it should be .json")
 
 
 def delete_folder(path: Path):
-    for sub in path.iterdir():
-        if sub.is_dir():
-            delete_folder(sub)
+    """
+    Removes a previous test data directory: the directory is renamed away
+    (one syscall) and a detached process deletes it in the background.
+
+    Only trees written by this generator are removed. A tree with the
+    generator's marker is trusted; any other one must pass a full layout
+    check first.
+    """
+    if not (path / GENERATED_MARKER).is_file():
+        check_layout(path)
+
+    trash = path.with_name(f".{path.name}.deleted-{time.time_ns()}")
+    path.rename(trash)
+    subprocess.Popen(
+        [sys.executable, "-c", "import shutil, sys; shutil.rmtree(sys.argv[1])", str(trash)],
+        start_new_session=True,
+    )
+
+
+def main(
+    count: int = DUMMY_FOLDERS_CNT,
+    test_data_dir: Path = project_dir / "test_data",
+    seed: Optional[int] = None,
+    workers: int = 1,
+    output_format: str = "dirs",
+):
+    """
+    Generates `count` requests as a directory tree or straight into a context
+    archive (`test_data_dir` with the archive suffix). The output for a given
+    seed is the same for any number of workers.
+    """
+    if output_format not in OUTPUT_FORMATS:
+        raise ValueError(f"Unknown output format: {output_format}, expected one of {OUTPUT_FORMATS}")
+    if seed is None:
+        seed = random.randrange(2**63)
+    print(f"Generating {count} requests with seed {seed}")
+
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        block_ids, block_sizes = zip(*blocks(count)) if count else ((), ())
+        seeds = [seed] * len(block_ids)
+
+        if output_format == "archive":
+            archive_path = test_data_dir.with_name(test_data_dir.name + ARCHIVE_SUFFIX)
+            with ArchiveWriter(archive_path) as writer:
+                # map keeps block order, so the archive bytes do not depend on workers
+                for requests in executor.map(generate_block, seeds, block_ids, block_sizes):
+                    for request in requests:
+                        writer.add(*request)
         else:
-            if sub.suffix == ".json":
-                sub.unlink()
-            else:
-                raise ValueError(f"Careful! Unknown file type: {sub.suffix}, it should be .json")
-    path.rmdir()
-
-
-def main():
-    test_data_dir = project_dir / "test_data"
-    if test_data_dir.exists():
-        delete_folder(test_data_dir)
-    test_data_dir.mkdir()
-
-    for _ in range(DUMMY_FOLDERS_CNT):
-        request = FakeRequest()
-        sql_integration = FakeSqlIntegration()
-        python_scoring = FakePythonScoring()
-
-        decision_dir = test_data_dir / request.request_id
-        decision_dir.mkdir(exist_ok=True)
-
-        request_dir = decision_dir / "Application"
-        request_dir.mkdir(exist_ok=True)
-        request.dump(request_dir / "Application.json")
-
-        sql_integration_dir = decision_dir / "SqlIntegration"
-        sql_integration_dir.mkdir(exist_ok=True)
-        sql_integration.dump(sql_integration_dir / "SqlIntegration.json")
-
-        random_version = randint(1, 3)
-        python_scoring_dir = decision_dir / f"PythonScoring-v{random_version}"
-        python_scoring_dir.mkdir(exist_ok=True)
-        python_scoring.dump(python_scoring_dir / f"PythonScoring-v{random_version}.json")
+            if test_data_dir.exists():
+                delete_folder(test_data_dir)
+            test_data_dir.mkdir(parents=True)
+            # Written first, so an interrupted generation is still recognized as ours
+            (test_data_dir / GENERATED_MARKER).write_text("python_task.data_generator\n")
+            dirs = [test_data_dir] * len(block_ids)
+            for _ in executor.map(generate_dirs_block, dirs, seeds, block_ids, block_sizes):
+                pass
 
     print("[bold green]Fake data generated successfully!:rocket-emoji:")
 
 
 if __name__ == "__main__":
-    main()
+    parser = argparse.ArgumentParser(description="Generate fake requests for python_task.")
+    parser.add_argument("--count", type=int, default=DUMMY_FOLDERS_CNT)
+    parser.add_argument(
+        "--seed", type=int, default=None, help="Seed for reproducible requests (random by default)"
+    )
+    parser.add_argument("--workers", type=int, default=1, help="Generator processes")
+    parser.add_argument(
+        "--format",
+        choices=OUTPUT_FORMATS,
+        default="dirs",
+        help="Directory tree under test_data or a packed test_data.ctxa archive",
+    )
+    parser.add_argument("--output", type=Path, default=project_dir / "test_data")
+    args = parser.parse_args()
+    main(args.count, args.output, args.seed, args.workers, args.format)
@@ -0,0 +1,84 @@
+from dataclasses import fields
+import json
+from typing import Any, Generic, List, Tuple, Type, TypeVar
+
+from python_task.src.models import Application, PythonScoring, SqlIntegration
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+# "orjson" when installed, otherwise "json"
+JSON_BACKEND = "orjson" if orjson is not None else "json"
+
+Schema = TypeVar("Schema")
+
+
+class DecodeError(ValueError):
+    """
+    A context file without a required field, or with a field of the wrong type.
+    """
+
+
+def loads(raw: bytes) -> Any:
+    """
+    Parses a whole JSON document like json.loads. orjson is tried first; the
+    documents it rejects but json.loads accepts (NaN, integers beyond 64 bits,
+    lone surrogates) are parsed again by json.loads, so both backends accept
+    the same documents and return the same numbers.
+    """
+    if JSON_BACKEND == "orjson":
+        try:
+            return orjson.loads(raw)
+        except orjson.JSONDecodeError:
+            pass
+    # As the baseline read_text() + json.loads: UTF-8 only, a BOM is an error
+    return json.loads(raw.decode("utf-8"))
+
+
+def check(schema: str, name: str, expected: type, value: Any) -> Any:
+    """
+    The value of a field after checking its schema type. A float field takes
+    any JSON number, kept as parsed (0 stays an int). Booleans are not numbers here.
+    """
+    if type(value) is expected:
+        return value
+    if expected is float and isinstance(value, int) and not isinstance(value, bool):
+        return value
+    if isinstance(value, expected) and not isinstance(value, bool):
+        return value
+    raise DecodeError(f"{schema}.{name} must be {expected.__name__}, got {type(value).__name__}")
+
+
+class Decoder(Generic[Schema]):
+    """
+    Decodes one context file into its schema dataclass: the document is
+    parsed, then only the schema fields are kept and type-checked. Files are
+    decoded when a decision reads them, see python_task/context.py.
+    """
+
+    def __init__(self, schema: Type[Schema]):
+        self.schema = schema
+        self.name = schema.__name__
+        self.fields: List[Tuple[str, type]] = [(field.name, field.type) for field in fields(schema)]
+
+    def parse(self, raw: bytes) -> List[Any]:
+        document = loads(raw)
+        if not isinstance(document, dict):
+            raise DecodeError(f"{self.name} must be a JSON object, got {type(document).__name__}")
+        try:
+            return [document[name] for name, _ in self.fields]
+        except KeyError as e:
+            raise DecodeError(f"{self.name}.{e.args[0]} is missing") from None
+
+    def decode(self, raw: bytes) -> Schema:
+        values = self.parse(raw)
+        return self.schema(
+            *[check(self.name, name, expected, value) for (name, expected), value in zip(self.fields, values)]
+        )
+
+
+APPLICATION = Decoder(Application)
+SQL_INTEGRATION = Decoder(SqlIntegration)
+PYTHON_SCORING = Decoder(PythonScoring)
@@ -0,0 +1,190 @@
+import argparse
+from datetime import datetime, timedelta
+import json
+from json.encoder import encode_basestring_ascii
+import random
+from typing import Any, Dict, Iterable, List, Tuple
+import uuid
+
+from rich import print
+
+from python_task.src.models import Response
+from python_task.src.models.response import CREATED_AT_FORMAT
+
+# Indented layout of a result file, as written by json.dumps(to_dict(), indent=4)
+_INDENTED = (
+    '{{\n    "result": {result},\n    "score": ',
+    ',\n    "strategy_name": {strategy_name},\n    "created_at": "',
+    '"\n}}',
+)
+# One JSON Lines record, as written by json.dumps({"request_id": ..., **to_dict()})
+_LINE = (
+    '{{"request_id": ',
+    ', "result": {result}, "score": ',
+    ', "strategy_name": {strategy_name}, "created_at": "',
+    '"}}\n',
+)
+
+Template = Tuple[bytes, ...]
+
+
+class ResponseEncoder:
+    """
+    Writes responses straight to bytes, byte-for-byte identical to serializing
+    `Response.to_dict()` with `json.dumps`. Everything constant for a
+    (result, strategy_name) pair is rendered once into a template, and
+    `created_at` is formatted once per second.
+    """
+
+    def __init__(self):
+        self.indented_templates: Dict[Tuple[str, str], Template] = {}
+        self.line_templates: Dict[Tuple[str, str], Template] = {}
+        self.created_at_key: Tuple[int, ...] = ()
+        self.created_at_bytes = b""
+
+    def created_at(self, value: datetime) -> bytes:
+        key = (value.second, value.minute, value.hour, value.day, value.month, value.year)
+        if key != self.created_at_key:
+            self.created_at_bytes = value.strftime(CREATED_AT_FORMAT).encode("ascii")
+            self.created_at_key = key
+        return self.created_at_bytes
+
+    @staticmethod
+    def score(value) -> bytes:
+        # json.dumps writes finite floats with float.__repr__ and ints with int.__repr__
+        if type(value) is float and value == value and value not in (float("inf"), float("-inf")):
+            return float.__repr__(value).encode("ascii")
+        if type(value) is int:
+            return int.__repr__(value).encode("ascii")
+        return json.dumps(value).encode("utf-8")
+
+    @staticmethod
+    def render(parts: Tuple[str, ...], response: Response) -> Template:
+        values = {
+            "result": json.dumps(response.result),
+            "strategy_name": json.dumps(response.strategy_name),
+        }
+        return tuple(part.format(**values).encode("utf-8") for part in parts)
+
+    def template(self, cache: Dict[Tuple[str, str], Template], parts, response: Response) -> Template:
+        key = (response.result, response.strategy_name)
+        template = cache.get(key)
+        if template is None:
+            template = cache[key] = self.render(parts, response)
+        return template
+
+    def encode(self, response: Response) -> bytes:
+        """
+        Result file content: json.dumps(response.to_dict(), indent=4).
+        """
+        head, middle, tail = self.template(self.indented_templates, _INDENTED, response)
+        return b"".join(
+            (head, self.score(response.score), middle, self.created_at(response.created_at), tail)
+        )
+
+    def write_line(self, buffer: bytearray, request_id: str, response: Response) -> None:
+        """
+        Appends one JSON Lines record to `buffer`.
+        """
+        head, after_id, middle, tail = self.template(self.line_templates, _LINE, response)
+        buffer += head
+        buffer += encode_basestring_ascii(request_id).encode("ascii")
+        buffer += after_id
+        buffer += self.score(response.score)
+        buffer += middle
+        buffer += self.created_at(response.created_at)
+        buffer += tail
+
+    def encode_lines(self, records: Iterable[Tuple[str, Response]]) -> bytes:
+        buffer = bytearray()
+        for request_id, response in records:
+            self.write_line(buffer, request_id, response)
+        return bytes(buffer)
+
+
+# Characters json.dumps escapes in every way it knows: quotes, backslashes,
+# control characters, non-ASCII and astral (surrogate pair) code points
+_NAME_ALPHABET = 'abc_XYZ 09"\\/\n\t\x00\x1f\x7fé€\u2028😀'
+_STRATEGY_NAMES = ("new_client_strategy", "repeat_client_strategy", "unknown_client_type", "error")
+_SPECIAL_SCORES = (
+    -1.0, 0.0, -0.0, 1e-320, 1e300, 0.1 + 0.2, float("nan"), float("inf"), float("-inf"), 0, -999, 2**70, True
+)
+
+
+def random_score(rng: random.Random) -> Any:
+    kind = rng.randrange(4)
+    if kind == 0:
+        return rng.random()
+    if kind == 1:
+        return rng.uniform(-1, 1) * 10 ** rng.randint(-30, 30)
+    if kind == 2:
+        return rng.randint(-(10**6), 10**6)
+    return rng.choice(_SPECIAL_SCORES)
+
+
+def random_responses(count: int, seed: int = 0) -> List[Tuple[str, Response]]:
+    """
+    Seeded (request_id, Response) pairs. Consecutive responses often share
+    their second, so the created_at cache is hit as well as refreshed.
+    """
+    rng = random.Random(seed)
+    created_at = datetime(2000, 1, 1)
+    records = []
+    for _ in range(count):
+        if rng.random() < 0.5:
+            created_at = datetime(1900, 1, 1) + timedelta(seconds=rng.randrange(200 * 365 * 86400))
+        created_at = created_at.replace(microsecond=rng.randrange(1_000_000))
+        if rng.random() < 0.7:
+            strategy_name = rng.choice(_STRATEGY_NAMES)
+        else:
+            strategy_name = "".join(rng.choices(_NAME_ALPHABET, k=rng.randrange(12)))
+        if rng.random() < 0.8:
+            request_id = str(uuid.UUID(int=rng.getrandbits(128), version=4))
+        else:
+            request_id = "".join(rng.choices(_NAME_ALPHABET, k=rng.randrange(12)))
+        response = Response(
+            result=rng.choice(("1", "0", "error")),
+            score=random_score(rng),
+            strategy_name=strategy_name,
+            created_at=created_at,
+        )
+        records.append((request_id, response))
+    return records
+
+
+def check_encoder(count: int, seed: int = 0) -> int:
+    """
+    Encodes `count` seeded random responses as result files and as JSON Lines
+    records, and checks both byte for byte against json.dumps. Returns the
+    number of responses compared.
+    """
+    encoder = ResponseEncoder()
+    records = random_responses(count, seed)
+    for request_id, response in records:
+        expected = json.dumps(response.to_dict(), indent=4).encode("utf-8")
+        actual = encoder.encode(response)
+        if actual != expected:
+            raise AssertionError(f"Result file of {response!r}: {actual!r} != {expected!r}")
+
+    expected_lines = b"".join(
+        json.dumps({"request_id": request_id, **response.to_dict()}).encode("utf-8") + b"\n"
+        for request_id, response in records
+    )
+    actual_lines = encoder.encode_lines(records)
+    if actual_lines != expected_lines:
+        for request_id, response in records:
+            line = encoder.encode_lines([(request_id, response)])
+            expected = json.dumps({"request_id": request_id, **response.to_dict()}).encode("utf-8") + b"\n"
+            if line != expected:
+                raise AssertionError(f"JSON Lines record of {request_id!r}: {line!r} != {expected!r}")
+        raise AssertionError("JSON Lines batch differs from json.dumps")
+    return len(records)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Check ResponseEncoder against json.dumps on random responses.")
+    parser.add_argument("--count", type=int, default=100_000)
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+    compared = check_encoder(args.count, args.seed)
+    print(f"[bold green]ResponseEncoder matches json.dumps on {compared} random responses")
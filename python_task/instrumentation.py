@@ -0,0 +1,226 @@
+from bisect import bisect_left
+from collections import Counter
+import cProfile
+from contextlib import contextmanager, nullcontext
+import json
+import os
+from pathlib import Path
+import random
+import threading
+import time
+from typing import Any, Dict, Iterator, List, Optional
+
+# Upper bounds (seconds) of the latency histogram buckets, the last one is +Inf
+LATENCY_BUCKETS = (
+    0.00005, 0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.5, 1.0, 5.0
+)
+DEFAULT_SNAPSHOT_INTERVAL = 10.0
+METRIC_FORMATS = ("json", "prometheus")
+
+_NULL_SPAN = nullcontext()
+
+
+class Histogram:
+    def __init__(self):
+        self.buckets: List[int] = [0] * (len(LATENCY_BUCKETS) + 1)
+        self.count = 0
+        self.sum = 0.0
+
+    def observe(self, seconds: float) -> None:
+        self.buckets[bisect_left(LATENCY_BUCKETS, seconds)] += 1
+        self.count += 1
+        self.sum += seconds
+
+
+class Instrumentation:
+    """
+    Timing spans, counters and latency histograms of the decision pipeline.
+    Disabled by default: `span` then returns a shared no-op context manager and
+    `count` returns immediately, so the hot path pays one attribute check.
+
+    When enabled, a daemon thread writes a snapshot every `interval` seconds to
+    `path` (JSON or Prometheus text format). With `profile_rate` > 0, that
+    fraction of requests runs under cProfile and the accumulated stats are
+    dumped next to the snapshot as `<path>.prof`.
+    """
+
+    def __init__(self):
+        self.enabled = False
+        self.path: Optional[Path] = None
+        self.metrics_format = "json"
+        self.interval = DEFAULT_SNAPSHOT_INTERVAL
+        self.profile_rate = 0.0
+        self.profiler: Optional[cProfile.Profile] = None
+        self.lock = threading.Lock()
+        self.profiler_lock = threading.Lock()
+        self.stop_event = threading.Event()
+        self.exporter: Optional[threading.Thread] = None
+        self.reset()
+
+    def reset(self) -> None:
+        self.histograms: Dict[str, Histogram] = {}
+        self.counters: Dict[str, Counter] = {}
+
+    def configure(
+        self,
+        path: Path,
+        metrics_format: str = "json",
+        interval: float = DEFAULT_SNAPSHOT_INTERVAL,
+        profile_rate: float = 0.0,
+    ) -> None:
+        if metrics_format not in METRIC_FORMATS:
+            raise ValueError(f"Unknown metrics format: {metrics_format}, expected one of {METRIC_FORMATS}")
+        self.shutdown()
+        self.path = path
+        self.metrics_format = metrics_format
+        self.interval = interval
+        self.profile_rate = profile_rate
+        self.profiler = cProfile.Profile() if profile_rate > 0 else None
+        self.enabled = True
+        self.stop_event.clear()
+        self.exporter = threading.Thread(target=self.export_periodically, daemon=True)
+        self.exporter.start()
+
+    def shutdown(self) -> None:
+        """
+        Stops the exporter and writes the final snapshot.
+        """
+        if not self.enabled:
+            return
+        self.stop_event.set()
+        if self.exporter is not None:
+            self.exporter.join()
+        self.export()
+        self.enabled = False
+
+    def forget_parent(self) -> None:
+        """
+        Drops the state inherited from a forked parent: its metrics, exporter
+        thread and possibly held locks.
+        """
+        self.enabled = False
+        self.exporter = None
+        self.lock = threading.Lock()
+        self.profiler_lock = threading.Lock()
+        self.reset()
+
+    # ========== HOT PATH ==========
+
+    def span(self, name: str):
+        if not self.enabled:
+            return _NULL_SPAN
+        return self.timed(name)
+
+    @contextmanager
+    def timed(self, name: str) -> Iterator[None]:
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(name, time.perf_counter() - started)
+
+    def observe(self, name: str, seconds: float) -> None:
+        with self.lock:
+            if name not in self.histograms:
+                self.histograms[name] = Histogram()
+            self.histograms[name].observe(seconds)
+
+    def count(self, counter: str, label: str) -> None:
+        if not self.enabled:
+            return
+        with self.lock:
+            if counter not in self.counters:
+                self.counters[counter] = Counter()
+            self.counters[counter][label] += 1
+
+    def profiled(self):
+        """
+        Profiles the enclosed block for a `profile_rate` fraction of calls.
+        """
+        if self.profiler is None or random.random() >= self.profile_rate:
+            return _NULL_SPAN
+        return self.profiling()
+
+    @contextmanager
+    def profiling(self) -> Iterator[None]:
+        # cProfile allows one active profiler per thread: skip when already busy
+        if not self.profiler_lock.acquire(blocking=False):
+            yield
+            return
+        try:
+            self.profiler.enable()
+            try:
+                yield
+            finally:
+                self.profiler.disable()
+        finally:
+            self.profiler_lock.release()
+
+    # ========== EXPORT ==========
+
+    def snapshot(self) -> Dict[str, Any]:
+        with self.lock:
+            return {
+                "created_at": time.time(),
+                "pid": os.getpid(),
+                "spans": {
+                    name: {
+                        "count": histogram.count,
+                        "sum_s": histogram.sum,
+                        "buckets": dict(
+                            zip([*map(str, LATENCY_BUCKETS), "+Inf"], histogram.buckets)
+                        ),
+                    }
+                    for name, histogram in self.histograms.items()
+                },
+                "counters": {name: dict(counter) for name, counter in self.counters.items()},
+            }
+
+    def to_prometheus(self, snapshot: Dict[str, Any]) -> str:
+        lines = ["# TYPE decision_span_seconds histogram"]
+        for name, span in snapshot["spans"].items():
+            cumulative = 0
+            for bound, bucket_count in span["buckets"].items():
+                cumulative += bucket_count
+                lines.append(f'decision_span_seconds_bucket{{span="{name}",le="{bound}"}} {cumulative}')
+            lines.append(f'decision_span_seconds_sum{{span="{name}"}} {span["sum_s"]}')
+            lines.append(f'decision_span_seconds_count{{span="{name}"}} {span["count"]}')
+        for counter, values in snapshot["counters"].items():
+            lines.append(f"# TYPE decision_{counter}_total counter")
+            for label, value in values.items():
+                lines.append(f'decision_{counter}_total{{name="{label}"}} {value}')
+        return "\n".join(lines) + "\n"
+
+    def export(self) -> None:
+        if self.path is None:
+            return
+        snapshot = self.snapshot()
+        if self.metrics_format == "prometheus":
+            content = self.to_prometheus(snapshot)
+        else:
+            content = json.dumps(snapshot, indent=4)
+        tmp_path = self.path.with_name(self.path.name + ".tmp")
+        tmp_path.write_text(content)
+        os.replace(tmp_path, self.path)
+        if self.profiler is not None:
+            with self.profiler_lock:
+                self.profiler.dump_stats(self.path.with_name(self.path.name + ".prof"))
+
+    def export_periodically(self) -> None:
+        while not self.stop_event.wait(self.interval):
+            self.export()
+
+
+METRICS = Instrumentation()
+
+
+def configure_worker(
+    path: Path, metrics_format: str, interval: float, profile_rate: float
+) -> None:
+    """
+    Process pool initializer: every worker writes its own `<path>.<pid>` snapshot.
+    """
+    METRICS.forget_parent()
+    METRICS.configure(
+        path.with_name(f"{path.name}.{os.getpid()}"), metrics_format, interval, profile_rate
+    )
@@ -0,0 +1,178 @@
+import hashlib
+import os
+from pathlib import Path
+import sqlite3
+from typing import Dict, Iterable, List, Optional, Tuple
+
+from python_task.archive import read_entry
+from python_task.context import APPLICATION_DIR, SQL_INTEGRATION_DIR, find_scoring_dirs
+from python_task.src.models import ArchiveEntry, Request
+
+# Bumped when signatures or fingerprints change meaning; older manifests start over
+MANIFEST_VERSION = 1
+MISSING = "-"
+
+# (stat signature, content fingerprint) of the inputs of a decision
+Key = Tuple[Optional[str], str]
+
+
+def manifest_path(result_dir: Path, sink_kind: str, compress: bool = False) -> Path:
+    """
+    One manifest per result layout, so switching sinks never skips requests
+    whose decisions only exist in another layout.
+    """
+    return result_dir / f".manifest-{sink_kind}{'-gz' if compress else ''}.sqlite3"
+
+
+def context_files(base_path: Path) -> List[str]:
+    """
+    Every file a decision may read, relative to the context directory:
+    Application, SqlIntegration and the JSON files of all scoring directories
+    (a new scoring version is a change too).
+    """
+    files = [f"{APPLICATION_DIR}/{APPLICATION_DIR}.json", f"{SQL_INTEGRATION_DIR}/{SQL_INTEGRATION_DIR}.json"]
+    try:
+        scoring_dirs = sorted(find_scoring_dirs(base_path).values())
+    except OSError:
+        return files
+    for name in scoring_dirs:
+        try:
+            with os.scandir(base_path / name) as entries:
+                files.extend(sorted(f"{name}/{entry.name}" for entry in entries if entry.name.endswith(".json")))
+        except OSError:
+            continue
+    return files
+
+
+def signature(base_path: Path) -> str:
+    """
+    Names, sizes and mtimes of the context files: stat calls only, no reads.
+    Missing files are part of the signature, so they are noticed when they appear.
+    """
+    parts = []
+    for name in context_files(base_path):
+        try:
+            stat = os.stat(base_path / name)
+        except OSError:
+            parts.append(f"{name}:{MISSING}")
+            continue
+        parts.append(f"{name}:{stat.st_size}:{stat.st_mtime_ns}")
+    return "|".join(parts)
+
+
+def fingerprint(request: Request) -> str:
+    """
+    BLAKE2b digest of the raw context: the three JSON payloads of an archive
+    entry, or every context file of a directory.
+    """
+    digest = hashlib.blake2b(digest_size=16)
+    if isinstance(request.context, ArchiveEntry):
+        try:
+            version, *payloads = read_entry(request.context)
+        except OSError:
+            # Packed unreadable, or re-packed since: decided as an error, again once it changes
+            digest.update(MISSING.encode())
+            return digest.hexdigest()
+        digest.update(f"v{version}".encode())
+        for payload in payloads:
+            digest.update(len(payload).to_bytes(8, "little"))
+            digest.update(payload)
+        return digest.hexdigest()
+
+    for name in context_files(request.context):
+        digest.update(name.encode() + b"\0")
+        try:
+            with open(request.context / name, "rb") as f:
+                payload = f.read()
+        except OSError:
+            digest.update(MISSING.encode())
+            continue
+        digest.update(len(payload).to_bytes(8, "little"))
+        digest.update(payload)
+    return digest.hexdigest()
+
+
+class Manifest:
+    """
+    Inputs of every persisted decision, by request_id, in a SQLite file next
+    to the results. A request is decided again only when its context is new
+    or changed: an unchanged stat signature skips it without reading a file,
+    otherwise the content fingerprint decides.
+
+    Decisions are recorded from the sink's flushes (`record` is its `on_flush`),
+    so exactly the persisted ones are recorded: after a crash the next run
+    redoes the unrecorded tail and nothing else.
+    """
+
+    def __init__(self, path: Path):
+        self.path = path
+        self.connection = sqlite3.connect(path)
+        self.connection.execute("PRAGMA journal_mode=WAL")
+        if self.connection.execute("PRAGMA user_version").fetchone()[0] != MANIFEST_VERSION:
+            with self.connection:
+                self.connection.execute("DROP TABLE IF EXISTS decided")
+                self.connection.execute(f"PRAGMA user_version = {MANIFEST_VERSION}")
+        self.connection.execute(
+            """
+            CREATE TABLE IF NOT EXISTS decided (
+                request_id TEXT PRIMARY KEY,
+                signature TEXT,
+                fingerprint TEXT NOT NULL
+            )
+            """
+        )
+        self.entries: Dict[str, Key] = {
+            request_id: (sig, fp)
+            for request_id, sig, fp in self.connection.execute("SELECT * FROM decided")
+        }
+        # Keys of selected requests, until their decisions are recorded
+        self.keys: Dict[str, Key] = {}
+
+    def select(self, requests: Iterable[Request]) -> List[Request]:
+        """
+        Requests with a new or changed context. The signature is taken before
+        any read, so a file changed while it is being decided shows up as a
+        change on the next run.
+        """
+        pending: List[Request] = []
+        touched: List[Tuple[str, Optional[str], str]] = []
+        for request in requests:
+            stored = self.entries.get(request.request_id)
+            sig = None if isinstance(request.context, ArchiveEntry) else signature(request.context)
+            if stored is not None and sig is not None and stored[0] == sig:
+                continue
+            fp = fingerprint(request)
+            if stored is not None and stored[1] == fp:
+                # Touched but identical: remember the new signature, skip the decision
+                touched.append((request.request_id, sig, fp))
+                continue
+            self.keys[request.request_id] = (sig, fp)
+            pending.append(request)
+        self.save(touched)
+        return pending
+
+    def record(self, request_ids: Iterable[str]) -> None:
+        """
+        Records decisions the sink has just persisted, in one transaction.
+        """
+        self.save([(request_id, *self.keys.pop(request_id)) for request_id in request_ids])
+
+    def save(self, rows: List[Tuple[str, Optional[str], str]]) -> None:
+        if not rows:
+            return
+        with self.connection:
+            self.connection.executemany("INSERT OR REPLACE INTO decided VALUES (?, ?, ?)", rows)
+        for request_id, sig, fp in rows:
+            self.entries[request_id] = (sig, fp)
+
+    def close(self) -> None:
+        self.connection.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+    def __len__(self):
+        return len(self.entries)
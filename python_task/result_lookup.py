@@ -1,13 +1,330 @@
+import argparse
 from collections import Counter
+from dataclasses import asdict, dataclass, field
+import hashlib
 import json
+import os
 from pathlib import Path
+import sqlite3
+from typing import Any, Collection, Dict, List, Optional
 
 from rich import print
+from rich.table import Table
 
+from python_task.sinks import JSONL_FILE_NAME, SQLITE_FILE_NAME, read_jsonl, read_lines
 
-def strategies_counters():
-    strategies: Counter[str] = Counter()
+STATE_VERSION = 4
+STATE_FILE_NAME = ".result_lookup_state.json"
 
+# Scores are tracked in a fixed histogram over [0, 1): constant memory per strategy
+SCORE_BINS = 100
+QUANTILES = (0.1, 0.5, 0.9)
+# Bytes at both ends of the processed part of a JSON Lines file compared to
+# tell a replaced file from a grown one
+HEAD_SIZE = 4096
+# How every record written by JsonLinesSink starts: its request_id is sliced
+# out of the line without parsing it
+RECORD_PREFIX = b'{"request_id": "'
+
+
+class StaleStateError(Exception):
+    """
+    Raised when results were rewritten or deleted after being aggregated.
+    """
+
+
+@dataclass
+class StrategyStats:
+    count: int = 0
+    approved: int = 0
+    errors: int = 0
+    # SCORE_BINS bins of equal width plus an overflow bin for scores >= 1
+    score_histogram: List[int] = field(default_factory=lambda: [0] * (SCORE_BINS + 1))
+
+    def add(self, result: Dict[str, Any], sign: int = 1) -> None:
+        self.count += sign
+        if result.get("result") == "1":
+            self.approved += sign
+        if result.get("result") == "error":
+            self.errors += sign
+            return
+        score = result.get("score")
+        if isinstance(score, (int, float)):
+            self.score_histogram[min(max(int(score * SCORE_BINS), 0), SCORE_BINS)] += sign
+
+    def remove(self, result: Dict[str, Any]) -> None:
+        self.add(result, sign=-1)
+
+    @property
+    def approval_rate(self) -> float:
+        return self.approved / self.count if self.count else 0.0
+
+    @property
+    def error_rate(self) -> float:
+        return self.errors / self.count if self.count else 0.0
+
+    def quantile(self, q: float) -> Optional[float]:
+        """
+        Upper edge of the histogram bin holding the q-quantile (1 / SCORE_BINS precision).
+        """
+        total = sum(self.score_histogram)
+        if not total:
+            return None
+        cumulative = 0
+        for i, bin_count in enumerate(self.score_histogram):
+            cumulative += bin_count
+            if cumulative >= q * total:
+                return (i + 1) / SCORE_BINS if i < SCORE_BINS else float("inf")
+        return float("inf")
+
+
+def summary(result: Dict[str, Any]) -> Dict[str, Any]:
+    """
+    The fields of a result that its statistics depend on.
+    """
+    return {key: result.get(key) for key in ("strategy_name", "result", "score")}
+
+
+def head_digest(path: Path, offset: int) -> str:
+    """
+    Digest of the first and the last HEAD_SIZE bytes of the first `offset`
+    bytes of a file: the part already processed.
+    """
+    digest = hashlib.blake2b(digest_size=16)
+    with open(path, "rb") as f:
+        digest.update(f.read(min(offset, HEAD_SIZE)))
+        f.seek(max(0, offset - HEAD_SIZE))
+        digest.update(f.read(min(offset, HEAD_SIZE)))
+    return digest.hexdigest()
+
+
+def record_request_id(line: bytes) -> Optional[str]:
+    """
+    The request_id of a JSON Lines record.
+    """
+    if line.startswith(RECORD_PREFIX):
+        end = line.find(b'"', len(RECORD_PREFIX))
+        request_id = line[len(RECORD_PREFIX) : end]
+        if end >= 0 and b"\\" not in request_id:
+            return request_id.decode("utf-8")
+    return json.loads(line).get("request_id")
+
+
+def last_records(path: Path, end: int, request_ids: Collection[str]) -> Dict[str, Dict[str, Any]]:
+    """
+    Summaries of the last record of each of `request_ids` within the first
+    `end` bytes of a JSON Lines file. Only the matching lines are parsed.
+    """
+    found: Dict[str, Dict[str, Any]] = {}
+    for line, offset in read_lines(path):
+        if offset > end:
+            break
+        request_id = record_request_id(line)
+        if request_id in request_ids:
+            found[request_id] = summary(json.loads(line))
+    return found
+
+
+@dataclass
+class AggregatorState:
+    """
+    Aggregates plus the cursors of every result layout: nothing here grows
+    with the number of results.
+    """
+
+    result_dir: str = ""
+    # Result files: the newest mtime counted and how many files were counted
+    files_mtime_ns: int = 0
+    files_count: int = 0
+    jsonl_offsets: Dict[str, int] = field(default_factory=dict)
+    # Digest of the first processed bytes of every JSON Lines file: a replaced
+    # file is recounted from the start
+    jsonl_heads: Dict[str, str] = field(default_factory=dict)
+    sqlite_rowid: int = 0
+    sqlite_rows: int = 0
+    # Full runs the results table had seen (its user_version): rowids restart after each
+    sqlite_runs: int = 0
+    strategies: Dict[str, StrategyStats] = field(default_factory=dict)
+
+
+class ResultAggregator:
+    """
+    Incremental strategy statistics over a result directory. The state keeps
+    the strategy aggregates, the newest result file mtime counted, the byte
+    offset reached in JSON Lines files and the last SQLite rowid, so a repeat
+    call only reads new results.
+
+    A request re-decided into a JSON Lines file takes back the contribution of
+    its previous record. Result files and SQLite rows overwrite the previous
+    decision in place, which the cursors cannot undo: a rewritten or deleted
+    one raises StaleStateError and everything is recounted.
+    """
+
+    def __init__(self, result_dir: Path, state_path: Path):
+        self.result_dir = result_dir
+        self.state_path = state_path
+        self.state = self.load_state()
+
+    def load_state(self) -> AggregatorState:
+        if not self.state_path.exists():
+            return AggregatorState(result_dir=str(self.result_dir))
+        raw = json.loads(self.state_path.read_text())
+        if raw.get("version") != STATE_VERSION or raw.get("result_dir") != str(self.result_dir):
+            return AggregatorState(result_dir=str(self.result_dir))
+        return AggregatorState(
+            result_dir=raw["result_dir"],
+            files_mtime_ns=raw["files_mtime_ns"],
+            files_count=raw["files_count"],
+            jsonl_offsets=raw["jsonl_offsets"],
+            jsonl_heads=raw["jsonl_heads"],
+            sqlite_rowid=raw["sqlite_rowid"],
+            sqlite_rows=raw["sqlite_rows"],
+            sqlite_runs=raw["sqlite_runs"],
+            strategies={name: StrategyStats(**stats) for name, stats in raw["strategies"].items()},
+        )
+
+    def save_state(self) -> None:
+        raw = {"version": STATE_VERSION, **asdict(self.state)}
+        tmp_path = self.state_path.with_suffix(".tmp")
+        tmp_path.write_text(json.dumps(raw))
+        os.replace(tmp_path, self.state_path)
+
+    def reset(self) -> None:
+        self.state = AggregatorState(result_dir=str(self.result_dir))
+
+    def add(self, result: Dict[str, Any]) -> None:
+        strategy = result.get("strategy_name", "unknown")
+        if strategy not in self.state.strategies:
+            self.state.strategies[strategy] = StrategyStats()
+        self.state.strategies[strategy].add(result)
+
+    def remove(self, result: Dict[str, Any]) -> None:
+        stats = self.state.strategies.get(result.get("strategy_name", "unknown"))
+        if stats is not None:
+            stats.remove(result)
+
+    def update(self) -> int:
+        """
+        Processes results added since the previous call and persists the state.
+        Returns the number of new results.
+        """
+        processed = self.update_files()
+        for name in (JSONL_FILE_NAME, JSONL_FILE_NAME + ".gz"):
+            processed += self.update_jsonl(self.result_dir / name)
+        processed += self.update_sqlite(self.result_dir / SQLITE_FILE_NAME)
+        self.save_state()
+        return processed
+
+    def update_files(self) -> int:
+        """
+        Counts the result files written since the previous call. Files not
+        newer than the high-water mtime were counted before; fewer of them
+        than counted means some were rewritten or deleted.
+        """
+        high_water = self.state.files_mtime_ns
+        counted, new = 0, []
+        with os.scandir(self.result_dir) as entries:
+            for entry in entries:
+                if not entry.name.endswith(".json") or not entry.is_file():
+                    continue
+                # Taken before the read: a file rewritten meanwhile is read again next time
+                mtime_ns = entry.stat().st_mtime_ns
+                if mtime_ns <= high_water:
+                    counted += 1
+                else:
+                    new.append((entry.path, mtime_ns))
+        if counted != self.state.files_count:
+            raise StaleStateError("result files were rewritten or deleted after they were counted")
+        for path, mtime_ns in new:
+            self.add(summary(json.loads(Path(path).read_text())))
+            self.state.files_mtime_ns = max(self.state.files_mtime_ns, mtime_ns)
+        self.state.files_count += len(new)
+        return len(new)
+
+    def update_jsonl(self, path: Path) -> int:
+        """
+        Counts the records appended since the previous call. For a request_id
+        decided again, the previous record (earlier in this batch or in the
+        part already counted) is taken back first.
+        """
+        if not path.exists():
+            return 0
+        start = self.state.jsonl_offsets.get(path.name, 0)
+        head = self.state.jsonl_heads.get(path.name)
+        if path.stat().st_size < start or (head is not None and head_digest(path, start) != head):
+            # The file was recreated: the saved offset is meaningless
+            raise StaleStateError(f"{path.name} was replaced after it was processed")
+        latest: Dict[str, Dict[str, Any]] = {}
+        processed, offset = 0, start
+        for result, offset in read_jsonl(path, start):
+            processed += 1
+            request_id = result.get("request_id")
+            if request_id is None:
+                self.add(summary(result))
+                continue
+            previous = latest.pop(request_id, None)
+            if previous is not None:
+                self.remove(previous)
+            latest[request_id] = summary(result)
+            self.add(latest[request_id])
+        if latest and start:
+            for previous in last_records(path, start, latest.keys()).values():
+                self.remove(previous)
+        self.state.jsonl_offsets[path.name] = offset
+        self.state.jsonl_heads[path.name] = head_digest(path, offset)
+        return processed
+
+    def update_sqlite(self, path: Path) -> int:
+        if not path.exists():
+            return 0
+        connection = sqlite3.connect(f"file:{path}?mode=ro", uri=True)
+        connection.row_factory = sqlite3.Row
+        try:
+            (runs,) = connection.execute("PRAGMA user_version").fetchone()
+            if runs != self.state.sqlite_runs:
+                if self.state.sqlite_rows:
+                    raise StaleStateError("results table was cleared by a full run")
+                self.state.sqlite_runs = runs
+            processed = 0
+            for row in connection.execute(
+                "SELECT rowid, * FROM results WHERE rowid > ? ORDER BY rowid",
+                (self.state.sqlite_rowid,),
+            ):
+                self.add(dict(row))
+                self.state.sqlite_rowid = row["rowid"]
+                processed += 1
+            self.state.sqlite_rows += processed
+            (rows,) = connection.execute("SELECT COUNT(*) FROM results").fetchone()
+        finally:
+            connection.close()
+        if rows != self.state.sqlite_rows:
+            # Rows were replaced or deleted since they were counted
+            raise StaleStateError("results table changed below the processed rowid")
+        return processed
+
+
+def print_stats(strategies: Dict[str, StrategyStats]) -> None:
+    table = Table(title="Strategies statistics")
+    table.add_column("Strategy")
+    table.add_column("Count", justify="right")
+    table.add_column("Approval rate", justify="right")
+    table.add_column("Error rate", justify="right")
+    for q in QUANTILES:
+        table.add_column(f"Score p{int(q * 100)}", justify="right")
+
+    for name, stats in sorted(strategies.items()):
+        quantiles = [stats.quantile(q) for q in QUANTILES]
+        table.add_row(
+            name,
+            str(stats.count),
+            f"{stats.approval_rate:.2%}",
+            f"{stats.error_rate:.2%}",
+            *("-" if value is None else f"{value:.2f}" for value in quantiles),
+        )
+    print(table)
+
+
+def strategies_counters(reset: bool = False):
     test_result_folder = Path(__file__).parent / "test_result"
     if not test_result_folder.exists():
         print("[bold red]No test results found.")
@@ -15,18 +332,28 @@ def strategies_counters():
         print("See the README for more details.")
         return
 
-    for result_file in test_result_folder.iterdir():
-        if not result_file.is_file():
-            continue
-        if result_file.suffix != ".json":
-            continue
-        result = json.loads(result_file.read_text())
-        strategy = result.get("strategy_name", "unknown")
-        strategies[strategy] += 1
+    aggregator = ResultAggregator(test_result_folder, Path(__file__).parent / STATE_FILE_NAME)
+    if reset:
+        aggregator.reset()
+    try:
+        processed = aggregator.update()
+    except StaleStateError as e:
+        print(f"[bold yellow]Results changed since the last lookup ({e}), recounting from scratch.")
+        aggregator.reset()
+        processed = aggregator.update()
 
+    strategies: Counter[str] = Counter(
+        {name: stats.count for name, stats in aggregator.state.strategies.items()}
+    )
+    print(f"New results processed: {processed}")
     print("Strategies counters:")
     print(strategies)
+    print_stats(aggregator.state.strategies)
 
 
 if __name__ == "__main__":
-    strategies_counters()
+    parser = argparse.ArgumentParser(description="Strategy statistics over test_result.")
+    parser.add_argument(
+        "--reset", action="store_true", help="Forget the saved state and recount everything"
+    )
+    strategies_counters(reset=parser.parse_args().reset)
@@ -0,0 +1,74 @@
+import argparse
+import hashlib
+import math
+import random
+import uuid
+
+from rich import print
+
+PURE_STREAM_SHARE_PERCENT = 5
+
+# Every use of the hash gets its own personalization, so that the buckets
+# of one split (e.g. pure stream) are independent from another (e.g. shards)
+PURE_STREAM_PURPOSE = b"pure_stream"
+SHARD_PURPOSE = b"shard"
+
+
+def request_id_bytes(request_id: str) -> bytes:
+    """
+    Canonical bytes of a request_id: the 16 UUID bytes when it is a UUID (so any
+    spelling of the same UUID routes the same way), its UTF-8 encoding otherwise.
+    """
+    try:
+        return uuid.UUID(request_id).bytes
+    except ValueError:
+        return request_id.encode("utf-8")
+
+
+def stable_hash(request_id: str, purpose: bytes) -> int:
+    """
+    64-bit hash of a request_id, identical across processes, machines and Python
+    versions (unlike the salted built-in `hash`).
+    """
+    digest = hashlib.blake2b(request_id_bytes(request_id), digest_size=8, person=purpose).digest()
+    return int.from_bytes(digest, "big")
+
+
+def bucket(request_id: str, buckets: int, purpose: bytes) -> int:
+    return stable_hash(request_id, purpose) % buckets
+
+
+def is_pure_stream(request_id: str) -> bool:
+    return bucket(request_id, 100, PURE_STREAM_PURPOSE) < PURE_STREAM_SHARE_PERCENT
+
+
+def shard_of(request_id: str, shards_count: int) -> int:
+    return bucket(request_id, shards_count, SHARD_PURPOSE)
+
+
+def check_pure_stream_share(count: int, seed: int = 0) -> float:
+    """
+    Routes `count` seeded random UUIDs and checks that the pure stream share is
+    PURE_STREAM_SHARE_PERCENT within 5 standard deviations. Returns the share.
+    """
+    rng = random.Random(seed)
+    hits = sum(
+        is_pure_stream(str(uuid.UUID(int=rng.getrandbits(128), version=4))) for _ in range(count)
+    )
+    share = hits / count
+    expected = PURE_STREAM_SHARE_PERCENT / 100
+    tolerance = 5 * math.sqrt(expected * (1 - expected) / count)
+    if abs(share - expected) > tolerance:
+        raise AssertionError(
+            f"Pure stream share {share:.4%} is not within {tolerance:.4%} of {expected:.0%}"
+        )
+    return share
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Check the pure stream proportion at scale.")
+    parser.add_argument("--count", type=int, default=1_000_000)
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+    share = check_pure_stream_share(args.count, args.seed)
+    print(f"[bold green]Pure stream share over {args.count} request ids: {share:.4%}")
@@ -1,32 +1,381 @@
-import json
+import argparse
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from math import ceil
+import os
 from pathlib import Path
+import signal
+import threading
+import time
+from typing import Iterator, List, Optional, Tuple
 
+from rich import print
 from tqdm import tqdm
 
+from python_task.archive import open_archive
+from python_task.instrumentation import (
+    DEFAULT_SNAPSHOT_INTERVAL,
+    METRIC_FORMATS,
+    METRICS,
+    configure_worker,
+)
+from python_task.manifest import Manifest, manifest_path
+from python_task.routing import shard_of
 from python_task.src.models import Request, Response
 from python_task.scoring import main
+from python_task.sinks import DEFAULT_BATCH_SIZE, SINK_KINDS, FileSink, ResultSink, open_sink
 
+CHUNK_SIZE = 256
 
-def run() -> None:
-    test_data_dir = Path(__file__).parent / "test_data"
-    test_result_dir = Path(__file__).parent / "test_result"
 
-    if not test_data_dir.exists():
+def parse_shard(value: str) -> Tuple[int, int]:
+    """
+    Parses a "i/N" shard spec, where i is zero-based and lower than N.
+    """
+    try:
+        index, count = (int(part) for part in value.split("/"))
+    except ValueError:
+        raise argparse.ArgumentTypeError(f"Shard must look like i/N, got {value!r}")
+    if count < 1 or not 0 <= index < count:
+        raise argparse.ArgumentTypeError(f"Shard index must be in [0, {count}), got {index}")
+    return index, count
+
+
+def iter_request_dirs(test_data_dir: Path, shard: Optional[Tuple[int, int]] = None) -> Iterator[Path]:
+    """
+    Yields request directories, keeping only the ones of the given shard.
+    """
+    with os.scandir(test_data_dir) as entries:
+        for entry in entries:
+            if not entry.is_dir():
+                continue
+            if shard is not None and shard_of(entry.name, shard[1]) != shard[0]:
+                continue
+            yield Path(entry.path)
+
+
+def iter_requests(
+    test_data_dir: Path, shard: Optional[Tuple[int, int]] = None, archive: Optional[Path] = None
+) -> Iterator[Request]:
+    """
+    Yields the requests to decide: the directories of `test_data_dir`, or the
+    entries of a packed context archive when one is given.
+    """
+    if archive is None:
+        for sub_dir in iter_request_dirs(test_data_dir, shard):
+            yield Request(request_id=sub_dir.name, context=sub_dir)
         return
+    for request_id, entry in open_archive(archive):
+        if shard is not None and shard_of(request_id, shard[1]) != shard[0]:
+            continue
+        yield Request(request_id=request_id, context=entry)
+
+
+def decide(request: Request) -> Response:
+    with METRICS.profiled():
+        return main(request)
+
+
+def write(sink: ResultSink, request_id: str, response: Response) -> None:
+    with METRICS.span("serialize"):
+        sink.write(request_id, response)
+
+
+def process_chunk(requests: List[Request], test_result_dir: Path) -> int:
+    """
+    Worker entrypoint for the per-file layout. Every request has its own result
+    file, so workers never write to the same file and need no locking.
+    """
+    sink = FileSink(test_result_dir)
+    for request in requests:
+        write(sink, request.request_id, decide(request))
+    if METRICS.enabled:
+        # Pool workers exit without running shutdown hooks
+        METRICS.export()
+    return len(requests)
+
+
+def init_worker(*metrics_args) -> None:
+    """
+    Process pool initializer of incremental runs: Ctrl+C is left to the
+    parent, so workers finish the chunk they are deciding.
+    """
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+    if metrics_args:
+        configure_worker(*metrics_args)
+
+
+class GracefulStop:
+    """
+    Turns the first Ctrl+C into a request to stop, checked between decisions,
+    so an interrupt never lands between persisting a batch and recording it.
+    A second Ctrl+C interrupts at once.
+    """
+
+    def __init__(self):
+        self.requested = False
+        self.previous = None
+
+    def handle(self, signum, frame) -> None:
+        if self.requested:
+            raise KeyboardInterrupt
+        self.requested = True
+        print("[bold red]Stopping after the decisions in progress (Ctrl+C again to abort)")
+
+    def sleep(self, seconds: float) -> None:
+        deadline = time.monotonic() + seconds
+        while not self.requested and time.monotonic() < deadline:
+            time.sleep(min(0.2, deadline - time.monotonic()))
 
+    def __enter__(self):
+        # Signal handlers can only be installed from the main thread
+        if threading.current_thread() is threading.main_thread():
+            self.previous = signal.signal(signal.SIGINT, self.handle)
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        if self.previous is not None:
+            signal.signal(signal.SIGINT, self.previous)
+
+
+def decide_chunk(requests: List[Request]) -> List[Tuple[str, Response]]:
+    """
+    Worker entrypoint for bulk sinks: decisions go back to the parent process,
+    the only writer of the shared result file.
+    """
+    decisions = [(request.request_id, decide(request)) for request in requests]
+    if METRICS.enabled:
+        METRICS.export()
+    return decisions
+
+
+def run(
+    workers: int = 1,
+    shard: Optional[Tuple[int, int]] = None,
+    sink_kind: str = "files",
+    batch_size: int = DEFAULT_BATCH_SIZE,
+    compress: bool = False,
+    test_data_dir: Path = Path(__file__).parent / "test_data",
+    test_result_dir: Path = Path(__file__).parent / "test_result",
+    metrics_file: Optional[Path] = None,
+    metrics_format: str = "json",
+    metrics_interval: float = DEFAULT_SNAPSHOT_INTERVAL,
+    profile_rate: float = 0.0,
+    archive: Optional[Path] = None,
+    incremental: bool = False,
+    watch: Optional[float] = None,
+) -> None:
+    """
+    Decides every request, or with `incremental` only the ones whose context is
+    new or changed since the last run. `watch` keeps polling for new requests
+    every `watch` seconds (incremental, until interrupted).
+    """
+    if watch is None and archive is None and not test_data_dir.exists():
+        return
+
+    if metrics_file is not None:
+        METRICS.configure(metrics_file, metrics_format, metrics_interval, profile_rate)
+    try:
+        if not incremental and watch is None:
+            requests = list(iter_requests(test_data_dir, shard, archive))
+            run_requests(requests, workers, sink_kind, batch_size, compress, test_result_dir)
+            return
+
+        test_result_dir.mkdir(exist_ok=True)
+        manifest = Manifest(manifest_path(test_result_dir, sink_kind, compress))
+        with manifest, GracefulStop() as stop:
+            while not stop.requested:
+                if archive is not None or test_data_dir.exists():
+                    run_incremental(
+                        manifest,
+                        stop,
+                        test_data_dir,
+                        shard,
+                        archive,
+                        workers,
+                        sink_kind,
+                        batch_size,
+                        compress,
+                        test_result_dir,
+                    )
+                if watch is None:
+                    return
+                stop.sleep(watch)
+    finally:
+        METRICS.shutdown()
+
+
+def run_incremental(
+    manifest: Manifest,
+    stop: GracefulStop,
+    test_data_dir: Path,
+    shard: Optional[Tuple[int, int]],
+    archive: Optional[Path],
+    workers: int,
+    sink_kind: str,
+    batch_size: int,
+    compress: bool,
+    test_result_dir: Path,
+) -> None:
+    known = len(manifest)
+    requests = manifest.select(iter_requests(test_data_dir, shard, archive))
+    if not requests:
+        return
+    print(f"[bold green]{len(requests)} new or changed requests ({known} already decided)")
+    run_requests(requests, workers, sink_kind, batch_size, compress, test_result_dir, manifest, stop)
+
+
+def run_requests(
+    requests: List[Request],
+    workers: int,
+    sink_kind: str,
+    batch_size: int,
+    compress: bool,
+    test_result_dir: Path,
+    manifest: Optional[Manifest] = None,
+    stop: Optional[GracefulStop] = None,
+) -> None:
+    """
+    Decides `requests` and writes the results. With a manifest, every batch
+    the sink persists is recorded in it; a `stop` request ends the run early
+    between decisions.
+    """
     test_result_dir.mkdir(exist_ok=True)
 
-    for sub_dir in tqdm(list(test_data_dir.iterdir())):
-        if not sub_dir.is_dir():
-            continue
-        request_id = sub_dir.name
-        request = Request(request_id=request_id, context=sub_dir)
-        response: Response = main(request)
+    def stopping() -> bool:
+        return stop is not None and stop.requested
+
+    with open_sink(sink_kind, test_result_dir, batch_size, compress, append=manifest is not None) as sink:
+        if manifest is not None:
+            sink.on_flush = manifest.record
+        if workers <= 1:
+            for request in tqdm(requests):
+                write(sink, request.request_id, decide(request))
+                if stopping():
+                    break
+            return
+
+        chunk_size = max(1, min(CHUNK_SIZE, ceil(len(requests) / workers)))
+        chunks = [requests[i : i + chunk_size] for i in range(0, len(requests), chunk_size)]
+        metrics_args = (
+            (METRICS.path, METRICS.metrics_format, METRICS.interval, METRICS.profile_rate)
+            if METRICS.enabled
+            else ()
+        )
+        if stop is not None:
+            pool = ProcessPoolExecutor(max_workers=workers, initializer=init_worker, initargs=metrics_args)
+        else:
+            pool = ProcessPoolExecutor(
+                max_workers=workers,
+                initializer=configure_worker if METRICS.enabled else None,
+                initargs=metrics_args,
+            )
+        with pool as executor, tqdm(total=len(requests)) as bar:
+            if isinstance(sink, FileSink):
+                futures = {executor.submit(process_chunk, chunk, test_result_dir): chunk for chunk in chunks}
+            else:
+                futures = {executor.submit(decide_chunk, chunk): chunk for chunk in chunks}
+            for future in as_completed(futures):
+                if isinstance(sink, FileSink):
+                    bar.update(future.result())
+                    # The worker has written every file of the chunk
+                    if manifest is not None:
+                        manifest.record(request.request_id for request in futures[future])
+                else:
+                    decisions = future.result()
+                    for request_id, response in decisions:
+                        write(sink, request_id, response)
+                    bar.update(len(decisions))
+                if stopping():
+                    # Chunks already running finish, their results are left for the next run
+                    for pending in futures:
+                        pending.cancel()
+                    break
+
 
-        result_file_path = test_result_dir / f"{request_id}.json"
-        with open(result_file_path, "w") as f:
-            f.write(json.dumps(response.to_dict(), indent=4))
+def parse_args(argv: Optional[List[str]] = None) -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description="Run decisions for all requests in test_data.")
+    parser.add_argument(
+        "--workers", type=int, default=1, help="Number of worker processes (default: 1, serial)"
+    )
+    parser.add_argument(
+        "--shard",
+        type=parse_shard,
+        default=None,
+        help="Process only shard i of N (zero-based), e.g. --shard 0/4",
+    )
+    parser.add_argument(
+        "--sink",
+        choices=SINK_KINDS,
+        default="files",
+        help="Result layout: one JSON file per request, a JSON Lines file or a SQLite table",
+    )
+    parser.add_argument(
+        "--batch-size",
+        type=int,
+        default=DEFAULT_BATCH_SIZE,
+        help="Decisions persisted per write by bulk sinks",
+    )
+    parser.add_argument("--compress", action="store_true", help="Gzip the JSON Lines sink")
+    parser.add_argument(
+        "--archive",
+        type=Path,
+        default=None,
+        help="Read contexts from a packed archive (python -m python_task.archive) instead of test_data",
+    )
+    parser.add_argument(
+        "--incremental",
+        action="store_true",
+        help="Decide only requests that are new or changed since the last run (manifest in the result dir)",
+    )
+    parser.add_argument(
+        "--watch",
+        type=float,
+        default=None,
+        metavar="SECONDS",
+        help="Keep polling test_data for new or changed requests every SECONDS (implies --incremental)",
+    )
+    parser.add_argument(
+        "--metrics-file",
+        type=Path,
+        default=None,
+        help="Enable instrumentation and write periodic snapshots to this file",
+    )
+    parser.add_argument("--metrics-format", choices=METRIC_FORMATS, default="json")
+    parser.add_argument(
+        "--metrics-interval",
+        type=float,
+        default=DEFAULT_SNAPSHOT_INTERVAL,
+        help="Seconds between metric snapshots",
+    )
+    parser.add_argument(
+        "--profile-rate",
+        type=float,
+        default=0.0,
+        help="Fraction of requests run under cProfile (stats in <metrics-file>.prof)",
+    )
+    args = parser.parse_args(argv)
+    if args.watch is not None and args.archive is not None:
+        parser.error("--watch polls test_data directories, not an archive")
+    return args
 
 
 if __name__ == "__main__":
-    run()
+    args = parse_args()
+    try:
+        run(
+            workers=args.workers,
+            shard=args.shard,
+            sink_kind=args.sink,
+            batch_size=args.batch_size,
+            compress=args.compress,
+            metrics_file=args.metrics_file,
+            metrics_format=args.metrics_format,
+            metrics_interval=args.metrics_interval,
+            profile_rate=args.profile_rate,
+            archive=args.archive,
+            incremental=args.incremental,
+            watch=args.watch,
+        )
+    except KeyboardInterrupt:
+        # Decisions recorded so far are kept; the next incremental run redoes the rest
+        pass
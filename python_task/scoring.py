@@ -1,146 +1,161 @@
+import argparse
+from contextlib import redirect_stdout
+from datetime import datetime
 import json
 import os
-from datetime import datetime
+from pathlib import Path
+import tempfile
+from typing import Any, List, Sequence, Tuple
+
+from python_task.context import load_context, phone_number
+from python_task.instrumentation import METRICS
+from python_task.routing import is_pure_stream
 from python_task.src.models import Request, Response
+from python_task.strategies import Dispatch, Strategy, StrategyTable, route
 
+STRATEGY_TABLE = StrategyTable()
 
-def load_json(path):
-    """
-    Utility function to load a JSON file from a given path.
-    """
-    with open(path, "r", encoding="utf-8") as f:
-        return json.load(f)
 
+# ========== STRATEGY APPLICATION ==========
 
-def is_pure_stream(request_id: str) -> bool:
+def apply_strategy(strategy: Strategy, score: float, created_at: datetime) -> Response:
     """
-    Determines if the request_id falls into the 5% deterministic flow.
-    Uses hash-based logic for reproducible randomness.
-    """
-    return hash(request_id) % 100 < 5
-
-
-# ========== STRATEGY IMPLEMENTATIONS ==========
-
-def apply_pure_stream(score: float) -> Response:
-    """
-    Pure Stream Strategy: Always approves with fixed loan terms.
+    Builds the decision of a strategy from the strategy table.
     """
+    approved = strategy.threshold is None or score < strategy.threshold
     return Response(
-        result="1",
+        result="1" if approved else "0",
         score=score,
-        strategy_name="pure_stream_strategy",
-        loan_amount=8000,
-        loan_term=6,
-        created_at=datetime.now()
+        strategy_name=strategy.strategy_name,
+        loan_amount=strategy.loan_amount if approved else None,
+        loan_term=strategy.loan_term if approved else None,
+        created_at=created_at
     )
 
 
-def apply_new_client(score: float) -> Response:
-    """
-    New Client Strategy:
-    - Approves if score < 0.15
-    - Offers 6000 over 3 months
-    """
-    result = "1" if score < 0.15 else "0"
+# ========== MAIN ENTRYPOINT ==========
+
+def error_response(score: float, strategy_name: str, created_at: datetime) -> Response:
     return Response(
-        result=result,
+        result="error",
         score=score,
-        strategy_name="new_client_strategy",
-        loan_amount=6000 if result == "1" else None,
-        loan_term=3 if result == "1" else None,
-        created_at=datetime.now()
+        strategy_name=strategy_name,
+        loan_amount=None,
+        loan_term=None,
+        created_at=created_at
     )
 
 
-def apply_repeat_client(score: float, phone: str) -> Response:
+def decide_request(request: Request, dispatch: Dispatch, created_at: datetime) -> Response:
     """
-    Repeat Client Strategy:
-    - Pilot strategy if phone ends with 2 or 4
-    - Regular strategy otherwise
+    Decision of one request with a snapshot of the strategy table. Both
+    entrypoints decide through here.
     """
-    if phone[-1] in {"2", "4"}:
-        result = "1" if score < 0.18 else "0"
-        return Response(
-            result=result,
-            score=score,
-            strategy_name="pilot_repeat_client_strategy",
-            loan_amount=24000 if result == "1" else None,
-            loan_term=12 if result == "1" else None,
-            created_at=datetime.now()
-        )
-    else:
-        result = "1" if score < 0.20 else "0"
-        return Response(
-            result=result,
-            score=score,
-            strategy_name="repeat_client_strategy",
-            loan_amount=12000 if result == "1" else None,
-            loan_term=6 if result == "1" else None,
-            created_at=datetime.now()
-        )
+    try:
+        with METRICS.span("load"):
+            context = load_context(request)
 
+        # Strategy selection
+        with METRICS.span("decide"):
+            pure_stream = is_pure_stream(request.request_id)
+            strategy = route(dispatch, pure_stream, context.client_type, lambda: phone_number(context))
+            if strategy is not None:
+                response = apply_strategy(strategy, context.score, created_at)
+                METRICS.count("strategy", response.strategy_name)
+                return response
+
+        # Handle unexpected client types
+        METRICS.count("strategy", "unknown_client_type")
+        return error_response(context.score, "unknown_client_type", created_at)
+
+    except Exception as e:
+        # Log and return error response
+        print(f"[ERROR] Failed to process request_id={request.request_id} → {e}")
+        METRICS.count("strategy", "error")
+        METRICS.count("error", type(e).__name__)
+        return error_response(-1.0, "error", created_at)
 
-# ========== MAIN ENTRYPOINT ==========
 
 def main(request: Request) -> Response:
     """
     Main decision function. Applies strategy based on client type and rules.
     """
-    try:
-        base_path = request.context
+    STRATEGY_TABLE.reload_if_changed()
+    return decide_request(request, STRATEGY_TABLE.dispatch, datetime.now())
 
-        # Load Application.json
-        app_path = base_path / "Application" / "Application.json"
-        app_data = json.loads(app_path.read_text())
-        client_type = app_data["client_type"]
 
-        # Load SqlIntegration.json
-        sql_path = base_path / "SqlIntegration" / "SqlIntegration.json"
-        sql_data = json.loads(sql_path.read_text())
-        phone = sql_data["phone_number"]
+# ========== BATCH ENTRYPOINT ==========
 
-        # Load scoring file dynamically (supports versioning)
-        scoring_dir = next((f for f in os.listdir(base_path) if f.startswith("PythonScoring")), None)
-        if scoring_dir is None:
-            raise FileNotFoundError("Scoring directory not found")
+def score_batch(requests: Sequence[Request]) -> List[Response]:
+    """
+    Batch decision function: decides every request like `main`, with one
+    snapshot of the strategy table and one `created_at` for the whole batch.
+    """
+    STRATEGY_TABLE.reload_if_changed()
+    dispatch = STRATEGY_TABLE.dispatch
+    created_at = datetime.now()
+    return [decide_request(request, dispatch, created_at) for request in requests]
 
-        scoring_files = os.listdir(base_path / scoring_dir)
-        scoring_file = next((f for f in scoring_files if f.endswith(".json")), None)
-        if scoring_file is None:
-            raise FileNotFoundError("Scoring file not found inside scoring directory")
 
-        scoring_path = base_path / scoring_dir / scoring_file
-        scoring_data = json.loads(scoring_path.read_text())
-        score = scoring_data["score"]
+# ========== PARITY CHECK ==========
 
-        # Strategy selection
-        if is_pure_stream(request.request_id):
-            return apply_pure_stream(score)
+# Context edits applied to a sample of generated requests: every branch of
+# the decision, thresholds hit exactly and broken context files
+EDGE_CASES = (
+    ("Application", {"client_type": "vip"}),
+    ("SqlIntegration", {"phone_number": ""}),
+    ("SqlIntegration", {"phone_number": "555-0102 ext"}),
+    ("SqlIntegration", {"phone_number": "555-0102"}),
+    ("PythonScoring", {"score": 0.15}),
+    ("PythonScoring", {"score": 0.18}),
+    ("PythonScoring", {"score": 0.2}),
+    ("PythonScoring", {"score": 0}),
+    ("PythonScoring", {"score": "0.1"}),
+    ("SqlIntegration", None),
+)
 
-        if client_type == "new":
-            return apply_new_client(score)
-        elif client_type == "repeat":
-            return apply_repeat_client(score, phone)
 
-        # Handle unexpected client types
-        return Response(
-            result="error",
-            score=score,
-            strategy_name="unknown_client_type",
-            loan_amount=None,
-            loan_term=None,
-            created_at=datetime.now()
-        )
+def decision_fields(response: Response) -> Tuple[Any, ...]:
+    return response.result, response.score, response.strategy_name, response.loan_amount, response.loan_term
 
-    except Exception as e:
-        # Log and return error response
-        print(f"[ERROR] Failed to process request_id={request.request_id} → {e}")
-        return Response(
-            result="error",
-            score=-1.0,
-            strategy_name="error",
-            loan_amount=None,
-            loan_term=None,
-            created_at=datetime.now()
-        )
+
+def check_batch_parity(count: int, seed: int = 0, edge_every: int = 10) -> int:
+    """
+    Generates `count` seeded requests, edits every `edge_every`-th one with an
+    edge case and checks that `score_batch` decides each of them like `main`.
+    Returns the number of requests compared.
+    """
+    from python_task import data_generator
+
+    with tempfile.TemporaryDirectory() as tmp:
+        test_data_dir = Path(tmp) / "test_data"
+        data_generator.main(count=count, test_data_dir=test_data_dir, seed=seed)
+        request_dirs = sorted(path for path in test_data_dir.iterdir() if path.is_dir())
+        for i, request_dir in enumerate(request_dirs[::edge_every]):
+            kind, fields = EDGE_CASES[i % len(EDGE_CASES)]
+            path = next(request_dir.glob(f"{kind}*/*.json"))
+            if fields is None:
+                path.unlink()
+                continue
+            path.write_text(json.dumps({**json.loads(path.read_text()), **fields}))
+
+        requests = [Request(request_id=path.name, context=path) for path in request_dirs]
+        with open(os.devnull, "w") as devnull, redirect_stdout(devnull):
+            expected = [decision_fields(main(request)) for request in requests]
+            actual = [decision_fields(response) for response in score_batch(requests)]
+    for request, one, batch in zip(requests, expected, actual, strict=True):
+        if one != batch:
+            raise AssertionError(f"request_id={request.request_id}: main {one} != score_batch {batch}")
+    return len(requests)
+
+
+if __name__ == "__main__":
+    # Markup-aware print for the report only: error lines above print "[ERROR]" literally
+    from rich import print as rich_print
+
+    parser = argparse.ArgumentParser(description="Check that score_batch decides like main.")
+    parser.add_argument("--count", type=int, default=10_000)
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+    compared = check_batch_parity(args.count, args.seed)
+    rich_print(f"[bold green]score_batch matches main on {compared} requests")
@@ -0,0 +1,300 @@
+import argparse
+import asyncio
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+import json
+from pathlib import Path
+import time
+from typing import Any, Deque, Dict, List, Optional, Tuple
+
+from rich import print
+
+from python_task.instrumentation import DEFAULT_SNAPSHOT_INTERVAL, METRIC_FORMATS, METRICS
+from python_task.runner import iter_request_dirs
+from python_task.scoring import main
+from python_task.src.models import Request, Response
+
+DEFAULT_HOST = "127.0.0.1"
+DEFAULT_PORT = 8080
+DEFAULT_MAX_CONCURRENCY = 32
+# Latencies kept for percentiles: a sliding window, not the whole history
+LATENCY_WINDOW = 10_000
+
+REASONS = {200: "OK", 400: "Bad Request", 404: "Not Found", 405: "Method Not Allowed"}
+
+
+def percentile(sorted_values: List[float], q: float) -> Optional[float]:
+    if not sorted_values:
+        return None
+    index = min(len(sorted_values) - 1, max(0, round(q * len(sorted_values)) - 1))
+    return sorted_values[index]
+
+
+def profiled_main(request: Request) -> Response:
+    with METRICS.profiled():
+        return main(request)
+
+
+class LatencyTracker:
+    def __init__(self, window: int = LATENCY_WINDOW):
+        self.latencies: Deque[float] = deque(maxlen=window)
+        self.total = 0
+
+    def observe(self, seconds: float) -> None:
+        self.latencies.append(seconds)
+        self.total += 1
+
+    def snapshot(self) -> Dict[str, Any]:
+        values = sorted(self.latencies)
+        p50, p99 = percentile(values, 0.5), percentile(values, 0.99)
+        return {
+            "requests": self.total,
+            "p50_ms": None if p50 is None else round(p50 * 1000, 3),
+            "p99_ms": None if p99 is None else round(p99 * 1000, 3),
+        }
+
+
+class DecisionServer:
+    """
+    Resident HTTP server around `scoring.main`. Modules stay imported between
+    calls, and at most `max_concurrency` decisions run at the same time; the
+    rest wait for a free slot.
+
+    POST /decide  {"request_id": "...", "context": "/path/to/context"} -> Response JSON
+    GET  /metrics -> request count, in-flight and queued decisions, p50/p99 latency
+                     end to end, waiting for a slot and deciding
+    """
+
+    def __init__(self, max_concurrency: int = DEFAULT_MAX_CONCURRENCY):
+        self.max_concurrency = max_concurrency
+        self.slots = asyncio.Semaphore(max_concurrency)
+        # Decisions read files, so they run on threads and keep the event loop free
+        self.executor = ThreadPoolExecutor(max_workers=max_concurrency)
+        # End to end (what a client sees), waiting for a slot, and the decision itself
+        self.latency = LatencyTracker()
+        self.queue_wait = LatencyTracker()
+        self.service = LatencyTracker()
+        self.in_flight = 0
+        self.queued = 0
+
+    async def decide(self, payload: Dict[str, Any]) -> Dict[str, Any]:
+        request = Request(request_id=str(payload["request_id"]), context=Path(payload["context"]))
+        # Started before the slot is acquired, so time spent queueing counts
+        started = time.perf_counter()
+        self.queued += 1
+        try:
+            await self.slots.acquire()
+        finally:
+            self.queued -= 1
+        try:
+            acquired = time.perf_counter()
+            self.in_flight += 1
+            try:
+                response = await asyncio.get_running_loop().run_in_executor(
+                    self.executor, profiled_main, request
+                )
+            finally:
+                self.in_flight -= 1
+        finally:
+            self.slots.release()
+        finished = time.perf_counter()
+        self.queue_wait.observe(acquired - started)
+        self.service.observe(finished - acquired)
+        self.latency.observe(finished - started)
+        if METRICS.enabled:
+            METRICS.observe("queue_wait", acquired - started)
+        return response.to_dict()
+
+    def metrics(self) -> Dict[str, Any]:
+        return {
+            **self.latency.snapshot(),
+            "queue_wait": self.queue_wait.snapshot(),
+            "service": self.service.snapshot(),
+            "in_flight": self.in_flight,
+            "queued": self.queued,
+            "max_concurrency": self.max_concurrency,
+        }
+
+    async def route(self, method: str, path: str, body: bytes) -> Tuple[int, Dict[str, Any]]:
+        if path == "/decide":
+            if method != "POST":
+                return 405, {"error": "use POST"}
+            try:
+                payload = json.loads(body)
+                return 200, await self.decide(payload)
+            except (ValueError, KeyError, TypeError) as e:
+                return 400, {"error": f"invalid request payload: {e}"}
+        if path == "/metrics":
+            if method != "GET":
+                return 405, {"error": "use GET"}
+            return 200, self.metrics()
+        return 404, {"error": f"unknown path {path}"}
+
+    async def handle(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter) -> None:
+        """
+        Minimal HTTP/1.1 handling with keep-alive, enough for an orchestrator client.
+        """
+        try:
+            while True:
+                request_line = await reader.readline()
+                if not request_line:
+                    break
+                method, path, _ = request_line.decode("latin-1").split(" ", 2)
+
+                headers: Dict[str, str] = {}
+                while True:
+                    line = await reader.readline()
+                    if line in (b"\r\n", b"\n", b""):
+                        break
+                    name, _, value = line.decode("latin-1").partition(":")
+                    headers[name.strip().lower()] = value.strip()
+
+                body = await reader.readexactly(int(headers.get("content-length", 0)))
+                status, data = await self.route(method, path, body)
+                keep_alive = headers.get("connection", "").lower() != "close"
+
+                content = json.dumps(data).encode("utf-8")
+                writer.write(
+                    (
+                        f"HTTP/1.1 {status} {REASONS[status]}\r\n"
+                        "Content-Type: application/json\r\n"
+                        f"Content-Length: {len(content)}\r\n"
+                        f"Connection: {'keep-alive' if keep_alive else 'close'}\r\n\r\n"
+                    ).encode("latin-1")
+                    + content
+                )
+                await writer.drain()
+                if not keep_alive:
+                    break
+        except (ConnectionError, asyncio.IncompleteReadError, ValueError):
+            pass
+        finally:
+            writer.close()
+
+    async def serve(self, host: str = DEFAULT_HOST, port: int = DEFAULT_PORT) -> None:
+        server = await asyncio.start_server(self.handle, host, port)
+        print(f"[bold green]Decision server listening on http://{host}:{port}")
+        async with server:
+            await server.serve_forever()
+
+
+# ========== LOAD GENERATOR ==========
+
+async def http_post(
+    reader: asyncio.StreamReader, writer: asyncio.StreamWriter, path: str, payload: Dict[str, Any]
+) -> Dict[str, Any]:
+    body = json.dumps(payload).encode("utf-8")
+    writer.write(
+        (
+            f"POST {path} HTTP/1.1\r\nHost: localhost\r\n"
+            f"Content-Type: application/json\r\nContent-Length: {len(body)}\r\n\r\n"
+        ).encode("latin-1")
+        + body
+    )
+    await writer.drain()
+
+    await reader.readline()
+    content_length = 0
+    while True:
+        line = await reader.readline()
+        if line in (b"\r\n", b"\n", b""):
+            break
+        name, _, value = line.decode("latin-1").partition(":")
+        if name.strip().lower() == "content-length":
+            content_length = int(value)
+    return json.loads(await reader.readexactly(content_length))
+
+
+async def generate_load(
+    host: str, port: int, contexts: List[Path], concurrency: int, count: int
+) -> Dict[str, Any]:
+    """
+    Sends `count` decisions over `concurrency` keep-alive connections and
+    measures client-side latency.
+    """
+    latencies: List[float] = []
+    queue: asyncio.Queue = asyncio.Queue()
+    for i in range(count):
+        queue.put_nowait(contexts[i % len(contexts)])
+
+    async def client() -> None:
+        reader, writer = await asyncio.open_connection(host, port)
+        try:
+            while not queue.empty():
+                context = queue.get_nowait()
+                started = time.perf_counter()
+                await http_post(
+                    reader, writer, "/decide", {"request_id": context.name, "context": str(context)}
+                )
+                latencies.append(time.perf_counter() - started)
+        finally:
+            writer.close()
+
+    started = time.perf_counter()
+    await asyncio.gather(*(client() for _ in range(concurrency)))
+    elapsed = time.perf_counter() - started
+
+    values = sorted(latencies)
+    return {
+        "requests": len(values),
+        "throughput_rps": round(len(values) / elapsed, 1),
+        "p50_ms": round(percentile(values, 0.5) * 1000, 3),
+        "p99_ms": round(percentile(values, 0.99) * 1000, 3),
+    }
+
+
+def parse_args(argv: Optional[List[str]] = None) -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description="Resident decision server.")
+    parser.add_argument("--host", default=DEFAULT_HOST)
+    parser.add_argument("--port", type=int, default=DEFAULT_PORT)
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    serve = commands.add_parser("serve", help="Run the decision server")
+    serve.add_argument(
+        "--max-concurrency",
+        type=int,
+        default=DEFAULT_MAX_CONCURRENCY,
+        help="Decisions processed at the same time; further requests wait",
+    )
+    serve.add_argument(
+        "--metrics-file",
+        type=Path,
+        default=None,
+        help="Enable instrumentation and write periodic snapshots to this file",
+    )
+    serve.add_argument("--metrics-format", choices=METRIC_FORMATS, default="json")
+    serve.add_argument("--metrics-interval", type=float, default=DEFAULT_SNAPSHOT_INTERVAL)
+    serve.add_argument(
+        "--profile-rate", type=float, default=0.0, help="Fraction of requests run under cProfile"
+    )
+
+    load = commands.add_parser("load", help="Send test_data requests to a running server")
+    load.add_argument("--concurrency", type=int, default=16, help="Parallel client connections")
+    load.add_argument("--count", type=int, default=1000, help="Total requests to send")
+    return parser.parse_args(argv)
+
+
+if __name__ == "__main__":
+    args = parse_args()
+    if args.command == "serve":
+        if args.metrics_file is not None:
+            METRICS.configure(
+                args.metrics_file, args.metrics_format, args.metrics_interval, args.profile_rate
+            )
+        server = DecisionServer(max_concurrency=args.max_concurrency)
+        try:
+            asyncio.run(server.serve(args.host, args.port))
+        except KeyboardInterrupt:
+            pass
+        finally:
+            METRICS.shutdown()
+    else:
+        test_data_dir = Path(__file__).parent / "test_data"
+        if not test_data_dir.exists():
+            print("[bold red]No test data found, generate it first.")
+        else:
+            contexts = list(iter_request_dirs(test_data_dir))
+            report = asyncio.run(
+                generate_load(args.host, args.port, contexts, args.concurrency, args.count)
+            )
+            print(report)
@@ -0,0 +1,308 @@
+from abc import ABC, abstractmethod
+import gzip
+import json
+import os
+from pathlib import Path
+import sqlite3
+import zlib
+from typing import Any, Callable, Dict, Iterator, List, Optional, Tuple
+
+from python_task.encoder import ResponseEncoder
+from python_task.src.models import Response
+
+DEFAULT_BATCH_SIZE = 1000
+
+JSONL_FILE_NAME = "results.jsonl"
+SQLITE_FILE_NAME = "results.sqlite3"
+
+SINK_KINDS = ("files", "jsonl", "sqlite")
+
+READ_CHUNK_SIZE = 1 << 16
+
+
+class ResultSink(ABC):
+    """
+    Destination of decisions. Bulk sinks buffer records and persist them in
+    batches: a crash loses at most the batch that was being written.
+    `on_flush`, when set, receives the request_ids of every persisted batch.
+    """
+
+    def __init__(self, batch_size: int = DEFAULT_BATCH_SIZE):
+        self.batch_size = batch_size
+        self.buffer: List[Tuple[str, Response]] = []
+        self.on_flush: Optional[Callable[[List[str]], None]] = None
+
+    def write(self, request_id: str, response: Response) -> None:
+        self.buffer.append((request_id, response))
+        if len(self.buffer) >= self.batch_size:
+            self.flush()
+
+    def flush(self) -> None:
+        if self.buffer:
+            batch, self.buffer = self.buffer, []
+            self.write_batch(batch)
+            if self.on_flush is not None:
+                self.on_flush([request_id for request_id, _ in batch])
+
+    @abstractmethod
+    def write_batch(self, batch: List[Tuple[str, Response]]) -> None:
+        pass
+
+    def close(self) -> None:
+        self.flush()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+    def __repr__(self):
+        return f"{self.__class__.__name__}(batch_size={self.batch_size})"
+
+
+class FileSink(ResultSink):
+    """
+    One indented `<request_id>.json` file per decision (the original layout).
+    Files never overlap, so any number of processes can write concurrently.
+    """
+
+    def __init__(self, result_dir: Path, batch_size: int = 1):
+        super().__init__(batch_size)
+        self.result_dir = result_dir
+        self.encoder = ResponseEncoder()
+
+    def write_batch(self, batch: List[Tuple[str, Response]]) -> None:
+        for request_id, response in batch:
+            with open(self.result_dir / f"{request_id}.json", "wb") as f:
+                f.write(self.encoder.encode(response))
+
+
+class JsonLinesSink(ResultSink):
+    """
+    Appends decisions to a single JSON Lines file. With compression every batch
+    is appended as a separate gzip member, which gzip readers concatenate.
+    Without `append` the previous file is replaced.
+    """
+
+    def __init__(
+        self, path: Path, batch_size: int = DEFAULT_BATCH_SIZE, compress: bool = False, append: bool = False
+    ):
+        super().__init__(batch_size)
+        self.path = path
+        self.compress = compress
+        self.encoder = ResponseEncoder()
+        if not append:
+            # A full run replaces the results of the previous one
+            path.unlink(missing_ok=True)
+        elif path.exists():
+            # Drop a batch torn by a crash, so new batches start on a record boundary
+            length = complete_length(path)
+            if length < path.stat().st_size:
+                os.truncate(path, length)
+        self.file = open(path, "ab")
+
+    def write_batch(self, batch: List[Tuple[str, Response]]) -> None:
+        data = self.encoder.encode_lines(batch)
+        if self.compress:
+            data = gzip.compress(data)
+        self.file.write(data)
+        self.file.flush()
+        os.fsync(self.file.fileno())
+
+    def close(self) -> None:
+        super().close()
+        self.file.close()
+
+
+class SqliteSink(ResultSink):
+    """
+    Stores decisions in a `results` table, one transaction per batch.
+    Without `append` the rows of previous runs are deleted.
+    """
+
+    def __init__(self, path: Path, batch_size: int = DEFAULT_BATCH_SIZE, append: bool = False):
+        super().__init__(batch_size)
+        self.path = path
+        self.encoder = ResponseEncoder()
+        self.connection = sqlite3.connect(path)
+        self.connection.execute("PRAGMA journal_mode=WAL")
+        self.connection.execute(
+            """
+            CREATE TABLE IF NOT EXISTS results (
+                request_id TEXT PRIMARY KEY,
+                result TEXT NOT NULL,
+                score REAL,
+                strategy_name TEXT NOT NULL,
+                loan_amount REAL,
+                loan_term INTEGER,
+                created_at TEXT NOT NULL
+            )
+            """
+        )
+        if not append:
+            # A full run replaces the results of the previous one. Rowids start
+            # over, so the run is counted in user_version for readers tracking them
+            (runs,) = self.connection.execute("PRAGMA user_version").fetchone()
+            with self.connection:
+                self.connection.execute("DELETE FROM results")
+                self.connection.execute(f"PRAGMA user_version = {runs + 1}")
+
+    def write_batch(self, batch: List[Tuple[str, Response]]) -> None:
+        rows = [
+            (
+                request_id,
+                response.result,
+                response.score,
+                response.strategy_name,
+                response.loan_amount,
+                response.loan_term,
+                self.encoder.created_at(response.created_at).decode("ascii"),
+            )
+            for request_id, response in batch
+        ]
+        with self.connection:
+            self.connection.executemany(
+                "INSERT OR REPLACE INTO results VALUES (?, ?, ?, ?, ?, ?, ?)", rows
+            )
+
+    def close(self) -> None:
+        super().close()
+        self.connection.close()
+
+
+def open_sink(
+    kind: str,
+    result_dir: Path,
+    batch_size: int = DEFAULT_BATCH_SIZE,
+    compress: bool = False,
+    append: bool = False,
+) -> ResultSink:
+    """
+    Creates a sink writing into `result_dir`. `append` keeps the decisions of
+    earlier runs in a JSON Lines file or SQLite table; result files are always
+    overwritten by request_id.
+    """
+    if kind == "files":
+        # Appending runs record files in batches; a full run writes each one at once
+        return FileSink(result_dir, batch_size if append else 1)
+    if kind == "jsonl":
+        file_name = JSONL_FILE_NAME + (".gz" if compress else "")
+        return JsonLinesSink(result_dir / file_name, batch_size=batch_size, compress=compress, append=append)
+    if kind == "sqlite":
+        return SqliteSink(result_dir / SQLITE_FILE_NAME, batch_size=batch_size, append=append)
+    raise ValueError(f"Unknown sink kind: {kind}, expected one of {SINK_KINDS}")
+
+
+def complete_length(path: Path) -> int:
+    """
+    Length of the leading part of a JSON Lines file that holds only complete
+    records (complete gzip members when compressed).
+    """
+    with open(path, "rb") as f:
+        if path.suffix != ".gz":
+            end = f.seek(0, os.SEEK_END)
+            while end > 0:
+                start = max(0, end - READ_CHUNK_SIZE)
+                f.seek(start)
+                newline = f.read(end - start).rfind(b"\n")
+                if newline >= 0:
+                    return start + newline + 1
+                end = start
+            return 0
+
+        offset, pending = 0, b""
+        try:
+            while True:
+                decompressor = zlib.decompressobj(wbits=31)
+                decompressor.decompress(pending)
+                consumed = len(pending) - len(decompressor.unused_data)
+                while not decompressor.eof:
+                    chunk = f.read(READ_CHUNK_SIZE)
+                    if not chunk:
+                        return offset
+                    decompressor.decompress(chunk)
+                    consumed += len(chunk) - len(decompressor.unused_data)
+                pending = decompressor.unused_data
+                offset += consumed
+        except zlib.error:
+            # Garbage after the last complete member
+            return offset
+
+
+def read_lines(path: Path, offset: int = 0) -> Iterator[Tuple[bytes, int]]:
+    """
+    Streams the raw lines of a (possibly gzipped) JSON Lines file starting at
+    byte `offset`, each with the offset right after the batch it belongs to.
+    Resuming from that offset never repeats a line. A batch cut short by a
+    crash (or still being written) is not returned.
+    """
+    compressed = path.suffix == ".gz"
+    with open(path, "rb") as f:
+        f.seek(offset)
+        if not compressed:
+            for line in f:
+                if not line.endswith(b"\n"):
+                    return
+                offset += len(line)
+                yield line, offset
+            return
+
+        # Every batch is its own gzip member: decode members one by one
+        pending = b""
+        while True:
+            decompressor = zlib.decompressobj(wbits=31)
+            data = [decompressor.decompress(pending)]
+            consumed = len(pending) - len(decompressor.unused_data)
+            while not decompressor.eof:
+                chunk = f.read(READ_CHUNK_SIZE)
+                if not chunk:
+                    return
+                data.append(decompressor.decompress(chunk))
+                consumed += len(chunk) - len(decompressor.unused_data)
+            pending = decompressor.unused_data
+            offset += consumed
+            for line in b"".join(data).splitlines():
+                yield line, offset
+            if not pending:
+                pending = f.read(READ_CHUNK_SIZE)
+                if not pending:
+                    return
+
+
+def read_jsonl(path: Path, offset: int = 0) -> Iterator[Tuple[Dict[str, Any], int]]:
+    """
+    Streams the records of a JSON Lines file like `read_lines`.
+    """
+    for line, offset in read_lines(path, offset):
+        yield json.loads(line), offset
+
+
+def iter_jsonl(path: Path) -> Iterator[Dict[str, Any]]:
+    for record, _ in read_jsonl(path):
+        yield record
+
+
+def iter_sqlite(path: Path) -> Iterator[Dict[str, Any]]:
+    connection = sqlite3.connect(f"file:{path}?mode=ro", uri=True)
+    connection.row_factory = sqlite3.Row
+    try:
+        for row in connection.execute("SELECT * FROM results"):
+            yield dict(row)
+    finally:
+        connection.close()
+
+
+def iter_results(result_dir: Path) -> Iterator[Dict[str, Any]]:
+    """
+    Streams all decisions stored in `result_dir`, whatever sinks produced them.
+    """
+    for path in sorted(result_dir.iterdir()):
+        if not path.is_file():
+            continue
+        if path.name in (JSONL_FILE_NAME, JSONL_FILE_NAME + ".gz"):
+            yield from iter_jsonl(path)
+        elif path.name == SQLITE_FILE_NAME:
+            yield from iter_sqlite(path)
+        elif path.suffix == ".json":
+            yield json.loads(path.read_text())
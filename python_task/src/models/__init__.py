@@ -1,4 +1,14 @@
+from .context import ArchiveEntry, RequestContext
+from .inputs import Application, PythonScoring, SqlIntegration
 from .request import Request
 from .response import Response
 
-__all__ = ["Request", "Response"]
+__all__ = [
+    "Application",
+    "ArchiveEntry",
+    "PythonScoring",
+    "Request",
+    "RequestContext",
+    "Response",
+    "SqlIntegration",
+]
@@ -0,0 +1,29 @@
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Optional, Tuple
+
+
+@dataclass
+class RequestContext:
+    request_id: str
+    client_type: str
+    score: float
+    scoring_version: Optional[int] = None
+    # SqlIntegration.json as read: decoded only when the strategy routes on the phone number
+    sql_integration: bytes = b""
+
+
+@dataclass(frozen=True)
+class ArchiveEntry:
+    """
+    Location of one request context inside a packed context archive.
+    """
+
+    archive: Path
+    offset: int
+    application_size: int
+    sql_integration_size: int
+    scoring_size: int
+    scoring_version: int
+    # (st_ino, st_mtime_ns) of the archive the entry was listed from
+    archive_id: Tuple[int, int] = (0, 0)
@@ -0,0 +1,19 @@
+from dataclasses import dataclass
+
+# Fields the decision reads from each context file. python_task/decoding.py
+# extracts exactly these and checks their types.
+
+
+@dataclass(frozen=True, slots=True)
+class Application:
+    client_type: str
+
+
+@dataclass(frozen=True, slots=True)
+class SqlIntegration:
+    phone_number: str
+
+
+@dataclass(frozen=True, slots=True)
+class PythonScoring:
+    score: float
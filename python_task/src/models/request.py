@@ -1,8 +1,12 @@
 from dataclasses import dataclass
 from pathlib import Path
+from typing import Union
+
+from .context import ArchiveEntry
 
 
 @dataclass
 class Request:
     request_id: str
-    context: Path
+    # A context directory or an entry of a packed context archive
+    context: Union[Path, ArchiveEntry]
@@ -2,8 +2,10 @@ from dataclasses import dataclass, field
 from datetime import datetime
 from typing import Any, Dict, Literal, Optional
 
+CREATED_AT_FORMAT = "%Y-%m-%d %H:%M:%S"
 
-@dataclass
+
+@dataclass(slots=True)
 class Response:
     result: Literal["1", "0", "error"] = field(default="0")
     score: float = field(default=-999)
@@ -18,5 +20,5 @@ class Response:
             "result": self.result,
             "score": self.score,
             "strategy_name": self.strategy_name,
-            "created_at": datetime.strftime(self.created_at, "%Y-%m-%d %H:%M:%S"),
+            "created_at": datetime.strftime(self.created_at, CREATED_AT_FORMAT),
         }
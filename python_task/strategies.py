@@ -0,0 +1,253 @@
+from dataclasses import dataclass
+import json
+import os
+from pathlib import Path
+import threading
+import time
+from typing import Any, Callable, Dict, FrozenSet, List, Optional, Tuple
+
+from rich import print
+
+STRATEGIES_PATH = Path(__file__).parent / "strategies.json"
+# How often a running process checks the strategy table for changes
+RELOAD_INTERVAL_SECONDS = 5.0
+
+PHONE_DIGITS = tuple("0123456789")
+# Dispatch key for a last phone character that is not a digit
+OTHER = "other"
+# Dispatch key for an empty phone number
+NO_PHONE = ""
+# Dispatch key of the routes whose strategy does not depend on the phone number
+ANY_PHONE = "*"
+
+ROUTE_FIELDS = ("pure_stream", "client_type", "phone_last_digit")
+
+
+@dataclass(frozen=True)
+class Strategy:
+    """
+    One row of the strategy table. Approves when score < threshold, or always
+    when threshold is None.
+    """
+
+    strategy_name: str
+    threshold: Optional[float]
+    loan_amount: float
+    loan_term: int
+
+
+@dataclass(frozen=True)
+class Rule:
+    strategy: Strategy
+    pure_stream: Optional[bool] = None
+    client_type: Optional[str] = None
+    phone_last_digits: Optional[FrozenSet[str]] = None
+
+    def matches(self, pure_stream: bool, client_type: Optional[str]) -> bool:
+        if self.pure_stream is not None and self.pure_stream != pure_stream:
+            return False
+        return self.client_type is None or self.client_type == client_type
+
+
+class PhoneRequired(Exception):
+    """
+    Raised when the matching rule routes on a phone number that is empty.
+    """
+
+
+DispatchKey = Tuple[bool, Optional[str], str]
+Dispatch = Dict[DispatchKey, Any]
+
+
+def is_number(value: Any) -> bool:
+    return isinstance(value, (int, float)) and not isinstance(value, bool)
+
+
+def is_integer(value: Any) -> bool:
+    return isinstance(value, int) and not isinstance(value, bool)
+
+
+def is_digit_list(value: Any) -> bool:
+    return isinstance(value, list) and all(digit in PHONE_DIGITS for digit in value)
+
+
+FieldTypes = Dict[str, Tuple[Callable[[Any], bool], str]]
+
+# Every strategy field is required; a null threshold means "always approve"
+STRATEGY_FIELDS: FieldTypes = {
+    "strategy_name": (lambda value: isinstance(value, str), "a string"),
+    "threshold": (lambda value: value is None or is_number(value), "a number or null"),
+    "loan_amount": (is_number, "a number"),
+    "loan_term": (is_integer, "an integer"),
+}
+# Route fields are optional; a missing or null one matches anything
+ROUTE_TYPES: FieldTypes = {
+    "pure_stream": (lambda value: isinstance(value, bool), "a boolean"),
+    "client_type": (lambda value: isinstance(value, str), "a string"),
+    "phone_last_digit": (is_digit_list, "a list of digits"),
+}
+
+
+def checked(raw: Dict[str, Any], types: FieldTypes, where: str, required: bool) -> Dict[str, Any]:
+    """
+    The fields of `raw` named in `types`, after checking their types.
+    """
+    values = {}
+    for name, (valid, expected) in types.items():
+        if name not in raw and required:
+            raise ValueError(f"Missing {name} in {where}")
+        value = values[name] = raw.get(name)
+        if value is None and not required:
+            continue
+        if not valid(value):
+            raise ValueError(f"{name} in {where} must be {expected}, got {value!r}")
+    return values
+
+
+def parse_rules(raw_rules: List[Dict[str, Any]]) -> List[Rule]:
+    """
+    Rules of the strategy table. Every field type is checked here, so a table
+    that parses cannot fail later, while deciding.
+    """
+    if not isinstance(raw_rules, list) or not all(isinstance(raw, dict) for raw in raw_rules):
+        raise ValueError("The strategy table must be a list of objects")
+    rules: List[Rule] = []
+    for raw in raw_rules:
+        strategy = Strategy(**checked(raw, STRATEGY_FIELDS, f"strategy {raw.get('strategy_name')!r}", True))
+        where = f"the route of {strategy.strategy_name}"
+        route = raw.get("route", {})
+        if not isinstance(route, dict):
+            raise ValueError(f"{where} must be an object, got {route!r}")
+        unknown = set(route) - set(ROUTE_FIELDS)
+        if unknown:
+            raise ValueError(f"Unknown route fields {sorted(unknown)} in {strategy.strategy_name}")
+        route = checked(route, ROUTE_TYPES, where, False)
+        digits = route["phone_last_digit"]
+        rules.append(
+            Rule(
+                strategy=strategy,
+                pure_stream=route["pure_stream"],
+                client_type=route["client_type"],
+                phone_last_digits=None if digits is None else frozenset(digits),
+            )
+        )
+    return rules
+
+
+def compile_rules(rules: List[Rule]) -> Dict[DispatchKey, Optional[Strategy]]:
+    """
+    Flattens the ordered rules (first match wins) into a dict over every
+    (pure_stream, client_type, phone last digit) combination. Client types not
+    named by any rule share the None key. A None value means no rule matches;
+    a PhoneRequired value means the phone number was needed but missing.
+    Routes that pick the same strategy for every phone number also get an
+    ANY_PHONE key, so deciding them does not need the phone number.
+    """
+    client_types = {rule.client_type for rule in rules if rule.client_type is not None}
+    dispatch: Dispatch = {}
+    for pure_stream in (True, False):
+        for client_type in (*client_types, None):
+            digits = (*PHONE_DIGITS, OTHER, NO_PHONE)
+            for digit in digits:
+                match: Any = None
+                for rule in rules:
+                    if not rule.matches(pure_stream, client_type):
+                        continue
+                    if rule.phone_last_digits is not None:
+                        if digit == NO_PHONE:
+                            match = PhoneRequired
+                            break
+                        if digit not in rule.phone_last_digits:
+                            continue
+                    match = rule.strategy
+                    break
+                dispatch[(pure_stream, client_type, digit)] = match
+            matches = {dispatch[(pure_stream, client_type, digit)] for digit in digits}
+            if len(matches) == 1:
+                dispatch[(pure_stream, client_type, ANY_PHONE)] = matches.pop()
+    return dispatch
+
+
+class StrategyTable:
+    """
+    Compiled strategy table. The JSON file is read once and flattened into a
+    dispatch dict, so deciding is one dict lookup and one comparison. The file
+    is checked for changes at most every `reload_interval` seconds and a new
+    version replaces the dispatch dict atomically; an invalid file is reported
+    and the previous table stays active.
+    """
+
+    def __init__(self, path: Path = STRATEGIES_PATH, reload_interval: float = RELOAD_INTERVAL_SECONDS):
+        self.path = path
+        self.reload_interval = reload_interval
+        self.lock = threading.Lock()
+        self.mtime_ns = os.stat(path).st_mtime_ns
+        self.dispatch = self.load()
+        self.next_check = time.monotonic() + reload_interval
+
+    def load(self) -> Dict[DispatchKey, Optional[Strategy]]:
+        return compile_rules(parse_rules(json.loads(self.path.read_text(encoding="utf-8"))))
+
+    def reload_if_changed(self) -> bool:
+        now = time.monotonic()
+        if now < self.next_check or not self.lock.acquire(blocking=False):
+            return False
+        try:
+            self.next_check = now + self.reload_interval
+            mtime_ns = os.stat(self.path).st_mtime_ns
+            if mtime_ns == self.mtime_ns:
+                return False
+            try:
+                self.dispatch = self.load()
+            except (OSError, ValueError, KeyError, TypeError) as e:
+                print(f"[ERROR] Strategy table {self.path} not reloaded → {e}")
+                return False
+            finally:
+                self.mtime_ns = mtime_ns
+            return True
+        finally:
+            self.lock.release()
+
+    def select(self, pure_stream: bool, client_type: str, phone: Callable[[], str]) -> Optional[Strategy]:
+        """
+        Strategy for the given routing inputs, None for an unknown client type.
+        `phone` is only called when the strategy depends on the phone number.
+        """
+        self.reload_if_changed()
+        return route(self.dispatch, pure_stream, client_type, phone)
+
+
+def phone_key(phone: str) -> str:
+    digit = phone[-1:]
+    if digit in PHONE_DIGITS or digit == NO_PHONE:
+        return digit
+    return OTHER
+
+
+def dispatch_key(
+    dispatch: Dispatch, pure_stream: bool, client_type: str, phone: Callable[[], str]
+) -> DispatchKey:
+    """
+    Key of the dispatch entry for the given routing inputs. Client types not
+    named by any rule share the None key.
+    """
+    if (pure_stream, client_type, NO_PHONE) not in dispatch:
+        client_type = None
+    key = (pure_stream, client_type, ANY_PHONE)
+    if key in dispatch:
+        return key
+    return pure_stream, client_type, phone_key(phone())
+
+
+def route(
+    dispatch: Dispatch, pure_stream: bool, client_type: str, phone: Callable[[], str]
+) -> Optional[Strategy]:
+    """
+    Strategy of a compiled table for the given routing inputs, None for an
+    unknown client type. `phone` is only called when the strategy depends on
+    the phone number.
+    """
+    strategy = dispatch[dispatch_key(dispatch, pure_stream, client_type, phone)]
+    if strategy is PhoneRequired:
+        raise PhoneRequired("phone number is empty")
+    return strategy
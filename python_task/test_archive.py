@@ -0,0 +1,58 @@
+import os
+import shutil
+
+import pytest
+
+from python_task.archive import open_archive, pack
+from python_task.data_generator import generate_dirs_block
+from python_task.scoring import main
+from python_task.src.models import Request
+
+
+@pytest.fixture
+def test_data(tmp_path):
+    path = tmp_path / "test_data"
+    generate_dirs_block(path, seed=7, block=0, count=20)
+    return path
+
+
+def decisions(requests):
+    return {request.request_id: main(request) for request in requests}
+
+
+def test_archive_decides_like_directories(tmp_path, test_data):
+    broken = sorted(os.listdir(test_data))[0]
+    shutil.rmtree(test_data / broken / "Application")
+    archive_path = tmp_path / "test_data.ctxa"
+
+    assert pack(test_data, archive_path) == 20
+    from_dirs = decisions(Request(request_id=name, context=test_data / name) for name in os.listdir(test_data))
+    from_archive = decisions(
+        Request(request_id=request_id, context=entry) for request_id, entry in open_archive(archive_path)
+    )
+
+    # The unreadable context is an "error" decision on both paths
+    assert from_dirs[broken].result == from_archive[broken].result == "error"
+    assert {request_id: (r.result, r.strategy_name) for request_id, r in from_archive.items()} == {
+        request_id: (r.result, r.strategy_name) for request_id, r in from_dirs.items()
+    }
+
+
+def test_repacked_archive_is_mapped_again(tmp_path, test_data):
+    archive_path = tmp_path / "test_data.ctxa"
+    pack(test_data, archive_path)
+    old_entries = dict(open_archive(archive_path))
+
+    extra = tmp_path / "extra"
+    generate_dirs_block(extra, seed=8, block=0, count=5)
+    for name in os.listdir(extra):
+        shutil.move(extra / name, test_data / name)
+    assert pack(test_data, archive_path) == 25
+
+    archive = open_archive(archive_path)
+    assert len(archive) == 25
+    request_id, entry = next(iter(old_entries.items()))
+    assert archive.find(request_id) != entry
+    # Entries listed from the replaced file are refused rather than read at stale offsets
+    assert main(Request(request_id=request_id, context=entry)).result == "error"
+    assert main(Request(request_id=request_id, context=archive.find(request_id))).result != "error"
@@ -0,0 +1,5 @@
+from python_task.encoder import check_encoder
+
+
+def test_encoder_matches_json_dumps():
+    assert check_encoder(5_000, seed=1) == 5_000
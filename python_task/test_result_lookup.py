@@ -0,0 +1,98 @@
+from collections import Counter
+from datetime import datetime
+import json
+
+import pytest
+
+from python_task.result_lookup import ResultAggregator, StaleStateError
+from python_task.sinks import JSONL_FILE_NAME, FileSink, JsonLinesSink, open_sink
+from python_task.src.models import Response
+
+
+def response(strategy_name: str, score: float = 0.1) -> Response:
+    return Response(result="1", score=score, strategy_name=strategy_name, created_at=datetime(2024, 5, 1))
+
+
+@pytest.fixture
+def result_dir(tmp_path):
+    path = tmp_path / "test_result"
+    path.mkdir()
+    return path
+
+
+def counts(aggregator: ResultAggregator) -> Counter:
+    return Counter({name: stats.count for name, stats in aggregator.state.strategies.items() if stats.count})
+
+
+@pytest.mark.parametrize("compress", [False, True])
+def test_jsonl_redecision_replaces_previous_record(tmp_path, result_dir, compress):
+    path = result_dir / (JSONL_FILE_NAME + (".gz" if compress else ""))
+    aggregator = ResultAggregator(result_dir, tmp_path / "state.json")
+
+    with JsonLinesSink(path, batch_size=2, compress=compress) as sink:
+        for request_id in ("a", "b", "c"):
+            sink.write(request_id, response("new_client_strategy"))
+    assert aggregator.update() == 3
+
+    # "a" is decided again in a later run, "c" twice within the same run
+    with JsonLinesSink(path, batch_size=2, compress=compress, append=True) as sink:
+        sink.write("a", response("repeat_client_strategy"))
+        sink.write("c", response("repeat_client_strategy"))
+        sink.write("c", response("pilot_repeat_client_strategy"))
+        sink.write("d", response("new_client_strategy"))
+    assert aggregator.update() == 4
+    expected = Counter(new_client_strategy=2, repeat_client_strategy=1, pilot_repeat_client_strategy=1)
+    assert counts(aggregator) == expected
+
+    # The state survives a restart and stays small
+    reloaded = ResultAggregator(result_dir, tmp_path / "state.json")
+    assert reloaded.update() == 0
+    assert counts(reloaded) == expected
+    assert set(json.loads((tmp_path / "state.json").read_text())) >= {"files_mtime_ns", "files_count"}
+
+
+def test_rewritten_result_file_is_stale(tmp_path, result_dir):
+    aggregator = ResultAggregator(result_dir, tmp_path / "state.json")
+    sink = FileSink(result_dir)
+    sink.write("a", response("new_client_strategy"))
+    sink.write("b", response("new_client_strategy"))
+    assert aggregator.update() == 2
+
+    sink.write("c", response("new_client_strategy"))
+    assert aggregator.update() == 1
+    assert counts(aggregator) == Counter(new_client_strategy=3)
+
+    sink.write("a", response("repeat_client_strategy"))
+    with pytest.raises(StaleStateError):
+        aggregator.update()
+    aggregator.reset()
+    assert aggregator.update() == 3
+    assert counts(aggregator) == Counter(new_client_strategy=2, repeat_client_strategy=1)
+
+    (result_dir / "b.json").unlink()
+    with pytest.raises(StaleStateError):
+        aggregator.update()
+
+
+def test_full_sqlite_run_replaces_previous_results(tmp_path, result_dir):
+    aggregator = ResultAggregator(result_dir, tmp_path / "state.json")
+    with open_sink("sqlite", result_dir) as sink:
+        for request_id in ("a", "b", "c"):
+            sink.write(request_id, response("new_client_strategy"))
+    assert aggregator.update() == 3
+
+    # The next full run no longer sees "c": as many rows, restarting at the same rowids
+    with open_sink("sqlite", result_dir) as sink:
+        for request_id in ("a", "b", "d"):
+            sink.write(request_id, response("repeat_client_strategy"))
+    with pytest.raises(StaleStateError):
+        aggregator.update()
+    aggregator.reset()
+    assert aggregator.update() == 3
+    assert counts(aggregator) == Counter(repeat_client_strategy=3)
+
+    # An incremental run keeps them
+    with open_sink("sqlite", result_dir, append=True) as sink:
+        sink.write("e", response("new_client_strategy"))
+    assert aggregator.update() == 1
+    assert counts(aggregator) == Counter(repeat_client_strategy=3, new_client_strategy=1)
@@ -0,0 +1,58 @@
+import json
+import os
+from pathlib import Path
+import subprocess
+import sys
+import uuid
+
+from python_task.routing import (
+    PURE_STREAM_PURPOSE,
+    check_pure_stream_share,
+    is_pure_stream,
+    shard_of,
+    stable_hash,
+)
+
+repo_dir = Path(__file__).resolve().parent.parent
+
+REQUEST_IDS = [str(uuid.UUID(int=i * 7919, version=4)) for i in range(200)] + ["not-a-uuid"]
+
+
+def routes(request_ids):
+    return [(is_pure_stream(request_id), shard_of(request_id, 16)) for request_id in request_ids]
+
+
+def test_pure_stream_share():
+    check_pure_stream_share(200_000, seed=1)
+
+
+def test_hash_is_pinned():
+    # Changing these values reroutes every request already decided
+    assert stable_hash("3f2504e0-4f89-41d3-9a0c-0305e82c3301", PURE_STREAM_PURPOSE) == 6545363471729753248
+    assert stable_hash("not-a-uuid", PURE_STREAM_PURPOSE) == 6642900318634061237
+
+
+def test_any_uuid_spelling_routes_the_same():
+    request_id = "3f2504e0-4f89-41d3-9a0c-0305e82c3301"
+    for spelling in (request_id.upper(), request_id.replace("-", ""), f"{{{request_id}}}"):
+        assert routes([spelling]) == routes([request_id])
+
+
+def test_routes_do_not_depend_on_the_process():
+    script = (
+        "import json, sys\n"
+        "from python_task.routing import is_pure_stream, shard_of\n"
+        "ids = json.load(sys.stdin)\n"
+        "print(json.dumps([(is_pure_stream(i), shard_of(i, 16)) for i in ids]))\n"
+    )
+    for hash_seed in ("1", "2"):
+        output = subprocess.run(
+            [sys.executable, "-c", script],
+            input=json.dumps(REQUEST_IDS),
+            capture_output=True,
+            text=True,
+            check=True,
+            cwd=repo_dir,
+            env={**os.environ, "PYTHONHASHSEED": hash_seed},
+        ).stdout
+        assert [tuple(route) for route in json.loads(output)] == routes(REQUEST_IDS)
@@ -0,0 +1,5 @@
+from python_task.scoring import check_batch_parity
+
+
+def test_score_batch_decides_like_main():
+    assert check_batch_parity(200, seed=1) == 200
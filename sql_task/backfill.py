@@ -0,0 +1,169 @@
+from array import array
+from bisect import bisect_left, bisect_right
+import json
+from typing import Any, Dict, Iterable, Iterator, List, Optional, Sequence, Tuple
+
+from sqlalchemy.engine import Connection
+
+try:
+    from .columnar import EventColumns, ratio
+except ImportError:
+    from columnar import EventColumns, ratio
+
+# Window starts of every as_of date, computed by SQLite like the bounds CTE of query.sql
+WINDOW_STARTS_SQL = """
+    SELECT
+        value,
+        DATE(value, '-12 months'),
+        DATE(value, '-9 months'),
+        DATE(value, '-6 months')
+    FROM json_each(:dates)
+"""
+
+
+def window_starts(connection: Connection, dates: Iterable[str]) -> Dict[str, Tuple[str, str, str]]:
+    """
+    (12, 9 and 6 months window start) by as_of date.
+    """
+    result = connection.exec_driver_sql(WINDOW_STARTS_SQL, {"dates": json.dumps(sorted(set(dates)))})
+    return {as_of: (l12m, l9m, l6m) for as_of, l12m, l9m, l6m in result}
+
+
+class EventStream:
+    """
+    Events sorted once by (owner, date). Events of owner `o` are positions
+    `offsets[o]` to `offsets[o + 1]`, and every value column has a running
+    sum that restarts at each owner, so the total over any date range of one
+    owner is two bisections and one subtraction. Events of owner -1 (unknown)
+    are dropped.
+    """
+
+    def __init__(
+        self, owners: Sequence[int], dates: Sequence[str], owner_count: int, **values: Sequence[float]
+    ):
+        self.order = sorted(
+            (i for i, owner in enumerate(owners) if owner >= 0), key=lambda i: (owners[i], dates[i])
+        )
+        self.dates = [dates[i] for i in self.order]
+
+        counts = [0] * (owner_count + 1)
+        for i in self.order:
+            counts[owners[i] + 1] += 1
+        self.offsets = array("q", counts)
+        for owner in range(owner_count):
+            self.offsets[owner + 1] += self.offsets[owner]
+
+        self.sums: Dict[str, array] = {}
+        for name, column in values.items():
+            running, total, owner = array("d", bytes(8 * len(self.order))), 0.0, -1
+            for position, i in enumerate(self.order):
+                if owners[i] != owner:
+                    owner, total = owners[i], 0.0
+                total += column[i]
+                running[position] = total
+            self.sums[name] = running
+
+    def between(self, owner: int, start: Optional[str], end: str) -> Tuple[int, int]:
+        """
+        Positions [lo, hi) of the events of `owner` dated from `start`
+        (or the first one) to `end`, both included.
+        """
+        first, last = self.offsets[owner], self.offsets[owner + 1]
+        lo = first if start is None else bisect_left(self.dates, start, first, last)
+        return lo, bisect_right(self.dates, end, lo, last)
+
+    def total(self, name: str, owner: int, lo: int, hi: int) -> float:
+        if hi <= lo:
+            return 0.0
+        running = self.sums[name]
+        before = running[lo - 1] if lo > self.offsets[owner] else 0.0
+        return running[hi - 1] - before
+
+
+class Backfill:
+    """
+    Point-in-time features for many (client_id, as_of) pairs, with the
+    semantics of query.sql run with :as_of.
+
+    The raw tables are loaded once (EventColumns) and turned into event
+    streams sorted by owner and date: vendor transactions by phone, income
+    payments and delayed income payments by client, loans by client and
+    payments by loan. Every pair is then answered by bisecting its owner's
+    streams, instead of re-running the query per pair.
+    """
+
+    def __init__(self, connection: Connection):
+        self.connection = connection
+        data = self.data = EventColumns(connection)
+        self.position = {client_id: i for i, client_id in enumerate(data.client_ids)}
+        clients, phones, loans = len(data.client_ids), len(set(data.client_phone)), len(data.loan_client)
+
+        self.vendor = EventStream(
+            data.vt_phone,
+            data.vt_date,
+            phones,
+            amount=data.vt_amount,
+            mg_amount=[a if c in data.mg_categories else 0.0 for a, c in zip(data.vt_amount, data.vt_category)],
+            gu=[1.0 if c in data.gu_categories else 0.0 for c in data.vt_category],
+        )
+        cf_client = [data.loan_client[loan] if loan >= 0 else -1 for loan in data.cf_loan]
+        self.income = EventStream(cf_client, data.cf_paid, clients, amount=data.cf_amount)
+        self.delayed = EventStream(
+            [c if paid > scheduled else -1 for c, paid, scheduled in zip(cf_client, data.cf_paid, data.cf_scheduled)],
+            data.cf_paid,
+            clients,
+        )
+        self.loans = EventStream(data.loan_client, data.loan_start, clients)
+        self.payments = EventStream(data.cf_loan, data.cf_paid, loans, amount=data.cf_amount)
+
+    def features(self, client: int, as_of: str, starts: Tuple[str, str, str]) -> Dict[str, Any]:
+        l12m_start, l9m_start, l6m_start = starts
+        phone = self.data.client_phone[client]
+
+        lo, hi = self.vendor.between(phone, l12m_start, as_of)
+        vmg = None
+        if hi > lo:
+            vmg = ratio(self.vendor.total("mg_amount", phone, lo, hi), self.vendor.total("amount", phone, lo, hi))
+        lo, hi = self.vendor.between(phone, l9m_start, as_of)
+        vgu = ratio(self.vendor.total("gu", phone, lo, hi), hi - lo)
+
+        lo, hi = self.delayed.between(client, l6m_start, as_of)
+        hpd = 1 if hi > lo else None
+
+        first, hi = self.income.between(client, None, as_of)
+        hpr = None
+        if hi > first:
+            recent_lo, _ = self.income.between(client, l9m_start, as_of)
+            hpr = ratio(
+                self.income.total("amount", client, recent_lo, hi), self.income.total("amount", client, first, hi)
+            )
+
+        margins: List[float] = []
+        lo, hi = self.loans.between(client, l12m_start, as_of)
+        for loan in self.loans.order[lo:hi]:
+            amount = self.data.loan_amount[loan]
+            if amount:
+                paid_lo, paid_hi = self.payments.between(loan, None, as_of)
+                paid = self.payments.total("amount", loan, paid_lo, paid_hi)
+                margins.append((amount - paid) * 1.0 / amount)
+        hpm = sum(margins) / len(margins) if margins else None
+
+        return {
+            "vendor_microfinance_gambling_payment_ratio_l12m": vmg,
+            "vendor_grocery_utilities_transaction_ratio_l9m": vgu,
+            "history_payment_delay_flag_l6m": hpd,
+            "history_payment_ratio_l9m_to_total": hpr,
+            "history_average_loan_profit_margin_l12m": hpm,
+        }
+
+    def rows(self, pairs: Iterable[Tuple[int, str]]) -> Iterator[Dict[str, Any]]:
+        """
+        Feature rows of the pairs ordered by (client_id, as_of). Unknown
+        clients are left out, as query.sql returns no row for them.
+        """
+        pairs = sorted(set(pairs))
+        starts = window_starts(self.connection, (as_of for _, as_of in pairs))
+        for client_id, as_of in pairs:
+            client = self.position.get(client_id)
+            if client is not None:
+                yield {"client_id": client_id, "as_of": as_of, **self.features(client, as_of, starts[as_of])}
@@ -0,0 +1,210 @@
+import argparse
+from concurrent.futures import ProcessPoolExecutor
+import json
+import multiprocessing
+from pathlib import Path
+import random
+import resource
+import sqlite3
+import time
+from typing import Any, Callable, Dict, List, Optional
+
+from rich import print
+from sqlalchemy import text
+from sqlalchemy.orm import Session
+
+from benchmarking import (
+    BENCHMARK_SEED,
+    find_regressions,
+    parse_sizes,
+    percentiles_ms,
+    print_report,
+    report_header,
+)
+
+try:
+    from .data_generator import Base, bulk_load, db_session
+    from .runner import QUERY_PATH, iter_features, load_query
+except ImportError:
+    from data_generator import Base, bulk_load, db_session
+    from runner import QUERY_PATH, iter_features, load_query
+
+sql_dir = Path(__file__).resolve().parent
+
+DEFAULT_SIZES = (1_000, 100_000, 1_000_000)
+DEFAULT_SAMPLES = 100
+DEFAULT_MAX_REGRESSION = 0.25
+DATASETS_DIR = sql_dir / "benchmark_data"
+RESULTS_DIR = sql_dir / "benchmark_results"
+
+VARIANTS = ("indexed", "no_indexes")
+DATA_TABLES = ("clients", "loans", "cash_flows", "vendor_transactions")
+# Metrics where a higher value is better; for all others lower is better
+HIGHER_IS_BETTER = ("throughput_cps",)
+# Report entries that are not compared between commits: row and client counts
+NOT_COMPARED = ("rows", "clients")
+
+
+def peak_rss_mb() -> float:
+    """
+    Peak resident memory of the running program. On Linux ru_maxrss also
+    keeps the peak of the parent at fork time, VmHWM does not.
+    """
+    try:
+        with open("/proc/self/status", encoding="ascii") as f:
+            for line in f:
+                if line.startswith("VmHWM:"):
+                    return round(int(line.split()[1]) / 1024, 1)
+    except OSError:
+        pass
+    # KiB on Linux
+    return round(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024, 1)
+
+
+def ensure_database(size: int, workers: int) -> Path:
+    """
+    Generates (once) a database of `size` clients with bulk_load. Loans, cash
+    flows and vendor transactions scale with the clients.
+    """
+    path = DATASETS_DIR / f"clients_{size}_{BENCHMARK_SEED}.sqlite3"
+    if not path.exists():
+        DATASETS_DIR.mkdir(parents=True, exist_ok=True)
+        # Built under a temporary name, so an interrupted load is never reused
+        partial = path.with_suffix(".partial.sqlite3")
+        partial.unlink(missing_ok=True)
+        bulk_load(f"sqlite:///{partial}", size, BENCHMARK_SEED, workers)
+        partial.rename(path)
+    return path
+
+
+def row_counts(path: Path) -> Dict[str, int]:
+    with sqlite3.connect(path) as connection:
+        counts = {
+            table: connection.execute(f"SELECT COUNT(*) FROM {table}").fetchone()[0] for table in DATA_TABLES
+        }
+    connection.close()
+    return counts
+
+
+def drop_indexes(session: Session) -> None:
+    """
+    Drops the model indexes inside an explicit transaction; the caller rolls
+    back to restore them, so the database file is left untouched.
+    """
+    # pysqlite only opens transactions before DML, DROP INDEX would autocommit
+    session.connection().exec_driver_sql("BEGIN")
+    for table in Base.metadata.sorted_tables:
+        for index in table.indexes:
+            session.execute(text(f"DROP INDEX IF EXISTS {index.name}"))
+
+
+def bench_latency(session: Session, samples: int) -> Dict[str, Any]:
+    """
+    Single-client query.sql on `samples` clients, as `runner.run_once` runs it.
+    """
+    query = text(load_query(QUERY_PATH))
+    client_ids = [row[0] for row in session.execute(text("SELECT id FROM clients"))]
+    client_ids = random.Random(BENCHMARK_SEED).sample(client_ids, min(samples, len(client_ids)))
+    session.execute(query, {"client_id": client_ids[0], "as_of": None}).fetchall()
+
+    latencies: List[int] = []
+    clock = time.perf_counter_ns
+    for client_id in client_ids:
+        t0 = clock()
+        session.execute(query, {"client_id": client_id, "as_of": None}).fetchall()
+        latencies.append(clock() - t0)
+    return {"clients": len(latencies), **percentiles_ms(latencies)}
+
+
+def bench_bulk(session: Session) -> Dict[str, Any]:
+    """
+    Bulk mode over every client, as the production feature refresh runs it.
+    """
+    started = time.perf_counter()
+    count = sum(1 for _ in iter_features(session))
+    elapsed = time.perf_counter() - started
+    return {
+        "clients": count,
+        "elapsed_s": round(elapsed, 3),
+        "throughput_cps": round(count / elapsed, 1),
+    }
+
+
+def run_phase(path: Path, variant: str, phase: str, samples: int) -> Dict[str, Any]:
+    """
+    One measurement in a fresh process, so its peak RSS (Python objects and
+    SQLite page cache alike) belongs to this phase only.
+    """
+    with db_session(f"sqlite:///{path}") as session:
+        if variant == "no_indexes":
+            drop_indexes(session)
+        result = bench_latency(session, samples) if phase == "latency" else bench_bulk(session)
+        session.rollback()
+    return {**result, "peak_rss_mb": peak_rss_mb()}
+
+
+def in_subprocess(function: Callable[..., Dict[str, Any]], *args: Any) -> Dict[str, Any]:
+    # Spawned, not forked: a fork would start with the memory of this process
+    with ProcessPoolExecutor(max_workers=1, mp_context=multiprocessing.get_context("spawn")) as executor:
+        return executor.submit(function, *args).result()
+
+
+def run_benchmarks(sizes: List[int], samples: int, workers: int) -> Dict[str, Any]:
+    report: Dict[str, Any] = {**report_header(), "sqlite": sqlite3.sqlite_version, "sizes": {}}
+    for size in sizes:
+        print(f"[bold]Benchmarking {size} clients")
+        path = ensure_database(size, workers)
+        results: Dict[str, Any] = {"rows": row_counts(path)}
+        for variant in VARIANTS:
+            results[variant] = {
+                phase: in_subprocess(run_phase, path, variant, phase, samples) for phase in ("latency", "bulk")
+            }
+        report["sizes"][str(size)] = results
+    return report
+
+
+def parse_args(argv: Optional[List[str]] = None) -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description="Benchmark the sql_task feature query.")
+    parser.add_argument(
+        "--sizes",
+        type=parse_sizes,
+        default=list(DEFAULT_SIZES),
+        help="Comma-separated numbers of clients, e.g. 1k,100k,1M",
+    )
+    parser.add_argument(
+        "--samples", type=int, default=DEFAULT_SAMPLES, help="Clients timed one by one per database"
+    )
+    parser.add_argument("--workers", type=int, default=1, help="Generator processes for new databases")
+    parser.add_argument(
+        "--output", type=Path, default=None, help="Report file (default: benchmark_results/<commit>.json)"
+    )
+    parser.add_argument("--compare", type=Path, default=None, help="Baseline report to compare with")
+    parser.add_argument(
+        "--max-regression",
+        type=float,
+        default=DEFAULT_MAX_REGRESSION,
+        help="Fail when a metric is this much worse than the baseline (0.25 = 25%%)",
+    )
+    return parser.parse_args(argv)
+
+
+if __name__ == "__main__":
+    args = parse_args()
+    report = run_benchmarks(args.sizes, args.samples, args.workers)
+
+    output = args.output or RESULTS_DIR / f"{report['commit']}.json"
+    output.parent.mkdir(parents=True, exist_ok=True)
+    output.write_text(json.dumps(report, indent=4))
+
+    baseline = json.loads(args.compare.read_text()) if args.compare else None
+    print_report("sql_task benchmark", report, baseline, NOT_COMPARED)
+    print(f"[bold green]Report written to {output}")
+
+    if baseline:
+        regressions = find_regressions(report, baseline, NOT_COMPARED, args.max_regression, HIGHER_IS_BETTER)
+        if regressions:
+            print(f"[bold red]{len(regressions)} metrics regressed by more than {args.max_regression:.0%}:")
+            for problem in regressions:
+                print(f"  {problem}")
+            raise SystemExit(1)
+        print(f"[bold green]No metric regressed by more than {args.max_regression:.0%}")
@@ -0,0 +1,207 @@
+from array import array
+from typing import Any, Dict, Iterator, List, Optional, Sequence, Tuple
+
+from sqlalchemy.engine import Connection
+
+FETCH_SIZE = 100_000
+
+# Last event date and window starts computed by SQLite itself, so month
+# arithmetic matches the bounds CTE of query.sql exactly
+WINDOWS_SQL = """
+    SELECT
+        COALESCE(DATE(:as_of), '9999-12-31'),
+        DATE(COALESCE(:as_of, 'now'), '-12 months'),
+        DATE(COALESCE(:as_of, 'now'), '-9 months'),
+        DATE(COALESCE(:as_of, 'now'), '-6 months')
+"""
+CATEGORIES_SQL = "SELECT id FROM merchant_categories WHERE name IN ({names})"
+
+# One grouped scan per table: SQLite aggregates every event of the windows
+# into a row per phone, client or loan, and only those rows are fetched
+VENDOR_SQL = """
+    SELECT
+        phone_number,
+        COUNT(CASE WHEN transaction_date >= :l12m_start THEN 1 END),
+        TOTAL(CASE WHEN transaction_date >= :l12m_start THEN amount END),
+        TOTAL(CASE WHEN transaction_date >= :l12m_start AND category_id IN ({mg}) THEN amount END),
+        COUNT(CASE WHEN transaction_date >= :l9m_start THEN 1 END),
+        COUNT(CASE WHEN transaction_date >= :l9m_start AND category_id IN ({gu}) THEN 1 END)
+    FROM vendor_transactions
+    WHERE transaction_date BETWEEN :l12m_start AND :last_date
+    GROUP BY phone_number
+"""
+# Income payments are summed per loan first, in index order, so the
+# payments table is read once for hpd, hpr and hpm together
+HISTORY_SQL = """
+    WITH per_loan AS (
+        SELECT
+            loan_id,
+            TOTAL(amount) AS paid,
+            TOTAL(CASE WHEN payment_date >= :l9m_start THEN amount END) AS recent,
+            MAX(payment_date > scheduled_date AND payment_date >= :l6m_start) AS late
+        FROM cash_flows
+        WHERE type = 'income' AND payment_date <= :last_date
+        GROUP BY loan_id
+    )
+    SELECT
+        l.client_id,
+        TOTAL(p.paid),
+        TOTAL(p.recent),
+        MAX(p.late),
+        TOTAL(
+            CASE WHEN l.amount != 0 AND l.start_date BETWEEN :l12m_start AND :last_date
+            THEN (l.amount - COALESCE(p.paid, 0)) * 1.0 / l.amount END
+        ),
+        COUNT(CASE WHEN l.amount != 0 AND l.start_date BETWEEN :l12m_start AND :last_date THEN 1 END)
+    FROM loans l
+    LEFT JOIN per_loan p ON p.loan_id = l.id
+    GROUP BY l.client_id
+"""
+MICROFINANCE_GAMBLING = ("microfinance", "gambling")
+GROCERY_UTILITIES = ("grocery", "utilities")
+
+
+def fetch_columns(
+    connection: Connection, sql: str, width: int, params: Optional[Dict[str, Any]] = None
+) -> List[list]:
+    """
+    Reads a query result column by column, `FETCH_SIZE` rows at a time.
+    """
+    columns: List[list] = [[] for _ in range(width)]
+    cursor = connection.connection.dbapi_connection.execute(sql, params or {})
+    while rows := cursor.fetchmany(FETCH_SIZE):
+        for column, values in zip(columns, zip(*rows)):
+            column.extend(values)
+    return columns
+
+
+def ratio(numerator: float, denominator: float) -> Optional[float]:
+    return numerator * 1.0 / denominator if denominator else None
+
+
+def category_ids(connection: Connection, names: Tuple[str, ...]) -> frozenset:
+    placeholders = ", ".join("?" for _ in names)
+    return frozenset(connection.exec_driver_sql(CATEGORIES_SQL.format(names=placeholders), names).scalars())
+
+
+class EventColumns:
+    """
+    The raw event tables in columns, with clients, phone numbers and loans
+    mapped to dense positions. Rows whose client, phone or loan is unknown
+    get position -1, as the joins in query.sql drop them. Used by the
+    point-in-time backfill, which needs every event.
+    """
+
+    def __init__(self, connection: Connection):
+        self.mg_categories = category_ids(connection, MICROFINANCE_GAMBLING)
+        self.gu_categories = category_ids(connection, GROCERY_UTILITIES)
+
+        client_ids, phone_numbers = fetch_columns(connection, "SELECT id, phone_number FROM clients ORDER BY id", 2)
+        self.client_ids = array("q", client_ids)
+        position = {client_id: i for i, client_id in enumerate(client_ids)}
+        # Vendor events are grouped by phone number, as in query.sql
+        phone_position: Dict[str, int] = {}
+        self.client_phone = array(
+            "q", [phone_position.setdefault(phone, len(phone_position)) for phone in phone_numbers]
+        )
+
+        phones, self.vt_amount, self.vt_category, self.vt_date = fetch_columns(
+            connection,
+            "SELECT phone_number, amount, category_id, transaction_date FROM vendor_transactions",
+            4,
+        )
+        self.vt_phone = array("q", [phone_position.get(phone, -1) for phone in phones])
+
+        loan_ids, loan_clients, self.loan_amount, self.loan_start = fetch_columns(
+            connection, "SELECT id, client_id, amount, start_date FROM loans", 4
+        )
+        self.loan_client = array("q", [position.get(client_id, -1) for client_id in loan_clients])
+        loan_position = {loan_id: i for i, loan_id in enumerate(loan_ids)}
+
+        cf_loans, self.cf_amount, self.cf_scheduled, self.cf_paid = fetch_columns(
+            connection,
+            "SELECT loan_id, amount, scheduled_date, payment_date FROM cash_flows WHERE type = 'income'",
+            4,
+        )
+        self.cf_loan = array("q", [loan_position.get(loan_id, -1) for loan_id in cf_loans])
+
+
+class ColumnarFeatures:
+    """
+    Alternative to query.sql for all clients at once. Instead of evaluating
+    the feature CTEs client by client, two grouped scans inside SQLite
+    aggregate vendor transactions by phone and income payments by loan and
+    then by client. Only one row per phone and per client is fetched, and
+    those columns are combined into feature rows in Python.
+
+    Features are as of today, or as of the `as_of` date (YYYY-MM-DD) like
+    the :as_of parameter of query.sql.
+    """
+
+    def __init__(self, connection: Connection, as_of: Optional[str] = None):
+        self.connection = connection
+        last_date, l12m_start, l9m_start, l6m_start = connection.exec_driver_sql(
+            WINDOWS_SQL, {"as_of": as_of}
+        ).one()
+        self.windows = {
+            "last_date": last_date,
+            "l12m_start": l12m_start,
+            "l9m_start": l9m_start,
+            "l6m_start": l6m_start,
+        }
+        self.features: Optional[Tuple[dict, dict]] = None
+
+    def vendor_ratios(self) -> Dict[str, Tuple[Optional[float], Optional[float]]]:
+        """
+        (vmg, vgu) by phone number.
+        """
+        ids = {
+            name: ", ".join(str(i) for i in sorted(category_ids(self.connection, names))) or "NULL"
+            for name, names in (("mg", MICROFINANCE_GAMBLING), ("gu", GROCERY_UTILITIES))
+        }
+        phones, seen, total, selected, count, selected_count = fetch_columns(
+            self.connection, VENDOR_SQL.format(**ids), 6, self.windows
+        )
+        return {
+            phone: (ratio(s, t) if hit else None, ratio(sc, c))
+            for phone, hit, t, s, c, sc in zip(phones, seen, total, selected, count, selected_count)
+        }
+
+    def history_features(self) -> Dict[int, Tuple[Optional[int], Optional[float], Optional[float]]]:
+        """
+        (hpd, hpr, hpm) by client_id.
+        """
+        clients, total, recent, late, margin_sum, loans = fetch_columns(
+            self.connection, HISTORY_SQL, 6, self.windows
+        )
+        return {
+            client_id: (1 if delayed else None, ratio(r, t), ratio(m, n))
+            for client_id, t, r, delayed, m, n in zip(clients, total, recent, late, margin_sum, loans)
+        }
+
+    def rows(self, client_ids: Optional[Sequence[int]] = None) -> Iterator[Dict[str, Any]]:
+        """
+        Feature rows of all clients (or `client_ids`) ordered by client_id,
+        shaped like the rows of query.sql. Features are computed on the first
+        call and reused afterwards.
+        """
+        if self.features is None:
+            self.features = (self.vendor_ratios(), self.history_features())
+        vendor, history = self.features
+        wanted = None if client_ids is None else set(client_ids)
+        no_vendor, no_history = (None, None), (None, None, None)
+        for client_id, phone in zip(
+            *fetch_columns(self.connection, "SELECT id, phone_number FROM clients ORDER BY id", 2)
+        ):
+            if wanted is not None and client_id not in wanted:
+                continue
+            vmg, vgu = vendor.get(phone, no_vendor)
+            hpd, hpr, hpm = history.get(client_id, no_history)
+            yield {
+                "client_id": client_id,
+                "vendor_microfinance_gambling_payment_ratio_l12m": vmg,
+                "vendor_grocery_utilities_transaction_ratio_l9m": vgu,
+                "history_payment_delay_flag_l6m": hpd,
+                "history_payment_ratio_l9m_to_total": hpr,
+                "history_average_loan_profit_margin_l12m": hpm,
+            }
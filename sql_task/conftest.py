@@ -0,0 +1,20 @@
+import pytest
+
+from sql_task.data_generator import bulk_load, db_session
+
+# Small enough to generate in a second or two, large enough for every feature to be set somewhere
+TEST_CLIENTS = 300
+TEST_SEED = 7
+
+
+@pytest.fixture(scope="session")
+def db_url(tmp_path_factory) -> str:
+    url = f"sqlite:///{tmp_path_factory.mktemp('sql_task') / 'clients.sqlite3'}"
+    bulk_load(url, TEST_CLIENTS, TEST_SEED)
+    return url
+
+
+@pytest.fixture
+def session(db_url):
+    with db_session(db_url) as session:
+        yield session
@@ -1,17 +1,26 @@
+import argparse
+from concurrent.futures import ProcessPoolExecutor
 from contextlib import contextmanager
 from datetime import date, timedelta
-import json
+from itertools import islice
 from math import ceil
-from pathlib import Path
 import random
-from typing import List
+from typing import Any, Dict, Iterator, List, Optional, Tuple, Union
 from typing import Literal
 import uuid
 
 from faker import Faker
 from rich import print
-from sqlalchemy import Date, ForeignKey, Integer, Numeric, String, UUID, create_engine
-from sqlalchemy.orm import Mapped, declarative_base, mapped_column, sessionmaker
+from sqlalchemy import Date, ForeignKey, Index, Integer, Numeric, String, UUID, create_engine, text
+from sqlalchemy.engine import Connection
+from sqlalchemy.orm import Mapped, Session, declarative_base, mapped_column, sessionmaker
+
+try:
+    from .merchants import MerchantCategorizer, category_sql, load_merchants, mask_merchant
+    from .rollups import create_rollups, rebuild_rollups
+except ImportError:
+    from merchants import MerchantCategorizer, category_sql, load_merchants, mask_merchant
+    from rollups import create_rollups, rebuild_rollups
 
 # Configuration
 DATABASE_URI = "sqlite:///db.sqlite3"
@@ -19,6 +28,16 @@ FAKE_CLIENTS_COUNT = 100
 LOANS_PER_CLIENT = (3, 10)
 CLIENT_HAS_VENDOR_DATA_PROBABILITY = 0.6
 FAKE_VENDOR_TRANSACTIONS_PER_CLIENT = (5, 30)
+# Clients per generate_block call; every block also owns a contiguous range of client ids
+BLOCK_SIZE = 1000
+# SQLite settings for the duration of a bulk load: no rollback journal, no
+# fsync, a large page cache. A crash mid-load leaves a database to regenerate.
+LOAD_PRAGMAS = {
+    "journal_mode": "OFF",
+    "synchronous": "OFF",
+    "cache_size": "-262144",  # KiB
+    "temp_store": "MEMORY",
+}
 
 
 # Create a new declarative base instance
@@ -27,6 +46,30 @@ Base = declarative_base()
 # Initialize Faker
 fake = Faker(locale="en_US")
 
+# Resolves merchant names to merchant_categories ids at ingest
+merchant_categorizer = MerchantCategorizer(load_merchants())
+# Writers other than this generator may leave category_id out: the same
+# rules then run inside SQLite, on insert
+CATEGORIZE_TRIGGER = f"""
+    CREATE TRIGGER IF NOT EXISTS vendor_transactions_category AFTER INSERT ON vendor_transactions
+    WHEN NEW.category_id IS NULL
+    BEGIN
+        UPDATE vendor_transactions SET category_id = {category_sql('NEW.merchant')} WHERE rowid = NEW.rowid;
+    END
+"""
+
+# Read once: merchant names by category, upper-cased, and the category id of
+# every plain and masked name
+FAKE_MERCHANTS = {
+    category: [name.upper() for name in names] for category, names in load_merchants().items()
+}
+MERCHANT_CATEGORY_IDS = {
+    merchant: merchant_categorizer.categorize(merchant)
+    for names in FAKE_MERCHANTS.values()
+    for name in names
+    for merchant in (name, mask_merchant(name))
+}
+
 
 @contextmanager
 def db_session(db_url: str):
@@ -67,6 +110,10 @@ class Loan(Base):
     """
 
     __tablename__ = "loans"
+    __table_args__ = (
+        # hpd, hpr, hpm: loans of a client, issued after a date
+        Index("ix_loans_client_id_start_date", "client_id", "start_date", "amount"),
+    )
 
     id: Mapped[int] = mapped_column(Integer, primary_key=True, autoincrement=True, unique=True)
     client_id: Mapped[int] = mapped_column(ForeignKey("clients.id"))
@@ -85,6 +132,17 @@ class CashFlow(Base):
     """
 
     __tablename__ = "cash_flows"
+    __table_args__ = (
+        # hpd, hpr, hpm: income payments of a loan, paid after a date
+        Index(
+            "ix_cash_flows_loan_id_type_payment_date",
+            "loan_id",
+            "type",
+            "payment_date",
+            "scheduled_date",
+            "amount",
+        ),
+    )
 
     id: Mapped[int] = mapped_column(Integer, primary_key=True, autoincrement=True, unique=True)
     loan_id: Mapped[int] = mapped_column(ForeignKey("loans.id"))
@@ -97,12 +155,51 @@ class CashFlow(Base):
         return f"<CashFlow(id={self.id}, loan_id={self.loan_id}, amount={self.amount})>"
 
 
+class MerchantCategory(Base):
+    """
+    MerchantCategory model: one row per category of fake_merchants.json.
+    """
+
+    __tablename__ = "merchant_categories"
+
+    id: Mapped[int] = mapped_column(Integer, primary_key=True)
+    name: Mapped[str] = mapped_column(String(50), unique=True)
+
+    def __repr__(self):
+        return f"<MerchantCategory(id={self.id}, name={self.name})>"
+
+
+class MerchantName(Base):
+    """
+    MerchantName model: the category of every known merchant name and of
+    every unambiguous masked one, read by the categorization trigger.
+    """
+
+    __tablename__ = "merchant_names"
+
+    name: Mapped[str] = mapped_column(String(100), primary_key=True)
+    category_id: Mapped[int] = mapped_column(ForeignKey("merchant_categories.id"))
+
+    def __repr__(self):
+        return f"<MerchantName(name={self.name}, category_id={self.category_id})>"
+
+
 class VendorTransaction(Base):
     """
     VendorTransaction model representing a vendor transaction in the database.
     """
 
     __tablename__ = "vendor_transactions"
+    __table_args__ = (
+        # vmg, vgu: transactions of a phone number after a date
+        Index(
+            "ix_vendor_transactions_phone_number_transaction_date_category_id",
+            "phone_number",
+            "transaction_date",
+            "category_id",
+            "amount",
+        ),
+    )
 
     id: Mapped[UUID[str]] = mapped_column(
         UUID(as_uuid=True), primary_key=True, default=uuid.uuid4, unique=True
@@ -110,6 +207,9 @@ class VendorTransaction(Base):
     phone_number: Mapped[str] = mapped_column(String(20))
     amount: Mapped[float] = mapped_column(Numeric(10, 2))
     merchant: Mapped[str] = mapped_column(String(100))
+    # Resolved from `merchant` on insert (by the writer or the categorization
+    # trigger), NULL when the merchant is not recognized
+    category_id: Mapped[Optional[int]] = mapped_column(ForeignKey("merchant_categories.id"), nullable=True)
     transaction_date: Mapped[date] = mapped_column(Date)
 
     def __repr__(self):
@@ -118,144 +218,348 @@ class VendorTransaction(Base):
         )
 
 
-def fake_client() -> Client:
+def ensure_indexes(connection: Connection) -> None:
     """
-    Generate a fake client using Faker.
+    Creates the model indexes missing from an existing database and refreshes
+    the planner statistics.
     """
-    return Client(
-        first_name=fake.first_name(),
-        last_name=fake.last_name(),
-        phone_number="".join(c for c in fake.phone_number() if c.isdigit())[-10:],
-        email=fake.email(),
+    for table in Base.metadata.sorted_tables:
+        for index in table.indexes:
+            index.create(connection, checkfirst=True)
+    analyze(connection)
+
+
+def ensure_merchant_categories(connection: Connection) -> int:
+    """
+    Fills merchant_categories and merchant_names from fake_merchants.json,
+    installs the trigger that categorizes vendor transactions inserted without
+    a category_id and categorizes the rows that have none yet (adding the
+    column to databases created before it existed). Returns the number of
+    rows categorized.
+    """
+    MerchantCategory.__table__.create(connection, checkfirst=True)
+    MerchantName.__table__.create(connection, checkfirst=True)
+    connection.execute(
+        text("INSERT OR REPLACE INTO merchant_categories (id, name) VALUES (:id, :name)"),
+        [{"id": i, "name": name} for name, i in merchant_categorizer.category_ids.items()],
     )
+    connection.execute(text("DELETE FROM merchant_names"))
+    connection.execute(
+        text("INSERT INTO merchant_names (name, category_id) VALUES (:name, :category_id)"),
+        [{"name": name, "category_id": i} for name, i in merchant_categorizer.lookup_rows()],
+    )
+    columns = {row[1] for row in connection.execute(text("PRAGMA table_info(vendor_transactions)"))}
+    if "category_id" not in columns:
+        connection.execute(
+            text(
+                "ALTER TABLE vendor_transactions "
+                "ADD COLUMN category_id INTEGER REFERENCES merchant_categories (id)"
+            )
+        )
+    connection.execute(text(CATEGORIZE_TRIGGER))
+
+    return connection.execute(
+        text(
+            f"UPDATE vendor_transactions SET category_id = {category_sql('merchant')} "
+            f"WHERE category_id IS NULL AND {category_sql('merchant')} IS NOT NULL"
+        )
+    ).rowcount
 
 
-def fake_loan(client: Client, closed_before: date) -> Loan:
+def analyze(connection: Union[Connection, Session]) -> None:
     """
-    Generate a fake loan using Faker.
+    Collects table and index statistics for the SQLite query planner. Run it
+    after bulk loads, the planner otherwise guesses row counts.
     """
-    term = random.randint(1, 6)
-    rate = random.uniform(0.08, 0.15)
+    connection.execute(text("ANALYZE"))
+
 
-    amount = (random.randint(2000, 5000) * term) // 1000 * 1000
+def unique_phone_number(client_id: int) -> str:
+    """
+    10-digit phone number, distinct for every client id below 9e9 (the
+    multiplier is coprime with the modulus).
+    """
+    return str(1_000_000_000 + client_id * 2_654_435_761 % 9_000_000_000)
+
+
+def fake_client_row(client_id: int, faker: Faker = fake) -> Dict[str, Any]:
+    first_name, last_name = faker.first_name(), faker.last_name()
+    return {
+        "id": client_id,
+        "first_name": first_name,
+        "last_name": last_name,
+        "phone_number": unique_phone_number(client_id),
+        "email": f"{first_name}.{last_name}.{client_id}@{faker.free_email_domain()}".lower(),
+    }
+
+
+def fake_loan_row(client_id: int, closed_before: date, rng: random.Random) -> Dict[str, Any]:
+    term = rng.randint(1, 6)
+    rate = rng.uniform(0.08, 0.15)
+
+    amount = (rng.randint(2000, 5000) * term) // 1000 * 1000
     payment_amount = ceil(amount * (1 + rate) / term)
 
     # Generate a random start date within the last 30 days
-    start_date = closed_before - timedelta(days=(random.randint(1, 30))) - timedelta(days=30 * term)
-
-    return Loan(
-        client_id=client.id,
-        amount=amount,
-        payment_amount=payment_amount,
-        term=term,
-        start_date=start_date,
-    )
+    start_date = closed_before - timedelta(days=(rng.randint(1, 30))) - timedelta(days=30 * term)
+
+    return {
+        "client_id": client_id,
+        "amount": amount,
+        "payment_amount": payment_amount,
+        "term": term,
+        "start_date": start_date,
+    }
+
+
+def fake_cash_flow_rows(
+    loan_id: int, amount: int, payment_amount: int, term: int, start_date: date, rng: random.Random
+) -> List[Dict[str, Any]]:
+    rows = [
+        {
+            "loan_id": loan_id,
+            "type": "expense",
+            "amount": amount,
+            "scheduled_date": start_date,
+            "payment_date": start_date,
+        }
+    ]
+    for i in range(1, term + 1):
+        scheduled_date = start_date + timedelta(days=i * 30)
+        rows.append(
+            {
+                "loan_id": loan_id,
+                "type": "income",
+                "amount": payment_amount,
+                "scheduled_date": scheduled_date,
+                "payment_date": scheduled_date
+                + timedelta(days=rng.randint(-7, 7) if rng.random() < 0.1 else 0),
+            }
+        )
+    return rows
 
 
-def fake_cash_flow_by_loan(loan: Loan) -> List[CashFlow]:
-    cash_flows: List[CashFlow] = []
+def fake_vendor_transaction_rows(
+    phone_number: str, quantity: int, rng: random.Random, reference_date: date
+) -> List[Dict[str, Any]]:
+    is_masked_merchants = rng.random() < 1 / 3
+    categories = list(FAKE_MERCHANTS)
 
-    cash_flows.append(
-        CashFlow(
-            loan_id=loan.id,
-            type="expense",
-            amount=loan.amount,
-            scheduled_date=loan.start_date,
-            payment_date=loan.start_date,
+    rows = []
+    for _ in range(quantity):
+        merchant = rng.choice(FAKE_MERCHANTS[rng.choice(categories)])
+        if is_masked_merchants:
+            merchant = mask_merchant(merchant)
+        rows.append(
+            {
+                "id": uuid.UUID(int=rng.getrandbits(128), version=4),
+                "phone_number": phone_number,
+                "amount": rng.uniform(100, 5000),
+                "merchant": merchant,
+                "category_id": MERCHANT_CATEGORY_IDS[merchant],
+                "transaction_date": reference_date - timedelta(days=rng.randint(1, 30 * 24)),
+            }
         )
-    )
+    rows.sort(key=lambda row: row["transaction_date"])
+    return rows
 
-    for i in range(1, loan.term + 1):
-        cash_flows.append(
-            CashFlow(
-                loan_id=loan.id,
-                type="income",
-                amount=loan.payment_amount,
-                scheduled_date=loan.start_date + timedelta(days=i * 30),
-                payment_date=loan.start_date
-                + timedelta(days=i * 30)
-                + timedelta(days=random.randint(-7, 7) if random.random() < 0.1 else 0),
-            )
-        )
-    return cash_flows
 
+# ========== BULK LOAD ==========
+
+# Columns written by the bulk loader, per table
+BULK_COLUMNS = {
+    "clients": ("id", "first_name", "last_name", "phone_number", "email"),
+    "loans": ("id", "client_id", "amount", "payment_amount", "term", "start_date"),
+    "cash_flows": ("loan_id", "type", "amount", "scheduled_date", "payment_date"),
+    "vendor_transactions": (
+        "id", "phone_number", "amount", "merchant", "category_id", "transaction_date"
+    ),
+}
 
-def fake_vendor_transactions(client: Client, quantity: int) -> List[VendorTransaction]:
+# Rows of a block by table, as tuples in BULK_COLUMNS order; loan ids are block-local
+BlockRows = Dict[str, List[Tuple[Any, ...]]]
+
+
+def storage_value(value: Any) -> Any:
     """
-    Generate fake vendor transactions for a client using Faker.
+    The value as the SQLAlchemy types store it in SQLite, so rows can skip
+    the per-parameter type processing of an ORM or Core insert.
     """
-    transactions: List[VendorTransaction] = []
+    if isinstance(value, date):
+        return value.isoformat()
+    if isinstance(value, uuid.UUID):
+        return value.hex
+    return value
 
-    is_masked_merchants = random.random() < 1 / 3
 
-    fake_merchants_file = Path(__file__).parent / "fake_merchants.json"
-    if not fake_merchants_file.exists():
-        raise FileNotFoundError(f"Fake merchants file not found at {fake_merchants_file.resolve()}")
-    fake_merchants = json.loads(fake_merchants_file.read_text(encoding="utf-8"))
+def storage_rows(table: str, rows: List[Dict[str, Any]]) -> List[Tuple[Any, ...]]:
+    names = BULK_COLUMNS[table]
+    return [tuple(storage_value(row[name]) for name in names) for row in rows]
 
-    for _ in range(quantity):
-        merchant_category = random.choice(list(fake_merchants.keys()))
-        merchant = random.choice(fake_merchants[merchant_category]).upper()
-        if is_masked_merchants:
-            merchant = merchant[:2] + "*****" + merchant[-1]
-        amount = random.uniform(100, 5000)
-        transaction_date = date.today() - timedelta(days=random.randint(1, 30 * 24))
-
-        transactions.append(
-            VendorTransaction(
-                phone_number=client.phone_number,
-                amount=amount,
-                merchant=merchant,
-                transaction_date=transaction_date,
+
+def generate_block(
+    seed: int, block: int, first_client_id: int, count: int, reference_date: date
+) -> BlockRows:
+    """
+    Generates `count` clients with their loans, cash flows and vendor
+    transactions, dated before `reference_date`. The RNGs are derived only
+    from (seed, block), so the rows do not depend on which worker runs the
+    block. Loan ids are local to the block (from 0); the loader shifts them
+    to global ids.
+    """
+    rng = random.Random(f"{seed}:{block}")
+    fake.seed_instance(rng.getrandbits(64))
+
+    clients, loans, cash_flows, transactions = [], [], [], []
+    for client_id in range(first_client_id, first_client_id + count):
+        client = fake_client_row(client_id)
+        clients.append(client)
+
+        if rng.random() < CLIENT_HAS_VENDOR_DATA_PROBABILITY:
+            quantity = rng.randint(*FAKE_VENDOR_TRANSACTIONS_PER_CLIENT)
+            transactions.extend(
+                fake_vendor_transaction_rows(client["phone_number"], quantity, rng, reference_date)
             )
-        )
 
-    return list(sorted(transactions, key=lambda x: x.transaction_date))
+        closed_before = reference_date
+        for _ in range(rng.randint(*LOANS_PER_CLIENT)):
+            loan = fake_loan_row(client_id, closed_before, rng)
+            loan["id"] = len(loans)
+            loans.append(loan)
+            cash_flows.extend(
+                fake_cash_flow_rows(
+                    loan["id"], loan["amount"], loan["payment_amount"], loan["term"], loan["start_date"], rng
+                )
+            )
+            closed_before = loan["start_date"]
+    return {
+        "clients": storage_rows("clients", clients),
+        "loans": storage_rows("loans", loans),
+        "cash_flows": storage_rows("cash_flows", cash_flows),
+        "vendor_transactions": storage_rows("vendor_transactions", transactions),
+    }
+
+
+def insert_statement(table: str, shifted: Tuple[str, ...] = (), shift: int = 0) -> str:
+    """
+    INSERT for executemany over BULK_COLUMNS tuples; the `shifted` columns get
+    `shift` added inside SQLite.
+    """
+    names = BULK_COLUMNS[table]
+    values = ", ".join(f"? + {int(shift)}" if name in shifted else "?" for name in names)
+    return f"INSERT INTO {table} ({', '.join(names)}) VALUES ({values})"
+
+
+def blocks(count: int) -> Iterator[Tuple[int, int, int]]:
+    """
+    (block, first client id, clients) of every block.
+    """
+    for block, start in enumerate(range(0, count, BLOCK_SIZE)):
+        yield block, start + 1, min(BLOCK_SIZE, count - start)
+
+
+@contextmanager
+def load_pragmas(connection: Connection) -> Iterator[None]:
+    """
+    Applies LOAD_PRAGMAS and restores the previous values afterwards.
+    """
+    previous = {
+        name: connection.exec_driver_sql(f"PRAGMA {name}").scalar() for name in LOAD_PRAGMAS
+    }
+    for name, value in LOAD_PRAGMAS.items():
+        connection.exec_driver_sql(f"PRAGMA {name} = {value}")
+    try:
+        yield
+    finally:
+        for name, value in previous.items():
+            connection.exec_driver_sql(f"PRAGMA {name} = {value}")
+
+
+def bulk_load(
+    db_url: str = DATABASE_URI,
+    count: int = FAKE_CLIENTS_COUNT,
+    seed: Optional[int] = None,
+    workers: int = 1,
+    reference_date: Optional[date] = None,
+) -> int:
+    """
+    Recreates the database with `count` fake clients. Rows are generated in
+    parallel blocks and inserted with one DB-API executemany per table and block;
+    indexes, rollups and statistics are built once after the load. Returns
+    the seed: with the same `reference_date` (the day every generated history
+    ends, today by default), it reproduces the same data for any number of workers.
+    """
+    if seed is None:
+        seed = random.randrange(2**63)
+    if reference_date is None:
+        reference_date = date.today()
+
+    engine = create_engine(db_url)
+    try:
+        with engine.connect() as connection:
+            Base.metadata.drop_all(connection, checkfirst=True)
+            Base.metadata.create_all(connection)
+            ensure_merchant_categories(connection)
+            # Indexes are cheaper to build once over the loaded tables
+            for table in Base.metadata.sorted_tables:
+                for index in table.indexes:
+                    index.drop(connection)
+            connection.commit()
+
+            next_loan_id = 1
+            with load_pragmas(connection), ProcessPoolExecutor(max_workers=workers) as executor:
+                pending = blocks(count)
+                # Bounded window of blocks in flight, so memory does not grow with `count`
+                while window := list(islice(pending, workers * 4)):
+                    block_ids, first_ids, sizes = zip(*window)
+                    for rows in executor.map(
+                        generate_block,
+                        [seed] * len(window),
+                        block_ids,
+                        first_ids,
+                        sizes,
+                        [reference_date] * len(window),
+                    ):
+                        statements = {
+                            "clients": insert_statement("clients"),
+                            "loans": insert_statement("loans", ("id",), next_loan_id),
+                            "cash_flows": insert_statement("cash_flows", ("loan_id",), next_loan_id),
+                            "vendor_transactions": insert_statement("vendor_transactions"),
+                        }
+                        for table, statement in statements.items():
+                            if rows[table]:
+                                connection.exec_driver_sql(statement, rows[table])
+                        next_loan_id += len(rows["loans"])
+                        connection.commit()
+
+                # Rollups are rebuilt in one pass, their triggers handle later inserts
+                create_rollups(connection)
+                rebuild_rollups(connection)
+                ensure_indexes(connection)
+                connection.commit()
+    finally:
+        engine.dispose()
+    return seed
 
 
 if __name__ == "__main__":
-    fake = Faker()
-
-    with db_session(DATABASE_URI) as session:
-        # Delete existing data
-        Base.metadata.drop_all(session.bind, checkfirst=True)
-        # Create the table
-        Base.metadata.create_all(session.bind)
-
-        # Generate fake data
-        for _ in range(FAKE_CLIENTS_COUNT):
-            session.add(fake_client())
-        session.commit()
-
-    loans: List[Loan] = []
-    for client in session.query(Client).all():
-        # Generate vendor transactions for each client
-        if random.random() < CLIENT_HAS_VENDOR_DATA_PROBABILITY:
-            transactions_count = random.randint(*FAKE_VENDOR_TRANSACTIONS_PER_CLIENT)
-            transactions = fake_vendor_transactions(client, transactions_count)
-            for transaction in transactions:
-                session.add(transaction)
-        session.commit()
-
-        # Generate random loans
-        loans_count = random.randint(*LOANS_PER_CLIENT)
-        closed_before = date.today()
-        for _ in range(loans_count):
-            loan = fake_loan(client, closed_before)
-            loans.append(loan)
-            closed_before = loan.start_date
-    loans.sort(key=lambda x: x.start_date)
-    for loan in loans:
-        session.add(loan)
-    session.commit()
-
-    # Generate cash flows for each loan
-    cash_flows: List[CashFlow] = []
-    for loan in loans:
-        cash_flows.extend(fake_cash_flow_by_loan(loan))
-    cash_flows.sort(key=lambda x: x.scheduled_date)
-    for cash_flow in cash_flows:
-        session.add(cash_flow)
-    session.commit()
-
-print("[bold green]Fake data generated successfully!:rocket-emoji:")
+    parser = argparse.ArgumentParser(description="Generate the fake sql_task database.")
+    parser.add_argument("--clients", type=int, default=FAKE_CLIENTS_COUNT)
+    parser.add_argument(
+        "--seed", type=int, default=None, help="Seed for reproducible clients, loans and transactions"
+    )
+    parser.add_argument("--workers", type=int, default=1, help="Row generator processes")
+    parser.add_argument("--db", default=DATABASE_URI, help="SQLAlchemy database URL")
+    parser.add_argument(
+        "--reference-date",
+        type=date.fromisoformat,
+        default=date.today(),
+        help="Day the generated histories end on (YYYY-MM-DD, default: today); with --seed, the same data",
+    )
+    args = parser.parse_args()
+
+    seed = bulk_load(args.db, args.clients, args.seed, args.workers, args.reference_date)
+    print(
+        f"[bold green]Fake data generated successfully with seed {seed} "
+        f"and reference date {args.reference_date}!:rocket-emoji:"
+    )
@@ -0,0 +1,128 @@
+import json
+from pathlib import Path
+import re
+from typing import Dict, List, Optional, Tuple
+
+from rich import print
+
+MERCHANTS_PATH = Path(__file__).parent / "fake_merchants.json"
+
+# Vendors may send a masked merchant name: first two characters, "*****", last character
+MASK = "*****"
+MASKED_MERCHANT = re.compile(r"^(.{2})\*+(.)$")
+# Characters str.strip() removes from an ASCII name
+WHITESPACE_SQL = "char(9, 10, 11, 12, 13, 28, 29, 30, 31, 32)"
+
+
+def load_merchants(path: Path = MERCHANTS_PATH) -> Dict[str, List[str]]:
+    """
+    Merchant names by category, as in fake_merchants.json.
+    """
+    if not path.exists():
+        raise FileNotFoundError(f"Fake merchants file not found at {path.resolve()}")
+    return json.loads(path.read_text(encoding="utf-8"))
+
+
+def mask_merchant(merchant: str) -> str:
+    return merchant[:2] + MASK + merchant[-1]
+
+
+def signature(merchant: str) -> Tuple[str, str]:
+    return merchant[:2], merchant[-1]
+
+
+class MerchantCategorizer:
+    """
+    Resolves a merchant name to its category id. Category ids are 1-based
+    positions in fake_merchants.json. Rules, applied to the upper-cased name:
+
+    1. A known merchant name resolves to its category.
+    2. A masked name (`XX*****Y`) resolves to the category of the known
+       merchants with the same first two and last characters, if they all
+       belong to one category.
+    3. Anything else, including ambiguous masked names, is uncategorized (None).
+    """
+
+    def __init__(self, merchants: Dict[str, List[str]]):
+        self.category_ids = {category: i for i, category in enumerate(merchants, start=1)}
+        self.by_name: Dict[str, int] = {}
+        signatures: Dict[Tuple[str, str], set] = {}
+        for category, names in merchants.items():
+            for name in names:
+                name = name.upper()
+                self.by_name[name] = self.category_ids[category]
+                signatures.setdefault(signature(name), set()).add(self.category_ids[category])
+        self.by_signature = {key: ids.pop() for key, ids in signatures.items() if len(ids) == 1}
+        self.ambiguous = sorted(key for key, ids in signatures.items() if len(ids) > 1)
+
+    def categorize(self, merchant: str) -> Optional[int]:
+        merchant = merchant.strip().upper()
+        category_id = self.by_name.get(merchant)
+        if category_id is not None:
+            return category_id
+        match = MASKED_MERCHANT.match(merchant)
+        if match is None:
+            return None
+        return self.by_signature.get(match.groups())
+
+    def lookup_rows(self) -> List[Tuple[str, int]]:
+        """
+        (name, category_id) rows of the merchant_names table: every known name
+        and the `XX*****Y` form of every unambiguous masked signature.
+        """
+        masked = [
+            (f"{first}{MASK}{last}", category_id) for (first, last), category_id in self.by_signature.items()
+        ]
+        return list(self.by_name.items()) + masked
+
+
+def category_sql(merchant: str) -> str:
+    """
+    The categorization rules in SQL, for the merchant name expression
+    `merchant`: a masked name of any length is looked up as `XX*****Y`, every
+    other name as is, both upper-cased and stripped, in merchant_names. NULL
+    when uncategorized. Used by the insert triggers, so rows from any writer
+    are categorized like MerchantCategorizer.categorize does.
+    """
+    return f"""(
+        SELECT mn.category_id
+        FROM (SELECT UPPER(TRIM({merchant}, {WHITESPACE_SQL})) AS name) AS m
+        JOIN merchant_names mn ON mn.name = CASE
+            WHEN length(m.name) >= 4 AND ltrim(substr(m.name, 3, length(m.name) - 3), '*') = ''
+            THEN substr(m.name, 1, 2) || '{MASK}' || substr(m.name, -1)
+            ELSE m.name
+        END
+    )"""
+
+
+def check_rules(merchants: Dict[str, List[str]]) -> List[str]:
+    """
+    Checks that every known merchant resolves to its own category, plain,
+    lower-case and masked. Returns the problems found.
+    """
+    categorizer = MerchantCategorizer(merchants)
+    problems = [f"Masked names {a}{MASK}{b} match several categories" for a, b in categorizer.ambiguous]
+    for category, names in merchants.items():
+        expected = categorizer.category_ids[category]
+        for name in names:
+            for variant in (name, name.upper(), mask_merchant(name.upper())):
+                if signature(variant.upper()) in categorizer.ambiguous and MASK in variant:
+                    continue
+                actual = categorizer.categorize(variant)
+                if actual != expected:
+                    problems.append(f"{variant!r} resolves to {actual}, expected {expected} ({category})")
+    for unknown in ("", "UNKNOWNSHOP", "ZZ*****Z", "FA**"):
+        if categorizer.categorize(unknown) is not None:
+            problems.append(f"{unknown!r} should not be categorized")
+    return problems
+
+
+if __name__ == "__main__":
+    merchants = load_merchants()
+    problems = check_rules(merchants)
+    if problems:
+        for problem in problems:
+            print(f"[bold red]{problem}")
+        raise SystemExit(1)
+    categories = ", ".join(f"{i}={name}" for i, name in enumerate(merchants, start=1))
+    print(f"[bold green]Merchant categorization rules hold for {categories}")
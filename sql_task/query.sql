@@ -22,33 +22,49 @@
 -- 4. history_payment_ratio_l9m_to_total
 -- 5. history_average_loan_profit_margin_l12m
 -- If the client has no relevant data, the features are returned as NULL.
+--
+-- The as_of parameter (YYYY-MM-DD, optional) computes the features as they
+-- were on that day: windows end on as_of and later events are ignored. When
+-- NULL, the windows end today and every stored event counts.
 -- =======================================
 
 WITH
 
+-- 0. Clients to compute (bulk mode replaces the client_id filter)
+target AS NOT MATERIALIZED (
+  SELECT c.id, c.phone_number
+  FROM clients c
+  WHERE c.id = :client_id
+),
+
+-- Last event date taken into account and window starts. Read as scalar
+-- subqueries, so the planner keeps searching the indexes per client.
+bounds AS MATERIALIZED (
+  SELECT
+    COALESCE(DATE(:as_of), '9999-12-31') AS last_date,
+    DATE(COALESCE(:as_of, 'now'), '-12 months') AS l12m_start,
+    DATE(COALESCE(:as_of, 'now'), '-9 months') AS l9m_start,
+    DATE(COALESCE(:as_of, 'now'), '-6 months') AS l6m_start
+),
+
 -- 1. Microfinance & Gambling Payments (last 12 months)
+-- Merchant categories are resolved on insert (sql_task/merchants.py), masked names included:
+-- by the writer, or by the vendor_transactions_category trigger when category_id is left out
 vmg AS (
   SELECT
     vt.phone_number,
     SUM(
       CASE
-        -- Microfinance
-        WHEN UPPER(vt.merchant) LIKE 'FA%' AND UPPER(vt.merchant) LIKE '%Y' THEN vt.amount
-        WHEN UPPER(vt.merchant) LIKE 'EV%' AND UPPER(vt.merchant) LIKE '%Y' THEN vt.amount
-        WHEN UPPER(vt.merchant) LIKE 'CH%' AND UPPER(vt.merchant) LIKE '%G' THEN vt.amount
-        WHEN UPPER(vt.merchant) LIKE 'EL%' AND UPPER(vt.merchant) LIKE '%N' THEN vt.amount
-        WHEN UPPER(vt.merchant) LIKE 'MO%' AND UPPER(vt.merchant) LIKE '%E' THEN vt.amount
-        -- Gambling
-        WHEN UPPER(vt.merchant) LIKE 'IF%' AND UPPER(vt.merchant) LIKE '%Y' THEN vt.amount
-        WHEN UPPER(vt.merchant) LIKE 'YO%' AND UPPER(vt.merchant) LIKE '%G' THEN vt.amount
-        WHEN UPPER(vt.merchant) LIKE 'CA%' AND UPPER(vt.merchant) LIKE '%S' THEN vt.amount
-        WHEN UPPER(vt.merchant) LIKE 'PO%' AND UPPER(vt.merchant) LIKE '%E' THEN vt.amount
-        WHEN UPPER(vt.merchant) LIKE 'VE%' AND UPPER(vt.merchant) LIKE '%R' THEN vt.amount
+        WHEN vt.category_id IN (
+          SELECT mc.id FROM merchant_categories mc WHERE mc.name IN ('microfinance', 'gambling')
+        ) THEN vt.amount
         ELSE 0
       END
     ) * 1.0 / NULLIF(SUM(vt.amount), 0) AS vendor_microfinance_gambling_payment_ratio_l12m
-  FROM vendor_transactions vt
-  WHERE vt.transaction_date >= DATE('now', '-12 months')
+  FROM target t
+  JOIN vendor_transactions vt ON vt.phone_number = t.phone_number
+  WHERE vt.transaction_date >= (SELECT l12m_start FROM bounds)
+    AND vt.transaction_date <= (SELECT last_date FROM bounds)
   GROUP BY vt.phone_number
 ),
 
@@ -58,25 +74,16 @@ vgu AS (
     vt.phone_number,
     COUNT(
       CASE
-        -- Grocery
-        WHEN UPPER(vt.merchant) LIKE 'KI%' AND UPPER(vt.merchant) LIKE '%E' THEN 1
-        WHEN UPPER(vt.merchant) LIKE 'SE%' AND UPPER(vt.merchant) LIKE '%N' THEN 1
-        WHEN UPPER(vt.merchant) LIKE 'EI%' AND UPPER(vt.merchant) LIKE '%E' THEN 1
-        WHEN UPPER(vt.merchant) LIKE 'CO%' AND UPPER(vt.merchant) LIKE '%E' THEN 1
-        WHEN UPPER(vt.merchant) LIKE 'MA%' AND UPPER(vt.merchant) LIKE '%X' THEN 1
-        WHEN UPPER(vt.merchant) LIKE 'MR%' AND UPPER(vt.merchant) LIKE '%T' THEN 1
-        -- Utilities
-        WHEN UPPER(vt.merchant) LIKE 'RO%' AND UPPER(vt.merchant) LIKE '%D' THEN 1
-        WHEN UPPER(vt.merchant) LIKE 'WA%' AND UPPER(vt.merchant) LIKE '%T' THEN 1
-        WHEN UPPER(vt.merchant) LIKE 'EL%' AND UPPER(vt.merchant) LIKE '%Y' THEN 1
-        WHEN UPPER(vt.merchant) LIKE 'OU%' AND UPPER(vt.merchant) LIKE '%K' THEN 1
-        WHEN UPPER(vt.merchant) LIKE 'AW%' AND UPPER(vt.merchant) LIKE '%T' THEN 1
-        WHEN UPPER(vt.merchant) LIKE 'BO%' AND UPPER(vt.merchant) LIKE '%T' THEN 1
+        WHEN vt.category_id IN (
+          SELECT mc.id FROM merchant_categories mc WHERE mc.name IN ('grocery', 'utilities')
+        ) THEN 1
         ELSE NULL
       END
     ) * 1.0 / NULLIF(COUNT(*), 0) AS vendor_grocery_utilities_transaction_ratio_l9m
-  FROM vendor_transactions vt
-  WHERE vt.transaction_date >= DATE('now', '-9 months')
+  FROM target t
+  JOIN vendor_transactions vt ON vt.phone_number = t.phone_number
+  WHERE vt.transaction_date >= (SELECT l9m_start FROM bounds)
+    AND vt.transaction_date <= (SELECT last_date FROM bounds)
   GROUP BY vt.phone_number
 ),
 
@@ -87,12 +94,14 @@ hpd AS (
     CASE
       WHEN COUNT(*) > 0 THEN 1 ELSE 0
     END AS history_payment_delay_flag_l6m
-  FROM cash_flows cf
-  JOIN loans l ON cf.loan_id = l.id
+  FROM target t
+  JOIN loans l ON l.client_id = t.id
+  JOIN cash_flows cf ON cf.loan_id = l.id
   WHERE
     cf.type = 'income'
     AND cf.payment_date > cf.scheduled_date
-    AND cf.payment_date >= DATE('now', '-6 months')
+    AND cf.payment_date >= (SELECT l6m_start FROM bounds)
+    AND cf.payment_date <= (SELECT last_date FROM bounds)
   GROUP BY l.client_id
 ),
 
@@ -101,11 +110,12 @@ hpr AS (
   SELECT
     l.client_id,
     SUM(
-      CASE WHEN cf.payment_date >= DATE('now', '-9 months') THEN cf.amount ELSE 0 END
+      CASE WHEN cf.payment_date >= (SELECT l9m_start FROM bounds) THEN cf.amount ELSE 0 END
     ) * 1.0 / NULLIF(SUM(cf.amount), 0) AS history_payment_ratio_l9m_to_total
-  FROM cash_flows cf
-  JOIN loans l ON cf.loan_id = l.id
-  WHERE cf.type = 'income'
+  FROM target t
+  JOIN loans l ON l.client_id = t.id
+  JOIN cash_flows cf ON cf.loan_id = l.id
+  WHERE cf.type = 'income' AND cf.payment_date <= (SELECT last_date FROM bounds)
   GROUP BY l.client_id
 ),
 
@@ -119,9 +129,13 @@ hpm AS (
       l.id AS loan_id,
       l.client_id,
       (l.amount - COALESCE(SUM(cf.amount), 0)) * 1.0 / NULLIF(l.amount, 0) AS profit_margin
-    FROM loans l
-    LEFT JOIN cash_flows cf ON cf.loan_id = l.id AND cf.type = 'income'
-    WHERE l.start_date >= DATE('now', '-12 months')
+    FROM target t
+    JOIN loans l ON l.client_id = t.id
+    LEFT JOIN cash_flows cf ON cf.loan_id = l.id
+      AND cf.type = 'income'
+      AND cf.payment_date <= (SELECT last_date FROM bounds)
+    WHERE l.start_date >= (SELECT l12m_start FROM bounds)
+      AND l.start_date <= (SELECT last_date FROM bounds)
     GROUP BY l.id
   ) sub
   GROUP BY client_id
@@ -137,10 +151,9 @@ SELECT
   hpd.history_payment_delay_flag_l6m,
   hpr.history_payment_ratio_l9m_to_total,
   hpm.history_average_loan_profit_margin_l12m
-FROM clients c
+FROM target c
 LEFT JOIN vmg ON vmg.phone_number = c.phone_number
 LEFT JOIN vgu ON vgu.phone_number = c.phone_number
 LEFT JOIN hpd ON hpd.client_id = c.id
 LEFT JOIN hpr ON hpr.client_id = c.id
-LEFT JOIN hpm ON hpm.client_id = c.id
-WHERE c.id = :client_id;
+LEFT JOIN hpm ON hpm.client_id = c.id;
@@ -0,0 +1,179 @@
+-- =======================================
+-- Feature Engineering from monthly rollups
+-- =======================================
+-- Same 5 features and NULL rules as query.sql, read from the rollup tables
+-- (sql_task/rollups.py). A window starting on day D takes the months after
+-- the month of D from the rollups and the rest of D's month from raw rows,
+-- so the result does not depend on how the window is split.
+-- =======================================
+
+WITH
+
+-- 0. Clients to compute (bulk mode replaces the client_id filter)
+target AS NOT MATERIALIZED (
+  SELECT c.id, c.phone_number
+  FROM clients c
+  WHERE c.id = :client_id
+),
+
+-- Window starts, their month and the first day of the following month.
+-- Read as scalar subqueries: joined, its unknown size makes the planner
+-- build bloom filters over whole tables for a single client.
+bounds AS MATERIALIZED (
+  SELECT
+    DATE('now', '-12 months') AS l12m_start,
+    strftime('%Y-%m', DATE('now', '-12 months')) AS l12m_month,
+    DATE('now', '-12 months', 'start of month', '+1 month') AS l12m_next,
+    DATE('now', '-9 months') AS l9m_start,
+    strftime('%Y-%m', DATE('now', '-9 months')) AS l9m_month,
+    DATE('now', '-9 months', 'start of month', '+1 month') AS l9m_next,
+    DATE('now', '-6 months') AS l6m_start,
+    strftime('%Y-%m', DATE('now', '-6 months')) AS l6m_month,
+    DATE('now', '-6 months', 'start of month', '+1 month') AS l6m_next
+),
+
+-- 1. Microfinance & Gambling Payments (last 12 months)
+vmg AS (
+  SELECT
+    phone_number,
+    SUM(
+      CASE
+        WHEN category_id IN (
+          SELECT mc.id FROM merchant_categories mc WHERE mc.name IN ('microfinance', 'gambling')
+        ) THEN amount
+        ELSE 0
+      END
+    ) * 1.0 / NULLIF(SUM(amount), 0) AS vendor_microfinance_gambling_payment_ratio_l12m
+  FROM (
+    SELECT vm.phone_number, vm.category_id, vm.amount
+    FROM target t
+    JOIN vendor_monthly vm ON vm.phone_number = t.phone_number
+      AND vm.month > (SELECT l12m_month FROM bounds)
+    UNION ALL
+    SELECT vt.phone_number, vt.category_id, vt.amount
+    FROM target t
+    JOIN vendor_transactions vt ON vt.phone_number = t.phone_number
+      AND vt.transaction_date >= (SELECT l12m_start FROM bounds)
+      AND vt.transaction_date < (SELECT l12m_next FROM bounds)
+  )
+  GROUP BY phone_number
+),
+
+-- 2. Grocery & Utilities Transaction Ratio (last 9 months)
+vgu AS (
+  SELECT
+    phone_number,
+    SUM(
+      CASE
+        WHEN category_id IN (
+          SELECT mc.id FROM merchant_categories mc WHERE mc.name IN ('grocery', 'utilities')
+        ) THEN transactions
+        ELSE 0
+      END
+    ) * 1.0 / NULLIF(SUM(transactions), 0) AS vendor_grocery_utilities_transaction_ratio_l9m
+  FROM (
+    SELECT vm.phone_number, vm.category_id, vm.transactions
+    FROM target t
+    JOIN vendor_monthly vm ON vm.phone_number = t.phone_number
+      AND vm.month > (SELECT l9m_month FROM bounds)
+    UNION ALL
+    SELECT vt.phone_number, vt.category_id, 1 AS transactions
+    FROM target t
+    JOIN vendor_transactions vt ON vt.phone_number = t.phone_number
+      AND vt.transaction_date >= (SELECT l9m_start FROM bounds)
+      AND vt.transaction_date < (SELECT l9m_next FROM bounds)
+  )
+  GROUP BY phone_number
+),
+
+-- 3. Payment Delay Flag (last 6 months)
+hpd AS (
+  SELECT
+    client_id,
+    CASE
+      WHEN SUM(delayed_payments) > 0 THEN 1
+    END AS history_payment_delay_flag_l6m
+  FROM (
+    SELECT cm.client_id, cm.delayed_payments
+    FROM target t
+    JOIN client_cash_flow_monthly cm ON cm.client_id = t.id
+      AND cm.month > (SELECT l6m_month FROM bounds)
+    UNION ALL
+    SELECT l.client_id, 1 AS delayed_payments
+    FROM target t
+    JOIN loans l ON l.client_id = t.id
+    JOIN cash_flows cf ON cf.loan_id = l.id
+    WHERE
+      cf.type = 'income'
+      AND cf.payment_date > cf.scheduled_date
+      AND cf.payment_date >= (SELECT l6m_start FROM bounds)
+      AND cf.payment_date < (SELECT l6m_next FROM bounds)
+  )
+  GROUP BY client_id
+),
+
+-- 4. Ratio of income payments in last 9 months to total income payments
+hpr AS (
+  SELECT
+    client_id,
+    SUM(recent_amount) * 1.0 / NULLIF(SUM(total_amount), 0) AS history_payment_ratio_l9m_to_total
+  FROM (
+    SELECT
+      cm.client_id,
+      CASE WHEN cm.month > (SELECT l9m_month FROM bounds) THEN cm.income_amount ELSE 0 END AS recent_amount,
+      cm.income_amount AS total_amount
+    FROM target t
+    JOIN client_cash_flow_monthly cm ON cm.client_id = t.id
+    UNION ALL
+    SELECT l.client_id, cf.amount AS recent_amount, 0 AS total_amount
+    FROM target t
+    JOIN loans l ON l.client_id = t.id
+    JOIN cash_flows cf ON cf.loan_id = l.id
+    WHERE
+      cf.type = 'income'
+      AND cf.payment_date >= (SELECT l9m_start FROM bounds)
+      AND cf.payment_date < (SELECT l9m_next FROM bounds)
+  )
+  GROUP BY client_id
+),
+
+-- 5. Average profit margin for loans issued in the last 12 months
+hpm AS (
+  SELECT
+    client_id,
+    SUM(margin_sum) / NULLIF(SUM(loans), 0) AS history_average_loan_profit_margin_l12m
+  FROM (
+    SELECT lm.client_id, lm.margin_sum, lm.loans
+    FROM target t
+    JOIN client_loan_monthly lm ON lm.client_id = t.id
+      AND lm.month > (SELECT l12m_month FROM bounds)
+    UNION ALL
+    SELECT
+      l.client_id,
+      (l.amount - COALESCE(SUM(cf.amount), 0)) * 1.0 / NULLIF(l.amount, 0) AS margin_sum,
+      CASE WHEN l.amount <> 0 THEN 1 ELSE 0 END AS loans
+    FROM target t
+    JOIN loans l ON l.client_id = t.id
+    LEFT JOIN cash_flows cf ON cf.loan_id = l.id AND cf.type = 'income'
+    WHERE l.start_date >= (SELECT l12m_start FROM bounds) AND l.start_date < (SELECT l12m_next FROM bounds)
+    GROUP BY l.id
+  )
+  GROUP BY client_id
+)
+
+-- ================================
+-- Final query combining all features
+-- ================================
+SELECT
+  c.id AS client_id,
+  vmg.vendor_microfinance_gambling_payment_ratio_l12m,
+  vgu.vendor_grocery_utilities_transaction_ratio_l9m,
+  hpd.history_payment_delay_flag_l6m,
+  hpr.history_payment_ratio_l9m_to_total,
+  hpm.history_average_loan_profit_margin_l12m
+FROM target c
+LEFT JOIN vmg ON vmg.phone_number = c.phone_number
+LEFT JOIN vgu ON vgu.phone_number = c.phone_number
+LEFT JOIN hpd ON hpd.client_id = c.id
+LEFT JOIN hpr ON hpr.client_id = c.id
+LEFT JOIN hpm ON hpm.client_id = c.id;
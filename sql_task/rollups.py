@@ -0,0 +1,222 @@
+from pathlib import Path
+
+from sqlalchemy import text
+from sqlalchemy.engine import Connection
+
+try:
+    from .merchants import category_sql
+except ImportError:
+    from merchants import category_sql
+
+ROLLUP_QUERY_PATH = Path(__file__).parent / "rollup_query.sql"
+
+# Per-client, per-month aggregates of the raw tables. `month` is 'YYYY-MM' of
+# the row date. rollup_query.sql reads complete months from here and only the
+# first, partial month of every window from the raw tables.
+ROLLUP_TABLES = {
+    "vendor_monthly": """
+        CREATE TABLE vendor_monthly (
+            phone_number VARCHAR(20) NOT NULL,
+            month TEXT NOT NULL,
+            category_id INTEGER NOT NULL,  -- 0 when uncategorized
+            amount REAL NOT NULL,
+            transactions INTEGER NOT NULL,
+            PRIMARY KEY (phone_number, month, category_id)
+        ) WITHOUT ROWID
+    """,
+    # Income cash flows by payment month
+    "client_cash_flow_monthly": """
+        CREATE TABLE client_cash_flow_monthly (
+            client_id INTEGER NOT NULL,
+            month TEXT NOT NULL,
+            income_amount REAL NOT NULL,
+            income_payments INTEGER NOT NULL,
+            delayed_payments INTEGER NOT NULL,
+            PRIMARY KEY (client_id, month)
+        ) WITHOUT ROWID
+    """,
+    # Profit margins of loans with a non-zero amount, by start month
+    "client_loan_monthly": """
+        CREATE TABLE client_loan_monthly (
+            client_id INTEGER NOT NULL,
+            month TEXT NOT NULL,
+            margin_sum REAL NOT NULL,
+            loans INTEGER NOT NULL,
+            PRIMARY KEY (client_id, month)
+        ) WITHOUT ROWID
+    """,
+}
+
+# Keep the rollups up to date on INSERT. Updates and deletes of raw rows need
+# rebuild_rollups(). A vendor transaction inserted without category_id is
+# categorized here too: triggers on the same table fire in no set order, so
+# the categorization trigger may not have run yet.
+ROLLUP_TRIGGERS = {
+    "vendor_transactions_rollup": f"""
+        CREATE TRIGGER vendor_transactions_rollup AFTER INSERT ON vendor_transactions
+        BEGIN
+            INSERT INTO vendor_monthly (phone_number, month, category_id, amount, transactions)
+            VALUES (
+                NEW.phone_number,
+                strftime('%Y-%m', NEW.transaction_date),
+                COALESCE(NEW.category_id, {category_sql('NEW.merchant')}, 0),
+                NEW.amount,
+                1
+            )
+            ON CONFLICT (phone_number, month, category_id) DO UPDATE SET
+                amount = amount + excluded.amount,
+                transactions = transactions + 1;
+        END
+    """,
+    "cash_flows_rollup": """
+        CREATE TRIGGER cash_flows_rollup AFTER INSERT ON cash_flows WHEN NEW.type = 'income'
+        BEGIN
+            INSERT INTO client_cash_flow_monthly (
+                client_id, month, income_amount, income_payments, delayed_payments
+            )
+            SELECT
+                l.client_id,
+                strftime('%Y-%m', NEW.payment_date),
+                NEW.amount,
+                1,
+                NEW.payment_date > NEW.scheduled_date
+            FROM loans l
+            WHERE l.id = NEW.loan_id
+            ON CONFLICT (client_id, month) DO UPDATE SET
+                income_amount = income_amount + excluded.income_amount,
+                income_payments = income_payments + 1,
+                delayed_payments = delayed_payments + excluded.delayed_payments;
+
+            UPDATE client_loan_monthly
+            SET margin_sum = margin_sum - (
+                SELECT NEW.amount * 1.0 / l.amount FROM loans l WHERE l.id = NEW.loan_id
+            )
+            WHERE (client_id, month) = (
+                SELECT l.client_id, strftime('%Y-%m', l.start_date)
+                FROM loans l
+                WHERE l.id = NEW.loan_id AND l.amount <> 0
+            );
+        END
+    """,
+    # Cash flows may arrive before their loan: take those already stored into account
+    "loans_rollup": """
+        CREATE TRIGGER loans_rollup AFTER INSERT ON loans
+        BEGIN
+            INSERT INTO client_loan_monthly (client_id, month, margin_sum, loans)
+            SELECT
+                NEW.client_id,
+                strftime('%Y-%m', NEW.start_date),
+                (NEW.amount - COALESCE(SUM(cf.amount), 0)) * 1.0 / NEW.amount,
+                1
+            FROM (SELECT NEW.id AS id) AS loan
+            LEFT JOIN cash_flows cf ON cf.loan_id = loan.id AND cf.type = 'income'
+            WHERE NEW.amount <> 0
+            GROUP BY loan.id
+            ON CONFLICT (client_id, month) DO UPDATE SET
+                margin_sum = margin_sum + excluded.margin_sum,
+                loans = loans + 1;
+
+            INSERT INTO client_cash_flow_monthly (
+                client_id, month, income_amount, income_payments, delayed_payments
+            )
+            SELECT
+                NEW.client_id,
+                strftime('%Y-%m', cf.payment_date),
+                SUM(cf.amount),
+                COUNT(*),
+                SUM(cf.payment_date > cf.scheduled_date)
+            FROM cash_flows cf
+            WHERE cf.loan_id = NEW.id AND cf.type = 'income'
+            GROUP BY 2
+            ON CONFLICT (client_id, month) DO UPDATE SET
+                income_amount = income_amount + excluded.income_amount,
+                income_payments = income_payments + excluded.income_payments,
+                delayed_payments = delayed_payments + excluded.delayed_payments;
+        END
+    """,
+}
+
+REBUILD_STATEMENTS = (
+    "DELETE FROM vendor_monthly",
+    """
+    INSERT INTO vendor_monthly (phone_number, month, category_id, amount, transactions)
+    SELECT
+        phone_number,
+        strftime('%Y-%m', transaction_date),
+        COALESCE(category_id, 0),
+        SUM(amount),
+        COUNT(*)
+    FROM vendor_transactions
+    GROUP BY 1, 2, 3
+    """,
+    "DELETE FROM client_cash_flow_monthly",
+    """
+    INSERT INTO client_cash_flow_monthly (
+        client_id, month, income_amount, income_payments, delayed_payments
+    )
+    SELECT
+        l.client_id,
+        strftime('%Y-%m', cf.payment_date),
+        SUM(cf.amount),
+        COUNT(*),
+        SUM(cf.payment_date > cf.scheduled_date)
+    FROM cash_flows cf
+    JOIN loans l ON l.id = cf.loan_id
+    WHERE cf.type = 'income'
+    GROUP BY 1, 2
+    """,
+    "DELETE FROM client_loan_monthly",
+    """
+    INSERT INTO client_loan_monthly (client_id, month, margin_sum, loans)
+    SELECT client_id, strftime('%Y-%m', start_date), SUM(margin), COUNT(*)
+    FROM (
+        SELECT
+            l.client_id,
+            l.start_date,
+            (l.amount - COALESCE(SUM(cf.amount), 0)) * 1.0 / l.amount AS margin
+        FROM loans l
+        LEFT JOIN cash_flows cf ON cf.loan_id = l.id AND cf.type = 'income'
+        WHERE l.amount <> 0
+        GROUP BY l.id
+    )
+    GROUP BY 1, 2
+    """,
+)
+
+
+def create_triggers(connection: Connection) -> None:
+    """
+    (Re)creates the rollup triggers, replacing older definitions.
+    """
+    for trigger, ddl in ROLLUP_TRIGGERS.items():
+        connection.execute(text(f"DROP TRIGGER IF EXISTS {trigger}"))
+        connection.execute(text(ddl))
+
+
+def create_rollups(connection: Connection) -> None:
+    """
+    (Re)creates the empty rollup tables and their triggers. Rows inserted
+    afterwards are aggregated as they arrive.
+    """
+    for trigger in ROLLUP_TRIGGERS:
+        connection.execute(text(f"DROP TRIGGER IF EXISTS {trigger}"))
+    for table, ddl in ROLLUP_TABLES.items():
+        connection.execute(text(f"DROP TABLE IF EXISTS {table}"))
+        connection.execute(text(ddl))
+    create_triggers(connection)
+
+
+def rebuild_rollups(connection: Connection) -> None:
+    """
+    Recomputes the rollups from the raw tables, e.g. after updates, deletes
+    or a bulk load without triggers.
+    """
+    existing = set(
+        connection.execute(text("SELECT name FROM sqlite_master WHERE type = 'table'")).scalars()
+    )
+    if not set(ROLLUP_TABLES) <= existing:
+        create_rollups(connection)
+    else:
+        create_triggers(connection)
+    for statement in REBUILD_STATEMENTS:
+        connection.execute(text(statement))
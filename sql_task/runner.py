@@ -1,14 +1,53 @@
+import argparse
+import csv
+from datetime import date
+import json
+from math import isclose
+import re
 from pathlib import Path
-from random import choice
+from random import choice, sample
+from statistics import median
+import time
+from typing import Any, Dict, Iterator, List, Optional, Sequence, Set, Tuple
 
 from rich import print
 from rich.pretty import pprint
+from rich.table import Table
 from sqlalchemy import text
+from sqlalchemy.orm import Session
 
 try:
-    from .data_generator import DATABASE_URI, db_session
+    from .backfill import Backfill
+    from .columnar import ColumnarFeatures
+    from .data_generator import (
+        DATABASE_URI,
+        Base,
+        db_session,
+        ensure_indexes,
+        ensure_merchant_categories,
+    )
+    from .rollups import ROLLUP_QUERY_PATH, ROLLUP_TABLES, rebuild_rollups
 except ImportError:
-    from data_generator import DATABASE_URI, db_session
+    from backfill import Backfill
+    from columnar import ColumnarFeatures
+    from data_generator import (
+        DATABASE_URI,
+        Base,
+        db_session,
+        ensure_indexes,
+        ensure_merchant_categories,
+    )
+    from rollups import ROLLUP_QUERY_PATH, ROLLUP_TABLES, rebuild_rollups
+
+QUERY_PATH = Path(__file__).parent / "query.sql"
+# Final filter of query.sql, replaced to compute many clients at once
+CLIENT_FILTER = "WHERE c.id = :client_id"
+BULK_BATCH_SIZE = 10_000
+FEATURES_TABLE = "client_features"
+# Feature queries: over the raw tables, or over the monthly rollups
+QUERIES = {"raw": QUERY_PATH, "rollups": ROLLUP_QUERY_PATH}
+# Bulk feature engines: the feature query inside SQLite, or grouped scans per table (sql_task/columnar.py)
+BACKENDS = ("sql", "columnar")
 
 columns = [
     "client_id",
@@ -18,22 +57,25 @@ columns = [
     "vendor_grocery_utilities_transaction_ratio_l9m",
     "vendor_microfinance_gambling_payment_ratio_l12m",
 ]
+backfill_columns = ["client_id", "as_of", *columns[1:]]
 
 
-def run_once():
-    query_path = Path(__file__).parent / "query.sql"
+def load_query(query_path: Path = QUERY_PATH) -> str:
     if not query_path.exists():
         raise FileNotFoundError(f"Query file not found at {query_path.resolve()}")
+    return query_path.read_text(encoding="utf-8")
+
 
-    with open(query_path, "r", encoding="utf-8") as file:
-        query = text(file.read())
+def run_once(query_path: Path = QUERY_PATH, db_url: str = DATABASE_URI, as_of: Optional[str] = None):
+    query = text(load_query(query_path))
 
-    with db_session(DATABASE_URI) as session:
+    with db_session(db_url) as session:
         # Get all clients
         clients = session.execute(text("SELECT id FROM clients")).fetchall()
         # Select a random client
         params = {
             "client_id": choice(clients)[0],
+            "as_of": as_of,
         }
         # Execute the query with the selected client and get the result as a dictionary
         result = dict(session.execute(query, params).mappings().one())
@@ -60,5 +102,554 @@ def run_once():
         pprint(result)
 
 
+# ========== BULK MODE ==========
+
+
+def bulk_query(query: str, client_ids: Optional[Sequence[int]] = None) -> str:
+    """
+    The feature query for many clients at once: every CTE aggregates its table
+    a single time and the final SELECT keeps all clients, or only the ones in
+    the `:client_ids` JSON array.
+    """
+    if CLIENT_FILTER not in query:
+        raise ValueError(f"query.sql must end with `{CLIENT_FILTER}` to run in bulk mode")
+    client_filter = "" if client_ids is None else "WHERE c.id IN (SELECT value FROM json_each(:client_ids))"
+    return query.replace(CLIENT_FILTER, client_filter).rstrip().rstrip(";") + "\nORDER BY c.id"
+
+
+def bulk_params(client_ids: Optional[Sequence[int]], as_of: Optional[str] = None) -> Dict[str, Any]:
+    params: Dict[str, Any] = {"as_of": as_of}
+    if client_ids is not None:
+        params["client_ids"] = json.dumps(list(client_ids))
+    return params
+
+
+def iter_features(
+    session: Session,
+    client_ids: Optional[Sequence[int]] = None,
+    batch_size: int = BULK_BATCH_SIZE,
+    query_path: Path = QUERY_PATH,
+    as_of: Optional[str] = None,
+) -> Iterator[Dict[str, Any]]:
+    """
+    Streams the feature rows of all clients (or `client_ids`) ordered by client_id,
+    as of today or as of the `as_of` date.
+    """
+    query = bulk_query(load_query(query_path), client_ids)
+    result = session.execute(text(query), bulk_params(client_ids, as_of))
+    for rows in result.mappings().partitions(batch_size):
+        for row in rows:
+            yield dict(row)
+
+
+def feature_rows(
+    session: Session,
+    client_ids: Optional[Sequence[int]] = None,
+    query_path: Path = QUERY_PATH,
+    backend: str = "sql",
+    as_of: Optional[str] = None,
+) -> Iterator[Dict[str, Any]]:
+    """
+    Feature rows of all clients (or `client_ids`) ordered by client_id, from
+    the chosen backend.
+    """
+    if backend == "columnar":
+        return ColumnarFeatures(session.connection(), as_of).rows(client_ids)
+    return iter_features(session, client_ids, query_path=query_path, as_of=as_of)
+
+
+def write_features_file(
+    rows: Iterator[Dict[str, Any]], path: Path, fieldnames: Sequence[str] = columns
+) -> int:
+    """
+    Writes feature rows as CSV, or as JSON lines when the file ends with .jsonl.
+    """
+    count = 0
+    with open(path, "w", encoding="utf-8", newline="") as f:
+        if path.suffix == ".jsonl":
+            for row in rows:
+                f.write(json.dumps(row) + "\n")
+                count += 1
+        else:
+            writer = csv.DictWriter(f, fieldnames=fieldnames)
+            writer.writeheader()
+            for row in rows:
+                writer.writerow(row)
+                count += 1
+    return count
+
+
+def write_features_table(
+    session: Session,
+    client_ids: Optional[Sequence[int]] = None,
+    query_path: Path = QUERY_PATH,
+    backend: str = "sql",
+    as_of: Optional[str] = None,
+) -> int:
+    """
+    Refreshes the `client_features` table inside SQLite, with one INSERT ... SELECT
+    or, for the columnar backend, one batch of inserted rows. A full refresh
+    replaces the table contents, a list of clients is upserted.
+    """
+    features = columns[1:]
+    session.execute(
+        text(
+            f"CREATE TABLE IF NOT EXISTS {FEATURES_TABLE} (client_id INTEGER PRIMARY KEY, "
+            + ", ".join(f"{name} REAL" for name in features)
+            + ")"
+        )
+    )
+    if client_ids is None:
+        session.execute(text(f"DELETE FROM {FEATURES_TABLE}"))
+    insert = f"INSERT OR REPLACE INTO {FEATURES_TABLE} ({', '.join(columns)}) "
+    if backend == "columnar":
+        rows = [
+            tuple(row[name] for name in columns)
+            for row in feature_rows(session, client_ids, backend=backend, as_of=as_of)
+        ]
+        session.connection().exec_driver_sql(insert + f"VALUES ({', '.join('?' for _ in columns)})", rows)
+        session.commit()
+        return len(rows)
+    select = bulk_query(load_query(query_path), client_ids)
+    result = session.execute(
+        text(insert + f"SELECT {', '.join(columns)} FROM ({select})"),
+        bulk_params(client_ids, as_of),
+    )
+    session.commit()
+    return result.rowcount
+
+
+def same_value(left: Any, right: Any) -> bool:
+    if left is None or right is None:
+        return left is right
+    return isclose(left, right, rel_tol=1e-9, abs_tol=1e-12)
+
+
+def same_row(left: Dict[str, Any], right: Dict[str, Any]) -> bool:
+    return all(same_value(left.get(name), right.get(name)) for name in columns)
+
+
+def check_bulk(
+    session: Session, sample_size: int = 100, query_path: Path = QUERY_PATH, as_of: Optional[str] = None
+) -> List[Dict[str, Any]]:
+    """
+    Cross-checks bulk mode against the single-client query.sql on a random
+    sample of clients. Returns the mismatching rows (empty when consistent).
+    """
+    client_ids = [row[0] for row in session.execute(text("SELECT id FROM clients"))]
+    client_ids = sample(client_ids, min(sample_size, len(client_ids)))
+    bulk = {
+        row["client_id"]: row for row in iter_features(session, client_ids, query_path=query_path, as_of=as_of)
+    }
+
+    query = text(load_query(query_path))
+    mismatches = []
+    for client_id in client_ids:
+        single = dict(session.execute(query, {"client_id": client_id, "as_of": as_of}).mappings().one())
+        row = bulk.get(client_id, {})
+        if not same_row(single, row):
+            mismatches.append({"client_id": client_id, "single": single, "bulk": row})
+    return mismatches
+
+
+def compare_rows(
+    left: Iterator[Dict[str, Any]], right: Iterator[Dict[str, Any]], left_name: str, right_name: str
+) -> List[Dict[str, Any]]:
+    """
+    Merges two feature row streams ordered by client_id. Returns the clients
+    whose rows differ, or exist on one side only (None on the other).
+    """
+    mismatches = []
+    left_row, right_row = next(left, None), next(right, None)
+    while left_row is not None or right_row is not None:
+        if right_row is None or (left_row is not None and left_row["client_id"] < right_row["client_id"]):
+            pair, left_row = (left_row, None), next(left, None)
+        elif left_row is None or right_row["client_id"] < left_row["client_id"]:
+            pair, right_row = (None, right_row), next(right, None)
+        else:
+            pair, left_row, right_row = (left_row, right_row), next(left, None), next(right, None)
+        one, other = pair
+        if one is None or other is None or not same_row(one, other):
+            client_id = (one or other)["client_id"]
+            mismatches.append({"client_id": client_id, left_name: one, right_name: other})
+    return mismatches
+
+
+def check_columnar(
+    session: Session, sample_size: int = 100, query_path: Path = QUERY_PATH, as_of: Optional[str] = None
+) -> List[Dict[str, Any]]:
+    """
+    Cross-checks the columnar backend against bulk query.sql on a random
+    sample of clients. Returns the mismatching rows (empty when consistent).
+    """
+    client_ids = [row[0] for row in session.execute(text("SELECT id FROM clients"))]
+    client_ids = sorted(sample(client_ids, min(sample_size, len(client_ids))))
+    sql_rows = iter_features(session, client_ids, query_path=query_path, as_of=as_of)
+    columnar_rows = feature_rows(session, client_ids, backend="columnar", as_of=as_of)
+    return compare_rows(sql_rows, columnar_rows, "sql", "columnar")
+
+
+def verify_rollups(session: Session) -> List[Dict[str, Any]]:
+    """
+    Compares the rollup-based features of every client with query.sql over
+    the raw rows. Returns the mismatching rows (empty when consistent).
+    """
+    raw_rows = iter_features(session, query_path=QUERY_PATH)
+    rollup_rows = iter_features(session, query_path=ROLLUP_QUERY_PATH)
+    return compare_rows(raw_rows, rollup_rows, "raw", "rollups")
+
+
+def run_bulk(
+    client_ids: Optional[Sequence[int]] = None,
+    output: Optional[Path] = None,
+    to_table: bool = False,
+    check: int = 0,
+    query_path: Path = QUERY_PATH,
+    backend: str = "sql",
+    db_url: str = DATABASE_URI,
+    as_of: Optional[str] = None,
+):
+    with db_session(db_url) as session:
+        if to_table:
+            count = write_features_table(session, client_ids, query_path, backend, as_of)
+            print(f"[bold green]{count} client feature rows written to table {FEATURES_TABLE}")
+        if output is not None:
+            rows = feature_rows(session, client_ids, query_path, backend, as_of)
+            count = write_features_file(rows, output)
+            print(f"[bold green]{count} client feature rows written to {output}")
+        if check and backend == "columnar":
+            mismatches = check_columnar(session, check, query_path, as_of)
+            if mismatches:
+                print(f"[bold red]The columnar backend differs from the feature query for {len(mismatches)} clients:")
+                pprint(mismatches[:10])
+                raise SystemExit(1)
+            print(f"[bold green]The columnar backend matches the feature query on {check} sampled clients")
+        elif check:
+            mismatches = check_bulk(session, check, query_path, as_of)
+            if mismatches:
+                print(f"[bold red]Bulk mode differs from the single-client query for {len(mismatches)} clients:")
+                pprint(mismatches[:10])
+                raise SystemExit(1)
+            print(f"[bold green]Bulk mode matches the single-client query on {check} sampled clients")
+
+
+# ========== BACKFILL ==========
+
+
+def as_of_date(value: str) -> str:
+    return date.fromisoformat(value.strip()).isoformat()
+
+
+def read_pairs(path: Path) -> List[Tuple[int, str]]:
+    """
+    (client_id, as_of) pairs of a CSV file with `client_id` and `as_of` columns.
+    """
+    with open(path, encoding="utf-8", newline="") as f:
+        return [(int(row["client_id"]), as_of_date(row["as_of"])) for row in csv.DictReader(f)]
+
+
+def check_backfill(
+    session: Session, backfill: Backfill, pairs: Sequence[Tuple[int, str]], sample_size: int = 100
+) -> List[Dict[str, Any]]:
+    """
+    Cross-checks backfilled features against query.sql run with :as_of on a
+    random sample of pairs. Returns the mismatching rows (empty when consistent).
+    """
+    query = text(load_query(QUERY_PATH))
+    mismatches = []
+    for row in backfill.rows(sample(list(pairs), min(sample_size, len(pairs)))):
+        params = {"client_id": row["client_id"], "as_of": row["as_of"]}
+        single = dict(session.execute(query, params).mappings().one())
+        if not same_row(single, row):
+            mismatches.append({**params, "query": single, "backfill": row})
+    return mismatches
+
+
+def run_backfill(pairs_path: Path, output: Path, check: int = 0, db_url: str = DATABASE_URI):
+    pairs = read_pairs(pairs_path)
+    with db_session(db_url) as session:
+        backfill = Backfill(session.connection())
+        count = write_features_file(backfill.rows(pairs), output, backfill_columns)
+        print(f"[bold green]{count} point-in-time feature rows written to {output}")
+        if check:
+            mismatches = check_backfill(session, backfill, pairs, check)
+            if mismatches:
+                print(f"[bold red]The backfill differs from query.sql for {len(mismatches)} pairs:")
+                pprint(mismatches[:10])
+                raise SystemExit(1)
+            print(f"[bold green]The backfill matches query.sql on {min(check, len(pairs))} sampled pairs")
+
+
+# ========== QUERY PLAN ==========
+
+TABLE_REFERENCE = re.compile(r"\b(?:FROM|JOIN)\s+(\w+)(?:\s+(?:AS\s+)?(\w+))?", re.IGNORECASE)
+# A bloom filter is built by reading the whole table
+FULL_SCAN = re.compile(r"^(?:SCAN|BLOOM FILTER ON) (\w+)")
+
+
+def table_aliases(query: str) -> Set[str]:
+    """
+    Names under which the query reads the model tables.
+    """
+    tables = set(Base.metadata.tables) | set(ROLLUP_TABLES)
+    aliases = set(tables)
+    for table, alias in TABLE_REFERENCE.findall(query):
+        if table in tables and alias and alias.upper() not in ("ON", "WHERE", "JOIN", "LEFT", "GROUP"):
+            aliases.add(alias)
+    return aliases
+
+
+def full_scans(session: Session, client_id: int = 1, query_path: Path = QUERY_PATH) -> List[str]:
+    """
+    Steps of the feature query plan that scan a whole table (or a whole
+    index) instead of searching it. Scans of materialized CTEs are fine.
+    """
+    query = load_query(query_path)
+    aliases = table_aliases(query)
+    plan = session.execute(
+        text("EXPLAIN QUERY PLAN " + query), {"client_id": client_id, "as_of": None}
+    ).fetchall()
+    print("[bold]Query plan:")
+    for row in plan:
+        print(f"  {row.detail}")
+    return [
+        row.detail
+        for row in plan
+        if (match := FULL_SCAN.match(row.detail)) is not None and match.group(1) in aliases
+    ]
+
+
+# ========== PROFILING ==========
+
+SQL_COMMENT = re.compile(r"--[^\n]*")
+CTE_START = re.compile(r"\s*,?\s*(\w+)\s+AS\s+(?:NOT\s+)?(?:MATERIALIZED\s+)?\(", re.IGNORECASE)
+# The progress handler is called every PROGRESS_STEPS virtual machine instructions
+PROGRESS_STEPS = 100
+# Timed runs of every profiled statement, after one untimed run that prepares it
+PROFILE_RUNS = 5
+
+
+def split_ctes(query: str) -> Tuple[str, List[str]]:
+    """
+    The WITH clause of the query (comments removed) and the names of its
+    CTEs, in order.
+    """
+    query = SQL_COMMENT.sub("", query)
+    start = re.search(r"\bWITH\b", query, re.IGNORECASE)
+    if start is None:
+        raise ValueError("The feature query has no WITH clause to profile")
+    names, position = [], start.end()
+    while (match := CTE_START.match(query, position)) is not None:
+        depth, position = 1, match.end()
+        while depth:
+            if position == len(query):
+                raise ValueError(f"Unbalanced parentheses in CTE {match.group(1)}")
+            depth += {"(": 1, ")": -1}.get(query[position], 0)
+            position += 1
+        names.append(match.group(1))
+    return query[:position], names
+
+
+def profile_statement(
+    session: Session, sql: str, params: Dict[str, Any], runs: int = PROFILE_RUNS
+) -> Dict[str, Any]:
+    """
+    Plan, wall time, VM steps (to PROGRESS_STEPS) and row count of one
+    statement. A first untimed run prepares the statement (cached by the
+    driver) and warms the page cache, then `runs` timed runs give the fastest
+    and the median time. Steps are counted in one more run, so the progress
+    handler does not slow down the timed ones.
+    """
+    dbapi_connection = session.connection().connection.dbapi_connection
+    plan = [row[3] for row in dbapi_connection.execute("EXPLAIN QUERY PLAN " + sql, params)]
+
+    rows = sum(1 for _ in dbapi_connection.execute(sql, params))
+    timings = []
+    for _ in range(max(1, runs)):
+        started = time.perf_counter()
+        dbapi_connection.execute(sql, params).fetchall()
+        timings.append(time.perf_counter() - started)
+
+    steps = 0
+
+    def count_steps() -> int:
+        nonlocal steps
+        steps += PROGRESS_STEPS
+        return 0
+
+    dbapi_connection.set_progress_handler(count_steps, PROGRESS_STEPS)
+    try:
+        dbapi_connection.execute(sql, params).fetchall()
+    finally:
+        dbapi_connection.set_progress_handler(None, 0)
+    return {
+        "elapsed_ms": round(min(timings) * 1000, 3),
+        "median_ms": round(median(timings) * 1000, 3),
+        "vm_steps": steps,
+        "rows": rows,
+        "plan": plan,
+    }
+
+
+def profile_ctes(
+    session: Session,
+    client_id: Optional[int] = None,
+    query_path: Path = QUERY_PATH,
+    as_of: Optional[str] = None,
+    runs: int = PROFILE_RUNS,
+) -> List[Dict[str, Any]]:
+    """
+    Runs every CTE of the feature query on its own (`SELECT * FROM <cte>`
+    under the same WITH clause), for one client or, by default, in bulk mode
+    for all clients. Results are ranked by their fastest of `runs` timed runs.
+    The "query" entry is the whole feature query; `share` is relative to it.
+    """
+    query = load_query(query_path)
+    params: Dict[str, Any] = {"client_id": client_id, "as_of": as_of}
+    if client_id is None:
+        query, params = bulk_query(query), bulk_params(None, as_of)
+    with_clause, names = split_ctes(query)
+    aliases = table_aliases(query)
+
+    total = profile_statement(session, query, params, runs)
+    profiles = [{"cte": "query", **total}]
+    for name in names:
+        cte_query = f"{with_clause}\nSELECT * FROM {name}"
+        profiles.append({"cte": name, **profile_statement(session, cte_query, params, runs)})
+    for profile in profiles:
+        profile["share"] = round(profile["elapsed_ms"] / total["elapsed_ms"], 4) if total["elapsed_ms"] else 0.0
+        profile["full_scans"] = [
+            step for step in profile["plan"] if (match := FULL_SCAN.match(step)) and match.group(1) in aliases
+        ]
+    return sorted(profiles, key=lambda profile: profile["elapsed_ms"], reverse=True)
+
+
+def print_profile(profiles: List[Dict[str, Any]]) -> None:
+    table = Table(title="Feature query profile")
+    for column in ("CTE", "Min (ms)", "Median (ms)", "Share", "VM steps", "Rows", "Full scans"):
+        table.add_column(column, justify="left" if column == "CTE" else "right")
+    for profile in profiles:
+        table.add_row(
+            profile["cte"],
+            f"{profile['elapsed_ms']:g}",
+            f"{profile['median_ms']:g}",
+            f"{profile['share']:.1%}",
+            f"{profile['vm_steps']:,}",
+            f"{profile['rows']:,}",
+            str(len(profile["full_scans"])),
+        )
+    print(table)
+    for profile in profiles:
+        print(f"[bold]{profile['cte']}:")
+        for step in profile["plan"]:
+            print(f"  {step}")
+
+
 if __name__ == "__main__":
-    run_once()
+    parser = argparse.ArgumentParser(description="Run the feature query.")
+    parser.add_argument("--all", action="store_true", help="Compute features for every client in one pass")
+    parser.add_argument(
+        "--clients",
+        type=lambda value: [int(client_id) for client_id in value.split(",")],
+        default=None,
+        help="Comma-separated client ids to compute in one pass",
+    )
+    parser.add_argument("--output", type=Path, default=None, help="Stream features to a .csv or .jsonl file")
+    parser.add_argument("--table", action="store_true", help=f"Store features in the {FEATURES_TABLE} table")
+    parser.add_argument(
+        "--query", choices=QUERIES, default="raw", help="Feature query: raw tables or monthly rollups"
+    )
+    parser.add_argument(
+        "--backend", choices=BACKENDS, default="sql", help="Bulk mode engine: SQLite or in-memory columns"
+    )
+    parser.add_argument(
+        "--explain", action="store_true", help="Fail if the feature query plan scans a whole table"
+    )
+    parser.add_argument(
+        "--ensure-schema",
+        action="store_true",
+        help="Categorize merchants, create missing indexes, rebuild the rollups and run ANALYZE",
+    )
+    parser.add_argument(
+        "--verify-rollups",
+        action="store_true",
+        help="Fail if the rollup features differ from query.sql for any client",
+    )
+    parser.add_argument(
+        "--profile",
+        action="store_true",
+        help="Time every CTE on its own, with its plan and VM steps (all clients, or --client-id)",
+    )
+    parser.add_argument("--client-id", type=int, default=None, help="Client to profile instead of all clients")
+    parser.add_argument(
+        "--profile-runs",
+        type=int,
+        default=PROFILE_RUNS,
+        help="Timed runs of every profiled statement, after a warm-up run",
+    )
+    parser.add_argument(
+        "--profile-output", type=Path, default=None, help="Also write the profile as JSON to this file"
+    )
+    parser.add_argument("--db", default=DATABASE_URI, help="SQLAlchemy database URL")
+    parser.add_argument(
+        "--as-of", type=as_of_date, default=None, help="Compute features as they were on this date (YYYY-MM-DD)"
+    )
+    parser.add_argument(
+        "--backfill",
+        type=Path,
+        default=None,
+        help="CSV of client_id,as_of pairs to compute point-in-time features for (needs --output)",
+    )
+    parser.add_argument(
+        "--check",
+        type=int,
+        default=0,
+        help="Compare bulk mode with the single-client query (the columnar backend with bulk SQL, "
+        "a backfill with query.sql) on N clients or pairs",
+    )
+    args = parser.parse_args()
+    query_path = QUERIES[args.query]
+    if args.as_of is not None and args.query != "raw":
+        parser.error("--as-of needs the raw feature query: the rollups hold today's aggregates")
+
+    if args.ensure_schema:
+        with db_session(args.db) as session:
+            categorized = ensure_merchant_categories(session.connection())
+            rebuild_rollups(session.connection())
+            ensure_indexes(session.connection())
+            session.commit()
+        print(f"[bold green]{categorized} vendor transactions categorized, rollups, indexes and statistics are up to date")
+    if args.verify_rollups:
+        with db_session(args.db) as session:
+            mismatches = verify_rollups(session)
+        if mismatches:
+            print(f"[bold red]Rollup features differ from query.sql for {len(mismatches)} clients:")
+            pprint(mismatches[:10])
+            raise SystemExit(1)
+        print("[bold green]Rollup features match query.sql for every client")
+    if args.explain:
+        with db_session(args.db) as session:
+            scans = full_scans(session, query_path=query_path)
+        if scans:
+            print("[bold red]The feature query falls back to full scans:")
+            pprint(scans)
+            raise SystemExit(1)
+        print("[bold green]The feature query uses index searches only")
+    if args.profile:
+        with db_session(args.db) as session:
+            profiles = profile_ctes(session, args.client_id, query_path, args.as_of, args.profile_runs)
+        print_profile(profiles)
+        if args.profile_output is not None:
+            args.profile_output.write_text(json.dumps(profiles, indent=4))
+            print(f"[bold green]Profile written to {args.profile_output}")
+
+    if args.backfill is not None:
+        if args.output is None:
+            parser.error("--backfill needs --output")
+        run_backfill(args.backfill, args.output, args.check, args.db)
+    elif args.all or args.clients is not None:
+        if args.output is None and not args.table and not args.check:
+            parser.error("bulk mode needs --output, --table or --check")
+        run_bulk(args.clients, args.output, args.table, args.check, query_path, args.backend, args.db, args.as_of)
+    elif not (args.ensure_schema or args.verify_rollups or args.explain or args.profile):
+        run_once(query_path, args.db, args.as_of)
@@ -0,0 +1,176 @@
+import argparse
+from concurrent.futures import ThreadPoolExecutor
+import json
+from pathlib import Path
+from random import sample
+import sqlite3
+import threading
+import time
+from typing import Any, Dict, Iterable, List, Optional
+
+from rich import print
+from sqlalchemy import create_engine, event
+from sqlalchemy.engine import make_url
+
+try:
+    from .data_generator import DATABASE_URI
+    from .runner import QUERY_PATH, bulk_query, load_query
+except ImportError:
+    from data_generator import DATABASE_URI
+    from runner import QUERY_PATH, bulk_query, load_query
+
+DEFAULT_POOL_SIZE = 8
+DEFAULT_BATCH_SIZE = 500
+# Per-connection page cache and memory map of the database file
+CACHE_SIZE_KIB = 65536
+MMAP_SIZE = 1 << 30
+
+
+def database_path(db_url: str) -> Path:
+    database = make_url(db_url).database
+    if not database or database == ":memory:":
+        raise ValueError(f"Feature serving needs a database file, got {db_url}")
+    return Path(database).resolve()
+
+
+def enable_wal(path: Path) -> None:
+    """
+    Switches the database to WAL journaling (persistent), so readers do not
+    block on, and are not blocked by, a writer refreshing the data.
+    """
+    with sqlite3.connect(path) as connection:
+        connection.execute("PRAGMA journal_mode = WAL")
+    connection.close()
+
+
+class FeatureService:
+    """
+    Long-lived, read-only access to client features for the online path.
+
+    One engine with a pool of read-only SQLite connections is created up
+    front, and the feature query is read and turned into its batch form
+    once. Every pooled connection keeps the prepared statement in its
+    statement cache, so a lookup only binds parameters and steps. Any number
+    of threads may call `get_features` at the same time.
+    """
+
+    def __init__(
+        self,
+        db_url: str = DATABASE_URI,
+        query_path: Path = QUERY_PATH,
+        pool_size: int = DEFAULT_POOL_SIZE,
+        batch_size: int = DEFAULT_BATCH_SIZE,
+    ):
+        path = database_path(db_url)
+        if not path.exists():
+            raise FileNotFoundError(f"Database not found at {path}")
+        enable_wal(path)
+
+        self.batch_size = batch_size
+        # Prepared once: the client list is bound as one JSON array parameter
+        self.query = bulk_query(load_query(query_path), client_ids=())
+        self.engine = create_engine(
+            f"sqlite:///file:{path}?mode=ro&uri=true",
+            pool_size=pool_size,
+            max_overflow=0,
+            connect_args={"check_same_thread": False},
+        )
+        event.listen(self.engine, "connect", self.configure_connection)
+
+    @staticmethod
+    def configure_connection(dbapi_connection, connection_record) -> None:
+        cursor = dbapi_connection.cursor()
+        cursor.execute("PRAGMA query_only = ON")
+        cursor.execute(f"PRAGMA cache_size = -{CACHE_SIZE_KIB}")
+        cursor.execute(f"PRAGMA mmap_size = {MMAP_SIZE}")
+        cursor.close()
+
+    def get_features(self, client_ids: Iterable[int]) -> Dict[int, Dict[str, Any]]:
+        """
+        Features by client_id, computed `batch_size` clients per query.
+        Unknown client ids are left out.
+        """
+        client_ids = list(dict.fromkeys(client_ids))
+        features: Dict[int, Dict[str, Any]] = {}
+        with self.engine.connect() as connection:
+            for start in range(0, len(client_ids), self.batch_size):
+                batch = client_ids[start : start + self.batch_size]
+                result = connection.exec_driver_sql(
+                    self.query, {"client_ids": json.dumps(batch), "as_of": None}
+                )
+                for row in result.mappings():
+                    features[row["client_id"]] = dict(row)
+        return features
+
+    def warm_up(self) -> None:
+        """
+        Opens every pooled connection and prepares the query on it.
+        """
+        connections = [self.engine.connect() for _ in range(self.engine.pool.size())]
+        for connection in connections:
+            connection.exec_driver_sql(self.query, {"client_ids": "[]", "as_of": None}).fetchall()
+            connection.close()
+
+    def close(self) -> None:
+        self.engine.dispose()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+
+_SERVICE: Optional[FeatureService] = None
+_SERVICE_LOCK = threading.Lock()
+
+
+def get_features(client_ids: Iterable[int]) -> Dict[int, Dict[str, Any]]:
+    """
+    `FeatureService.get_features` on a process-wide service over DATABASE_URI,
+    created on first use.
+    """
+    global _SERVICE
+    if _SERVICE is None:
+        with _SERVICE_LOCK:
+            if _SERVICE is None:
+                _SERVICE = FeatureService()
+    return _SERVICE.get_features(client_ids)
+
+
+def load_test(service: FeatureService, threads: int, requests: int, batch: int) -> Dict[str, Any]:
+    """
+    `requests` lookups of `batch` random clients from `threads` threads.
+    """
+    with service.engine.connect() as connection:
+        all_ids = [row[0] for row in connection.exec_driver_sql("SELECT id FROM clients")]
+
+    def lookup(_: int) -> float:
+        client_ids = sample(all_ids, min(batch, len(all_ids)))
+        started = time.perf_counter()
+        service.get_features(client_ids)
+        return time.perf_counter() - started
+
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=threads) as executor:
+        latencies: List[float] = sorted(executor.map(lookup, range(requests)))
+    elapsed = time.perf_counter() - started
+    return {
+        "requests": requests,
+        "throughput_rps": round(requests / elapsed, 1),
+        "p50_ms": round(latencies[len(latencies) // 2] * 1000, 3),
+        "p99_ms": round(latencies[min(len(latencies) - 1, int(len(latencies) * 0.99))] * 1000, 3),
+    }
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Load-test the feature-serving API.")
+    parser.add_argument("--db", default=DATABASE_URI, help="SQLAlchemy database URL")
+    parser.add_argument("--threads", type=int, default=DEFAULT_POOL_SIZE)
+    parser.add_argument("--requests", type=int, default=10_000)
+    parser.add_argument("--batch", type=int, default=1, help="Clients per get_features call")
+    args = parser.parse_args()
+
+    with FeatureService(args.db, pool_size=args.threads) as service:
+        service.warm_up()
+        print(load_test(service, args.threads, args.requests, args.batch))
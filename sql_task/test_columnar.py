@@ -0,0 +1,23 @@
+import pytest
+
+from sql_task.runner import check_columnar, compare_rows, feature_rows, iter_features
+
+
+@pytest.mark.parametrize("as_of", [None, "2024-03-31"])
+def test_columnar_matches_bulk_sql(session, as_of):
+    sql_rows = iter_features(session, as_of=as_of)
+    columnar_rows = feature_rows(session, backend="columnar", as_of=as_of)
+    assert compare_rows(sql_rows, columnar_rows, "sql", "columnar") == []
+
+
+def test_columnar_sets_every_feature(session):
+    rows = list(feature_rows(session, backend="columnar"))
+    for name in rows[0]:
+        assert any(row[name] is not None for row in rows), name
+
+
+def test_columnar_selects_clients(session):
+    client_ids = [5, 17, 250]
+    rows = list(feature_rows(session, client_ids, backend="columnar"))
+    assert [row["client_id"] for row in rows] == client_ids
+    assert check_columnar(session, 50) == []
@@ -0,0 +1,15 @@
+from datetime import date
+
+from sql_task.data_generator import BULK_COLUMNS, generate_block
+
+REFERENCE_DATE = date(2024, 5, 1)
+
+
+def test_block_depends_only_on_seed_and_reference_date():
+    rows = generate_block(7, 3, 3001, 50, REFERENCE_DATE)
+    assert generate_block(7, 3, 3001, 50, REFERENCE_DATE) == rows
+
+    dates = BULK_COLUMNS["vendor_transactions"].index("transaction_date")
+    assert max(row[dates] for row in rows["vendor_transactions"]) < REFERENCE_DATE.isoformat()
+    starts = BULK_COLUMNS["loans"].index("start_date")
+    assert max(row[starts] for row in rows["loans"]) < REFERENCE_DATE.isoformat()
@@ -0,0 +1,37 @@
+from sqlalchemy import text
+
+from sql_task.data_generator import merchant_categorizer
+from sql_task.merchants import check_rules, load_merchants, mask_merchant
+
+
+def test_categorization_rules_hold():
+    assert check_rules(load_merchants()) == []
+
+
+def test_insert_trigger_categorizes_like_the_rules(session):
+    names = [name for names in load_merchants().values() for name in names]
+    merchants = [
+        *names,
+        *(name.lower() for name in names),
+        *(mask_merchant(name.upper()) for name in names),
+        *(f"  {name[:2]}**{name[-1]}\t" for name in names),
+        "",
+        "UNKNOWNSHOP",
+        "ZZ*****Z",
+        "FA**",
+    ]
+    # Inserted without category_id, like any writer other than the generator
+    session.execute(
+        text(
+            "INSERT INTO vendor_transactions (id, phone_number, amount, merchant, transaction_date) "
+            "VALUES (:id, '000', 1, :merchant, '2024-01-01')"
+        ),
+        [{"id": f"test-{i}", "merchant": merchant} for i, merchant in enumerate(merchants)],
+    )
+    categories = dict(
+        session.execute(text("SELECT id, category_id FROM vendor_transactions WHERE id LIKE 'test-%'")).all()
+    )
+    session.rollback()
+    assert sum(category_id is not None for category_id in categories.values()) >= 3 * len(names)
+    for i, merchant in enumerate(merchants):
+        assert categories[f"test-{i}"] == merchant_categorizer.categorize(merchant), merchant
@@ -0,0 +1,37 @@
+from datetime import date, timedelta
+
+from sqlalchemy import text
+
+from sql_task.merchants import load_merchants, mask_merchant
+from sql_task.runner import verify_rollups
+
+
+def test_rollups_match_raw_features(session):
+    assert verify_rollups(session) == []
+
+
+def test_rollups_categorize_rows_inserted_without_category(session):
+    phones = session.execute(text("SELECT phone_number FROM clients ORDER BY id LIMIT 20")).scalars().all()
+    merchants = [name for names in load_merchants().values() for name in names]
+    rows = [
+        {
+            "id": f"test-{i}",
+            "phone": phones[i % len(phones)],
+            "amount": 10 + i,
+            # Plain, lower-case and masked names, as other writers send them
+            "merchant": (merchant, merchant.lower(), mask_merchant(merchant.upper()))[i % 3],
+            "date": (date.today() - timedelta(days=20 + i % 200)).isoformat(),
+        }
+        for i, merchant in enumerate(merchants * 3)
+    ]
+    session.execute(
+        text(
+            "INSERT INTO vendor_transactions (id, phone_number, amount, merchant, transaction_date) "
+            "VALUES (:id, :phone, :amount, :merchant, :date)"
+        ),
+        rows,
+    )
+    try:
+        assert verify_rollups(session) == []
+    finally:
+        session.rollback()